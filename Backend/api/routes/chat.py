@@ -28,6 +28,7 @@ class ChatRequest(BaseModel):
     current_summary: Optional[str] = ""
     use_rag: bool = True
     file_ids: Optional[List[str]] = None
+    session_id: Optional[str] = Field(default=None, max_length=64)
 
 
 class ChatResponse(BaseModel):
@@ -69,7 +70,8 @@ async def chat_stream(request: ChatRequest):
             history=request.history,
             current_summary=request.current_summary,
             use_rag=request.use_rag,
-            file_ids=request.file_ids
+            file_ids=request.file_ids,
+            session_id=request.session_id
         ),
         media_type="text/event-stream"
     )
@@ -100,7 +102,8 @@ async def chat(request: ChatRequest):
             query=request.query,
             history=request.history,
             use_rag=request.use_rag,
-            file_ids=request.file_ids
+            file_ids=request.file_ids,
+            session_id=request.session_id
         )
         
         return ChatResponse(
@@ -4,14 +4,15 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-import os
+import asyncio
+import orjson
 from fastapi import APIRouter, UploadFile, File, BackgroundTasks, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse
-from config.settings import settings
-from utils.file_handler import validate_file, save_upload_file
+from fastapi.responses import FileResponse, StreamingResponse
+from utils.file_handler import validate_file, save_upload_file, find_upload_path
 from services.document_processor import process_document
 from services.vector_store import get_vector_store
-from services.progress_service import get_progress_tracker
+from services.progress_service import get_progress_tracker, ProcessingStage
+from services.cache_service import clear_retrieval_caches
 from utils.logger import setup_logger
 
 logger = setup_logger()
@@ -22,6 +23,20 @@ router = APIRouter(prefix="/api", tags=["documents"])
 
 from services.graph_service import get_graph_service
 
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    """Drain client messages until the socket closes"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+def _clear_graph():
+    """Connect (if needed) and wipe the graph; runs in a worker thread"""
+    get_graph_service().clear_all()
+
+
 @router.post("/upload")
 async def upload_document(
     background_tasks: BackgroundTasks,
@@ -39,23 +54,36 @@ async def upload_document(
     logger.info(f"   └─ Filename: {file.filename}")
     logger.info(f"   └─ Content-Type: {file.content_type}")
     
+    # Validate file (before touching any existing data)
+    validate_file(file)
+    
     # ─────────────────────────────────────
     # Step 0: Clear Previous Data (Fresh Start)
     # ─────────────────────────────────────
     logger.info("🧹 Clearing previous data (Clean Slate Mode)...")
+    
+    # The Neo4j wipe overlaps with the vector store reset and the file save.
+    # The vector store clear also empties UPLOAD_DIR, so it must finish
+    # before the new file is written.
+    graph_clear = asyncio.create_task(asyncio.to_thread(_clear_graph))
     try:
-        get_graph_service().clear_all()
-        get_vector_store().clear_all()
-        logger.info("✨ Previous data cleared successfully.")
+        await asyncio.to_thread(get_vector_store().clear_all)
     except Exception as e:
-        logger.error(f"⚠️ Error clearing previous data: {e}")
+        logger.error(f"⚠️ Error clearing vector store: {e}")
         # We continue anyway, as it might just be empty
-
-    # Validate file
-    validate_file(file)
     
-    # Save file to disk
-    file_path, file_id = await save_upload_file(file)
+    try:
+        # Save file to disk
+        file_path, file_id = await save_upload_file(file)
+    finally:
+        try:
+            await graph_clear
+            logger.info("✨ Previous data cleared successfully.")
+        except Exception as e:
+            logger.error(f"⚠️ Error clearing graph data: {e}")
+    
+    # Cached RAG contexts describe the documents that were just cleared
+    clear_retrieval_caches()
     
     # Process document in background
     logger.info("🔄 Starting background processing...")
@@ -117,19 +145,32 @@ async def websocket_progress(websocket: WebSocket, file_id: str):
     
     try:
         # Register this connection for updates
-        await progress_tracker.register_connection(file_id, websocket)
+        done = await progress_tracker.register_connection(file_id, websocket)
         
         # Send current progress immediately
         current_progress = progress_tracker.get_progress(file_id)
         if current_progress:
-            await websocket.send_json(current_progress)
+            # Same orjson text frames as the tracker's broadcasts
+            await websocket.send_text(orjson.dumps(current_progress).decode())
+            if current_progress["stage"] in (ProcessingStage.COMPLETED, ProcessingStage.FAILED):
+                return
         
         logger.info(f"🔌 WebSocket connected for file: {file_id}")
         
-        # Keep connection alive and wait for disconnect
-        while True:
-            # Just receive any messages (ping/pong)
-            await websocket.receive_text()
+        # Updates are pushed by the tracker: wait until the final update has
+        # gone out (or a send found the socket dead) or the client disconnects.
+        # No record yet means the background task has not started processing;
+        # the connection is already registered, so its sender will reach us.
+        final_sent = asyncio.create_task(done.wait())
+        disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+        try:
+            await asyncio.wait({final_sent, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            final_sent.cancel()
+            disconnected.cancel()
+        if disconnected.done() and not disconnected.cancelled():
+            disconnected.result()  # Surface receive() errors
+            logger.info(f"🔌 WebSocket disconnected for file: {file_id}")
             
     except WebSocketDisconnect:
         logger.info(f"🔌 WebSocket disconnected for file: {file_id}")
@@ -148,12 +189,11 @@ async def view_document(file_id: str):
     
     logger.info(f"👁️ Document view request: {file_id}")
     
-    # Search for file in upload directory
-    for filename in os.listdir(settings.UPLOAD_DIR):
-        if filename.startswith(file_id):
-            file_path = os.path.join(settings.UPLOAD_DIR, filename)
-            logger.info(f"   └─ Serving: {file_path}")
-            return FileResponse(file_path)
+    # Look up file in the upload index (directory rescan only on a miss)
+    file_path = await asyncio.to_thread(find_upload_path, file_id)
+    if file_path:
+        logger.info(f"   └─ Serving: {file_path}")
+        return FileResponse(file_path)
     
     logger.warning(f"   └─ File not found: {file_id}")
     raise HTTPException(status_code=404, detail="File not found")
@@ -176,12 +216,20 @@ async def get_document_text(file_id: str):
         logger.warning(f"   └─ No chunks found for: {file_id}")
         raise HTTPException(status_code=404, detail="Document content not found")
     
-    logger.info(f"   └─ Returning {len(chunks)} chunks")
+    logger.info(f"   └─ Streaming {len(chunks)} chunks")
     
-    return {
-        "content": "\n\n".join(chunks),
-        "chunks_count": len(chunks)
-    }
+    async def stream_chunks():
+        # Same text as "\n\n".join(chunks), without building one big string
+        for i, chunk in enumerate(chunks):
+            if i:
+                yield b"\n\n"
+            yield chunk.encode("utf-8")
+    
+    return StreamingResponse(
+        stream_chunks(),
+        media_type="text/plain; charset=utf-8",
+        headers={"X-Chunks-Count": str(len(chunks))}
+    )
 
 
 @router.post("/clear-all")
@@ -202,12 +250,14 @@ async def clear_all_data():
     try:
         # Clear Vector Store (includes FAISS index, chunks, uploaded files, BM25)
         vector_store = get_vector_store()
-        vector_store.clear_all()
+        await asyncio.to_thread(vector_store.clear_all)
         
         # Clear Graph Database
-        from services.graph_service import get_graph_service
         graph_service = get_graph_service()
-        graph_service.clear_all()
+        await asyncio.to_thread(graph_service.clear_all)
+        
+        # Drop cached RAG contexts for the cleared documents
+        clear_retrieval_caches()
         
         logger.info("✅ All data cleared successfully!")
         logger.info("═" * 60)
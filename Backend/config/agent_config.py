@@ -11,6 +11,14 @@ ENABLE_AGENTIC_RAG = True
 MAX_LOOPS = 3                # Maximum number of search iterations
 AGENT_MODEL = "gpt-5-chat"  # Deployment name for the agent
 ENABLE_VERBOSE_LOGGING = True
+PLANNER_MAX_CONCURRENCY = 8  # Planner completions in flight across all research sessions
+
+# Local sufficiency check (skips the planner LLM call when the answer is clear)
+# COMPLETE when the last planned search added no new chunks, or when this
+# fraction of the query's content terms already appears in the gathered chunks
+ENABLE_LOCAL_SUFFICIENCY_CHECK = True
+SUFFICIENCY_TERM_COVERAGE = 0.85
+SUFFICIENCY_MIN_CHUNKS = 5   # Coverage alone is not trusted on fewer chunks
 
 # Trigger Conditions
 # If query length > X or contains "compare", "research", "deep", trigger agent?
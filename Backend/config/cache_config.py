@@ -11,6 +11,17 @@ CACHE_TYPE = "memory" # 'memory' or 'redis'
 MAX_CACHE_SIZE = 1000 # Number of items
 DEFAULT_TTL = 3600    # Seconds (1 hour)
 
+# Semantic Cache Settings (RAG context keyed by query embedding)
+ENABLE_SEMANTIC_CACHE = True
+SEMANTIC_CACHE_DISTANCE_THRESHOLD = 0.12  # Max cosine distance counted as a hit
+SEMANTIC_CACHE_MAX_ENTRIES = 500          # Per document scope
+
+# Research Agent Search Cache (per-step hybrid search results keyed by query embedding)
+ENABLE_AGENT_SEARCH_CACHE = True
+AGENT_SEARCH_CACHE_SIM_THRESHOLD = 0.95   # Min cosine similarity counted as a hit
+AGENT_SEARCH_CACHE_MAX_ENTRIES = 1000
+AGENT_SEARCH_CACHE_TTL = 300              # Seconds
+
 # Redis Settings (Future)
 REDIS_HOST = "localhost"
 REDIS_PORT = 6379
@@ -23,3 +23,28 @@ OPENAI_COMPRESSION_MODEL = "gpt-35-turbo"  # Cheaper model for compression
 # Compression Parameters
 MAX_CONTEXT_TOKENS = 6000     # Trigger compression if context exceeds this (chars approx)
 TARGET_OUTPUT_TOKENS = 1000   # Aim for this size
+
+# DIRECT path (no LLM call)
+# A single short chunk is returned as-is; an exact repeat of context + query
+# (e.g. a follow-up on the same document) returns the earlier compression
+DIRECT_MAX_CHUNK_CHARS = 1500
+COMPRESSION_EXACT_CACHE_SIZE = 128  # (context hash, query) pairs kept, LRU
+
+# Rule-based Pre-compression (no LLM call, always safe)
+# Whitespace collapse, log-noise removal, duplicate folding, JSON minification
+ENABLE_RULE_PRECOMPRESSION = True
+
+# Statistical Compression (no LLM call)
+# Applied after the provider step when the context is still large: keeps the
+# most informative sentences (rare terms, query terms) in original order
+ENABLE_STATISTICAL_COMPRESSION = True
+STATISTICAL_COMPRESSION_THRESHOLD_CHARS = 6000  # Only compress above this size
+STATISTICAL_COMPRESSION_RATIO = 0.5             # Fraction of characters to keep
+
+# Compression Cache (skip the provider call for a recurring context)
+# Keyed by a hash of the raw context + the query embedding, so a paraphrased
+# question over the same retrieved chunks reuses the earlier compression
+ENABLE_COMPRESSION_CACHE = True
+COMPRESSION_CACHE_SIM_THRESHOLD = 0.95  # Min cosine similarity of the queries
+COMPRESSION_CACHE_MAX_CONTEXTS = 256    # Distinct raw contexts kept
+COMPRESSION_CACHE_MAX_ENTRIES = 16      # Queries kept per context
@@ -5,6 +5,7 @@
 """
 
 import os
+import numpy as np
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,12 +21,24 @@ NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USERNAME", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
 NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))  # Pooled connections per driver
+
+# Every extracted node also carries this label, with a unique constraint on its
+# id, so lookups by id are index seeks instead of all-node scans
+BASE_NODE_LABEL = "Entity"
 
 # Entity Extraction Settings
 ENTITY_EXTRACTION_MODEL = "gpt-5-chat"  # Uses your Azure OpenAI
 MAX_ENTITIES_PER_CHUNK = 20
 MAX_RELATIONSHIPS_PER_CHUNK = 30
 EXTRACTION_TEMPERATURE = 0.1  # Low for consistent extraction
+EXTRACTION_MAX_CONCURRENCY = 16  # Parallel extraction requests per document
+
+# Extraction Cache (exact match on model + prompt + temperature, on disk)
+# Re-ingesting unchanged text skips the API call entirely
+ENABLE_EXTRACTION_CACHE = True
+EXTRACTION_CACHE_DIR = f"{GRAPH_DB_PATH}/extraction_cache"
+EXTRACTION_CACHE_TTL = 30 * 86400  # seconds (30 days)
 
 # Entity Types (customize for your domain)
 ENTITY_TYPES = [
@@ -65,6 +78,13 @@ MAX_HOPS = 3                    # Maximum path length
 MAX_PATHS_PER_QUERY = 10        # Top paths to consider
 MIN_CONFIDENCE = 0.40           # Minimum edge confidence (hard filter)
 SOFT_CONFIDENCE = 0.70          # Soft threshold for penalties
+# Adjacency lists (outgoing + incoming) kept in process for BFS (one Neo4j
+# round trip per node instead of per expansion); invalidated on writes,
+# the columnar edge table is replaced when full
+ADJACENCY_CACHE_MAX_NODES = 50000
+# search_by_query results per (normalized query, graph version); any write bumps the version
+GRAPH_SEARCH_CACHE_SIZE = 1024
+ENTITY_RESOLUTION_CACHE_SIZE = 8192  # Resolved IDs per (entity ref, graph version)
 
 # Scoring Weights for Edge Types
 EDGE_WEIGHTS = {
@@ -83,6 +103,26 @@ EDGE_WEIGHTS = {
     'MENTIONED_IN': 0.50,
 }
 
+# Edge-type lookup table (precomputed at import)
+# Edges carry an integer type id so path scoring indexes an array instead of
+# hashing the type string per edge. Unknown types map to the last slot (0.5).
+EDGE_TYPE_TO_ID = {t: i for i, t in enumerate(RELATIONSHIP_TYPES)}
+UNKNOWN_EDGE_TYPE_ID = len(RELATIONSHIP_TYPES)
+EDGE_WEIGHT_VEC = np.array(
+    [EDGE_WEIGHTS.get(t, 0.5) for t in RELATIONSHIP_TYPES] + [0.5],
+    dtype=np.float32
+)
+
+
+def get_edge_type_id(edge_type: str) -> int:
+    """Map a relationship type name to its integer id"""
+    return EDGE_TYPE_TO_ID.get(edge_type, UNKNOWN_EDGE_TYPE_ID)
+
+
+def get_edge_weight(edge_type_id: int) -> float:
+    """Scoring weight for an integer edge type id"""
+    return float(EDGE_WEIGHT_VEC[edge_type_id])
+
 # Path Scoring Weights
 PATH_SCORING_WEIGHTS = {
     'length': 0.3,      # Shorter paths preferred
@@ -4,6 +4,8 @@
 ═══════════════════════════════════════════════════════════════
 """
 
+import numpy as np
+
 # HyDE Settings
 ENABLE_HYDE = True
 HYDE_MODEL = "gpt-5-chat"        # Deployment name for Azure OpenAI
@@ -15,6 +17,16 @@ ENABLE_QUERY_ANALYSIS = True
 ANALYSIS_MODEL = "gpt-5-chat"
 ANALYSIS_TEMPERATURE = 0.1       # Low temperature for classification
 
+# Query Routing
+# Longer queries are never greetings / chitchat / short lookups: the router
+# skips those checks (and its cache) and only looks for agentic keywords
+ROUTER_SHORT_QUERY_MAX_CHARS = 200
+
+# Result Caches (keyed on the normalized query)
+ROUTE_CACHE_SIZE = 4096              # QueryRouter routes (in-process LRU)
+QUERY_TRANSFORM_CACHE_SIZE = 2048    # Analysis profiles / HyDE documents
+QUERY_TRANSFORM_CACHE_TTL = 3600     # seconds
+
 # Adaptive Search Weight Profiles
 # Weights must sum to ~1.0 ideally, but normalization handles it
 WEIGHT_PROFILES = {
@@ -49,3 +61,13 @@ WEIGHT_PROFILES = {
         'description': 'General/Unclassified query'
     }
 }
+
+# Weight profiles as a (profiles x methods) matrix, precomputed at import
+# Row order follows WEIGHT_PROFILE_NAMES, column order follows SEARCH_METHODS
+SEARCH_METHODS = ('vector', 'bm25', 'graph')
+WEIGHT_PROFILE_NAMES = tuple(WEIGHT_PROFILES)
+WEIGHT_PROFILE_INDEX = {name: i for i, name in enumerate(WEIGHT_PROFILE_NAMES)}
+WEIGHT_PROFILE_MATRIX = np.array(
+    [[WEIGHT_PROFILES[name][m] for m in SEARCH_METHODS] for name in WEIGHT_PROFILE_NAMES],
+    dtype=np.float64
+)
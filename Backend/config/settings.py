@@ -24,6 +24,11 @@ class Settings(BaseSettings):
     AZURE_OPENAI_API_VERSION: str = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01")
     AZURE_OPENAI_EMBEDDING_DEPLOYMENT: str = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-ada-002")
     
+    # Small/cheap deployment for simple queries and classification calls
+    # (empty = use AZURE_OPENAI_DEPLOYMENT_NAME for everything)
+    AZURE_OPENAI_DEPLOYMENT_MINI: str = os.getenv("AZURE_OPENAI_DEPLOYMENT_MINI", "")
+    MODEL_ROUTING_MINI_MAX_CHARS: int = int(os.getenv("MODEL_ROUTING_MINI_MAX_CHARS", "2000"))
+    
     # ─────────────────────────────────────────────────────────
     #  🤖 GPT-5 Model Configuration
     # ─────────────────────────────────────────────────────────
@@ -66,6 +71,16 @@ class Settings(BaseSettings):
     # ─────────────────────────────────────────────────────────
     ENABLE_MULTIMODAL: bool = os.getenv("ENABLE_MULTIMODAL", "true").lower() == "true"
     OLLAMA_VISION_MODEL: str = os.getenv("OLLAMA_VISION_MODEL", "llama3.2-vision")
+    OLLAMA_VISION_CONCURRENCY: int = int(os.getenv("OLLAMA_VISION_CONCURRENCY", "4"))
+    
+    # PDF text extraction: worker processes (0 = CPU count) and the page count
+    # below which pages are read in-process (pool startup would dominate)
+    PDF_PARSE_WORKERS: int = int(os.getenv("PDF_PARSE_WORKERS", "0"))
+    PDF_PARALLEL_MIN_PAGES: int = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+    
+    # Extracted pages of already-ingested PDFs, keyed by file content (0 = disabled)
+    PDF_PAGE_CACHE_DIR: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "page_cache")
+    PDF_PAGE_CACHE_SIZE_MB: int = int(os.getenv("PDF_PAGE_CACHE_SIZE_MB", "512"))
 
     # ─────────────────────────────────────────────────────────
     #  🧠 RAG Configuration
@@ -80,9 +95,22 @@ class Settings(BaseSettings):
     SIMILARITY_THRESHOLD: float = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
     MAX_CONTEXT_CHUNKS: int = int(os.getenv("MAX_CONTEXT_CHUNKS", "8"))
     
+    # Reranker short-circuit (fused RRF scores as a fraction of the max possible 1/k)
+    RERANK_SKIP_SCORE: float = float(os.getenv("RERANK_SKIP_SCORE", "0.9"))
+    RERANK_SKIP_GAP: float = float(os.getenv("RERANK_SKIP_GAP", "0.3"))
+    RERANK_MAX_CANDIDATES: int = int(os.getenv("RERANK_MAX_CANDIDATES", "20"))
+    RERANK_CANDIDATE_MASS: float = float(os.getenv("RERANK_CANDIDATE_MASS", "0.9"))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "16"))  # Cross-encoder pairs per forward pass
+    RERANK_SCORE_CACHE_SIZE: int = int(os.getenv("RERANK_SCORE_CACHE_SIZE", "100000"))  # (query, chunk) scores kept
+    # "int8": dynamic-quantized ONNX cross-encoder (VNNI), "float32": PyTorch model
+    RERANKER_DTYPE: str = os.getenv("RERANKER_DTYPE", "int8").lower()
+    # "auto": CUDA (fp16) when a GPU is present, else CPU; or force "cpu" / "cuda"
+    RERANKER_DEVICE: str = os.getenv("RERANKER_DEVICE", "auto").lower()
+    
     # Chunking Strategy
     CHUNKING_STRATEGY: str = os.getenv("CHUNKING_STRATEGY", "recursive").lower()
     AGENTIC_WINDOW_SIZE: int = int(os.getenv("AGENTIC_WINDOW_SIZE", "20"))
+    AGENTIC_MAX_CONCURRENCY: int = int(os.getenv("AGENTIC_MAX_CONCURRENCY", "8"))
     
     # ─────────────────────────────────────────────────────────
     #  🔍 HNSW Configuration
@@ -91,6 +119,15 @@ class Settings(BaseSettings):
     HNSW_EF_CONSTRUCTION: int = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
     HNSW_EF_SEARCH: int = int(os.getenv("HNSW_EF_SEARCH", "100"))
     EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+    # "int8": int8 ONNX encoder (VNNI) + 8-bit scalar-quantized HNSW storage
+    # "float32": full-precision encoder and flat HNSW storage
+    # Switching changes the embedding space: a stored index built with the
+    # other setting is discarded on load and documents must be re-uploaded
+    EMBEDDING_DTYPE: str = os.getenv("EMBEDDING_DTYPE", "float32").lower()
+    # Index + metadata are written after every ingested document by default;
+    # N > 1 (opt-in) batches the writes across N documents (flushed at shutdown),
+    # at the cost of losing unflushed documents from vector search on a crash
+    VECTOR_STORE_FLUSH_EVERY: int = int(os.getenv("VECTOR_STORE_FLUSH_EVERY", "1"))
     
     # ─────────────────────────────────────────────────────────
     #  🌐 Server Configuration
@@ -8,6 +8,21 @@ Run this once to download required models and data
 import nltk
 import os
 
+# (resource name, path inside the NLTK data directory)
+NLTK_RESOURCES = [
+    ('punkt', 'tokenizers/punkt'),
+    ('stopwords', 'corpora/stopwords'),
+]
+
+def ensure_nltk_resource(name: str, path: str) -> bool:
+    """Download an NLTK resource only if it isn't already installed"""
+    try:
+        nltk.data.find(path)
+        return False
+    except LookupError:
+        nltk.download(name, quiet=True)
+        return True
+
 def initialize():
     """Download required NLTK data"""
     print("🔄 Initializing Hybrid RAG dependencies...")
@@ -21,8 +36,9 @@ def initialize():
     # Download NLTK data (minimal - we use simple tokenization)
     try:
         print("🔄 Checking NLTK data...")
-        nltk.download('punkt', quiet=True)
-        nltk.download('stopwords', quiet=True)
+        for name, path in NLTK_RESOURCES:
+            if ensure_nltk_resource(name, path):
+                print(f"✅ Downloaded {name}")
         print("✅ NLTK data ready")
     except Exception as e:
         print(f"⚠️  NLTK download warning: {e}")
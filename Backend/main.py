@@ -13,6 +13,7 @@
 ═══════════════════════════════════════════════════════════════
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -44,6 +45,12 @@ async def lifespan(app: FastAPI):
     vs = get_vector_store()
     print_success(f"Vector Store ready ({vs.index.ntotal} vectors)")
     
+    # Load the chat pipeline (models, indices) now instead of on the first query
+    print_info("Loading Chat Service...")
+    from services.chat_service import get_chat_service
+    await asyncio.to_thread(get_chat_service)
+    print_success("Chat Service ready")
+    
     # Check Azure OpenAI connection
     print_info("Testing Azure OpenAI connection...")
     try:
@@ -72,6 +79,10 @@ async def lifespan(app: FastAPI):
     # Shutdown
     # ─────────────────────────────────────
     logger.info("\n🌙 Shutting down Cosmic AI...")
+    
+    # Persist the index / metadata of documents added since the last write
+    from services.vector_store import get_vector_store
+    get_vector_store().flush()
 
 
 # ─────────────────────────────────────────────────────────────
@@ -4,15 +4,44 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-import json
-import pickle
 import os
-from typing import List, Dict, Tuple
-from rank_bm25 import BM25Okapi
+import re
+import functools
+import multiprocessing as mp
+import bm25s
+import msgpack
+import numpy as np
+import orjson
+from typing import List, Dict, Tuple, Optional
+from config import cache_config
+from services.cache_service import get_cache_service
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
+# Alphanumeric runs (plus hyphens/underscores) of 2+ chars.
+# This preserves error codes like "ABC-123" or "error_500"
+_TOKEN_RE = re.compile(r"[\w\-]{2,}")
+
+# Below this many chunks, process start-up costs more than it saves
+PARALLEL_TOKENIZE_MIN_CHUNKS = 2000
+PARALLEL_TOKENIZE_CHUNKSIZE = 256
+
+# Scoring backend: "auto" JIT-compiles the posting-list summation with Numba
+# when it is installed, and falls back to plain NumPy otherwise
+BM25_BACKEND = "auto"
+
+
+def _tokenize(text: str) -> List[str]:
+    """Module-level tokenizer (picklable for multiprocessing workers)"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+@functools.lru_cache(maxsize=4096)
+def _tokenize_query(text: str) -> Tuple[str, ...]:
+    """Memoized query tokenizer (queries are short and repeat often)"""
+    return tuple(_tokenize(text))
+
 class BM25Service:
     """
     ┌─────────────────────────────────────────────┐
@@ -21,24 +50,31 @@ class BM25Service:
     │  Features:                                  │
     │  • Fast keyword-based retrieval            │
     │  • Exact term matching                     │
-    │  • TF-IDF scoring                          │
+    │  • TF-IDF scoring (sparse matrix, bm25s)   │
     │  • Optimized for codes, IDs, names         │
     └─────────────────────────────────────────────┘
     """
     
     def __init__(
         self,
-        index_path: str = "./indices/bm25_index.pkl",
-        corpus_path: str = "./indices/bm25_corpus.json"
+        index_path: str = "./indices/bm25_index",
+        corpus_path: str = "./indices/bm25_corpus.msgpack"
     ):
         self.index_path = index_path
         self.corpus_path = corpus_path
         self.bm25 = None
         self.chunks = []
-        self.tokenized_corpus = []
+        
+        # Token storage: shared vocabulary + one int32 id array per chunk
+        # (~4 bytes per token instead of a Python str object per token)
+        self.vocab: Dict[str, int] = {}
+        self.doc_token_ids: List[np.ndarray] = []
+        
+        # Bumped whenever the index changes so cached searches never go stale
+        self.index_version = 0
         
         # Load existing index if available
-        if os.path.exists(index_path) and os.path.exists(corpus_path):
+        if self._existing_corpus_path():
             self.load_index()
             logger.info(f"✅ BM25 index loaded from {index_path}")
         else:
@@ -50,30 +86,11 @@ class BM25Service:
         
         Steps:
         1. Lowercase
-        2. Tokenize (simple split)
+        2. Tokenize (single compiled regex pass)
         3. Remove very short tokens
         4. Keep important chars (for error codes, IDs)
         """
-        text = text.lower()
-        
-        # Simple tokenization - keeps alphanumeric and hyphens/underscores
-        # This preserves error codes like "ABC-123" or "error_500"
-        tokens = []
-        current_token = ""
-        
-        for char in text:
-            if char.isalnum() or char in ['-', '_']:
-                current_token += char
-            else:
-                if len(current_token) > 1:  # Keep tokens longer than 1 char
-                    tokens.append(current_token)
-                current_token = ""
-        
-        # Don't forget last token
-        if len(current_token) > 1:
-            tokens.append(current_token)
-        
-        return tokens
+        return _tokenize(text)
     
     def build_index(self, chunks: List[Dict]):
         """
@@ -92,45 +109,122 @@ class BM25Service:
         
         self.chunks = chunks
         
-        # Tokenize all chunks
-        self.tokenized_corpus = []
-        for chunk in chunks:
-            tokens = self.preprocess_text(chunk['content'])
-            self.tokenized_corpus.append(tokens)
+        # Tokenize all chunks (fan out across cores for large corpora)
+        texts = [chunk['content'] for chunk in chunks]
+        if len(texts) >= PARALLEL_TOKENIZE_MIN_CHUNKS:
+            with mp.Pool() as pool:
+                tokenized_corpus = pool.map(
+                    _tokenize, texts, chunksize=PARALLEL_TOKENIZE_CHUNKSIZE
+                )
+        else:
+            tokenized_corpus = [_tokenize(text) for text in texts]
+        
+        # Build BM25 index (precomputed sparse term-document scores)
+        # Replacing self.bm25 first releases any memory-mapped index before
+        # save_index() overwrites its files
+        self.bm25 = self._index_corpus(tokenized_corpus)
+        self.index_version += 1
         
-        # Build BM25 index
-        self.bm25 = BM25Okapi(self.tokenized_corpus)
+        # Keep only the compact id form of the tokens
+        self.vocab, self.doc_token_ids = self._encode_corpus(tokenized_corpus)
+        del tokenized_corpus
         
         # Save to disk
         self.save_index()
         
         logger.info(f"✅ BM25 index built and saved")
     
+    @staticmethod
+    def _index_corpus(tokenized_corpus: List[List[str]]) -> bm25s.BM25:
+        """
+        Create a bm25s retriever over an already tokenized corpus
+        
+        bm25s precomputes every BM25 term weight (idf, tf saturation and
+        doc-length norm) into a vocab-major scipy.sparse matrix, so scoring a
+        query only sums the |Q| posting columns: O(|Q| · avg_df). With the
+        Numba backend that summation runs as a compiled loop over the CSC
+        arrays instead of NumPy fancy indexing.
+        """
+        retriever = bm25s.BM25(backend=BM25_BACKEND)
+        retriever.index(tokenized_corpus, show_progress=False)
+        return retriever
+    
+    @staticmethod
+    def _encode_corpus(
+        tokenized_corpus: List[List[str]]
+    ) -> Tuple[Dict[str, int], List[np.ndarray]]:
+        """Map token lists to a shared vocabulary and per-chunk int32 id arrays"""
+        vocab: Dict[str, int] = {}
+        doc_token_ids = []
+        for tokens in tokenized_corpus:
+            ids = [vocab.setdefault(token, len(vocab)) for token in tokens]
+            doc_token_ids.append(np.array(ids, dtype=np.int32))
+        return vocab, doc_token_ids
+    
+    def _decode_corpus(self) -> List[List[str]]:
+        """Expand the id arrays back into token lists (only needed to rebuild)"""
+        words = np.array(list(self.vocab), dtype=object)
+        return [words[ids].tolist() for ids in self.doc_token_ids]
+    
     def save_index(self):
         """Save BM25 index and corpus to disk"""
         os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
         
-        # Save BM25 index
-        with open(self.index_path, 'wb') as f:
-            pickle.dump(self.bm25, f)
+        # Save BM25 index (bm25s writes a directory of .npy arrays)
+        self.bm25.save(self.index_path)
         
-        # Save corpus metadata
+        # Save corpus metadata (MessagePack: compact, no Unicode JSON decode)
+        # Vocabulary is stored in id order; id arrays as raw int32 bytes
         corpus_data = {
             "chunks": self.chunks,
-            "tokenized_corpus": self.tokenized_corpus
+            "vocab": list(self.vocab),
+            "doc_token_ids": [ids.tobytes() for ids in self.doc_token_ids]
         }
-        with open(self.corpus_path, 'w', encoding='utf-8') as f:
-            json.dump(corpus_data, f, ensure_ascii=False)
+        with open(self.corpus_path, 'wb') as f:
+            msgpack.pack(corpus_data, f, use_bin_type=True)
     
     def load_index(self):
         """Load BM25 index from disk"""
-        with open(self.index_path, 'rb') as f:
-            self.bm25 = pickle.load(f)
+        corpus_path = self._existing_corpus_path()
+        if corpus_path.endswith(".json"):
+            # Legacy corpus written before the MessagePack switch
+            with open(corpus_path, 'rb') as f:
+                corpus_data = orjson.loads(f.read())
+        else:
+            with open(corpus_path, 'rb') as f:
+                corpus_data = msgpack.unpack(f, raw=False)
+        
+        self.chunks = corpus_data['chunks']
+        if 'doc_token_ids' in corpus_data:
+            self.vocab = {token: i for i, token in enumerate(corpus_data['vocab'])}
+            self.doc_token_ids = [
+                np.frombuffer(ids, dtype=np.int32) for ids in corpus_data['doc_token_ids']
+            ]
+        else:
+            # Legacy corpus stored one string list per chunk
+            self.vocab, self.doc_token_ids = self._encode_corpus(corpus_data['tokenized_corpus'])
+        del corpus_data
+        
+        if os.path.isdir(self.index_path):
+            # Memory-map the .npy score arrays: no unpickling, pages shared via OS cache
+            self.bm25 = bm25s.BM25.load(self.index_path, mmap=True)
+        else:
+            # No bm25s index on disk (e.g. legacy rank_bm25 pickle): rebuild from tokens
+            logger.info("🔨 Rebuilding BM25 index from stored corpus...")
+            self.bm25 = self._index_corpus(self._decode_corpus())
         
-        with open(self.corpus_path, 'r', encoding='utf-8') as f:
-            corpus_data = json.load(f)
-            self.chunks = corpus_data['chunks']
-            self.tokenized_corpus = corpus_data['tokenized_corpus']
+        self.index_version += 1
+    
+    def _existing_corpus_path(self) -> Optional[str]:
+        """Return the corpus file to load, falling back to a legacy JSON corpus"""
+        if os.path.exists(self.corpus_path):
+            return self.corpus_path
+        
+        legacy_path = os.path.splitext(self.corpus_path)[0] + ".json"
+        if os.path.exists(legacy_path):
+            return legacy_path
+        
+        return None
     
     def search(self, query: str, top_k: int = 10) -> List[Tuple[Dict, float]]:
         """
@@ -152,18 +246,29 @@ class BM25Service:
             logger.warning("⚠️ BM25 index not built. Call build_index() first.")
             return []
         
-        # Tokenize query
-        query_tokens = self.preprocess_text(query)
+        # Tokenize query (memoized)
+        query_tokens = list(_tokenize_query(query))
+        if not query_tokens:
+            return []
         
-        # Get BM25 scores
+        # Cache check keyed on the sorted tokens: scores are a sum over query
+        # terms, so case, punctuation and word-order variants of a query (as
+        # the research agent's follow-up steps produce) share one entry
+        cache = get_cache_service()
+        cache_key = cache.generate_key("bm25", f"{self.index_version}|{top_k}|{' '.join(sorted(query_tokens))}")
+        cached_results = cache.get(cache_key)
+        if cached_results is not None:
+            return cached_results
+        
+        # Get BM25 scores (sparse column sums in NumPy, unknown terms ignored)
         scores = self.bm25.get_scores(query_tokens)
         
-        # Get top-k indices
-        top_indices = sorted(
-            range(len(scores)), 
-            key=lambda i: scores[i], 
-            reverse=True
-        )[:top_k]
+        # Get top-k indices (O(N) partition, then sort only the k winners)
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        top_indices = np.argpartition(-scores, k - 1)[:k]
+        top_indices = top_indices[np.argsort(-scores[top_indices])]
         
         # Return chunks with scores
         results = [
@@ -174,6 +279,8 @@ class BM25Service:
         
         logger.info(f"🔍 BM25 search: '{query}' → {len(results)} results")
         
+        cache.set(cache_key, results, ttl=cache_config.DEFAULT_TTL)
+        
         return results
 
 
@@ -6,22 +6,29 @@
 
 import time
 import hashlib
-import json
+import numpy as np
+import orjson
+from collections import OrderedDict
 from threading import Lock
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from config import cache_config
 from utils.logger import setup_logger
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 logger = setup_logger()
 
 class CacheService:
     """
-    Simple thread-safe in-memory cache with TTL.
+    Simple thread-safe in-memory LRU cache with TTL.
     """
     
     def __init__(self):
         self.enabled = cache_config.ENABLE_CACHE
-        self._cache = {}
+        self._cache = OrderedDict()
         self._lock = Lock()
         logger.info(f"🚀 CacheService initialized (Type: {cache_config.CACHE_TYPE})")
 
@@ -35,6 +42,7 @@ class CacheService:
                 data, expiry = self._cache[key]
                 if time.time() < expiry:
                     logger.debug(f"⚡ Cache HIT: {key[:20]}...")
+                    self._cache.move_to_end(key)
                     return data
                 else:
                     logger.debug(f"🏚️ Cache EXPIRED: {key[:20]}...")
@@ -52,28 +60,179 @@ class CacheService:
         expiry = time.time() + ttl
         
         with self._lock:
-            # Simple eviction if full (random/arbitrary for now, or clear old)
-            if len(self._cache) >= cache_config.MAX_CACHE_SIZE:
-                 # Clear 10% of cache to make space (simple strategy)
-                 keys_to_remove = list(self._cache.keys())[:int(cache_config.MAX_CACHE_SIZE * 0.1)]
-                 for k in keys_to_remove:
-                     del self._cache[k]
+            if key in self._cache:
+                self._cache.move_to_end(key)
             
             self._cache[key] = (value, expiry)
+            
+            # Evict least recently used entries once over capacity
+            while len(self._cache) > cache_config.MAX_CACHE_SIZE:
+                self._cache.popitem(last=False)
 
     def generate_key(self, prefix: str, data: Any) -> str:
         """Generate a consistent hash key"""
         if isinstance(data, dict) or isinstance(data, list):
-            data_str = json.dumps(data, sort_keys=True)
+            data_bytes = orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
         else:
-            data_str = str(data)
+            data_bytes = str(data).encode()
+            
+        # Non-cryptographic hash: xxh3 is far cheaper than md5 on every lookup
+        if xxhash is not None:
+            digest = xxhash.xxh3_128_hexdigest(data_bytes)
+        else:
+            digest = hashlib.md5(data_bytes).hexdigest()
+            
+        return f"{prefix}:{digest}"
+
+
+class SemanticCache:
+    """
+    Thread-safe in-memory semantic cache with TTL.
+    
+    Entries are keyed by a query embedding instead of the exact query string,
+    so paraphrased questions ("how do I return an item" / "what's the return
+    process") hit the same entry. Lookups are one matrix-vector product over
+    the normalized embeddings of a scope (e.g. the queried file_ids).
+    
+    Defaults configure the RAG context cache; other callers pass their own
+    threshold/limits (max_scopes bounds how many scopes are kept, oldest first).
+    """
+    
+    def __init__(
+        self,
+        enabled: bool = None,
+        distance_threshold: float = None,
+        max_entries: int = None,
+        max_scopes: Optional[int] = None
+    ):
+        if enabled is None:
+            enabled = cache_config.ENABLE_SEMANTIC_CACHE
+        self.enabled = cache_config.ENABLE_CACHE and enabled
+        self.distance_threshold = (
+            cache_config.SEMANTIC_CACHE_DISTANCE_THRESHOLD
+            if distance_threshold is None else distance_threshold
+        )
+        self.max_entries = max_entries or cache_config.SEMANTIC_CACHE_MAX_ENTRIES
+        self.max_scopes = max_scopes
+        # scope -> (unit vectors (n, d), values, expiries)
+        self._scopes: Dict[Tuple, Tuple[np.ndarray, List[Any], List[float]]] = {}
+        self._lock = Lock()
+        logger.info(f"🚀 SemanticCache initialized (threshold: {self.distance_threshold})")
+
+    @staticmethod
+    def _scope(file_ids: Optional[List[str]]) -> Tuple:
+        return tuple(sorted(file_ids)) if file_ids else ()
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def check(self, vector: np.ndarray, file_ids: Optional[List[str]] = None) -> Optional[Any]:
+        """Return the value stored for the closest embedding, if within threshold"""
+        if not self.enabled:
+            return None
+        
+        query = self._normalize(vector)
+        if query is None:
+            return None
+        
+        with self._lock:
+            entry = self._scopes.get(self._scope(file_ids))
+            if entry is None:
+                return None
             
-        return f"{prefix}:{hashlib.md5(data_str.encode()).hexdigest()}"
+            vectors, values, expiries = entry
+            if vectors.shape[1] != query.shape[0]:
+                return None
+            
+            similarities = vectors @ query
+            best = int(np.argmax(similarities))
+            distance = 1.0 - float(similarities[best])
+            if distance <= self.distance_threshold and time.time() < expiries[best]:
+                logger.debug(f"⚡ Semantic cache HIT (distance: {distance:.3f})")
+                return values[best]
+        return None
+
+    def store(self, vector: np.ndarray, value: Any, file_ids: Optional[List[str]] = None, ttl: int = None):
+        """Store a value under an embedding (oldest entries evicted first)"""
+        if not self.enabled:
+            return
+        
+        unit = self._normalize(vector)
+        if unit is None:
+            return
+        
+        if ttl is None:
+            ttl = cache_config.DEFAULT_TTL
+        expiry = time.time() + ttl
+        scope = self._scope(file_ids)
+        
+        with self._lock:
+            entry = self._scopes.get(scope)
+            if entry is None or entry[0].shape[1] != unit.shape[0]:
+                vectors, values, expiries = np.empty((0, unit.shape[0]), dtype=np.float32), [], []
+            else:
+                vectors, values, expiries = entry
+            
+            # Drop expired entries, then the oldest ones over capacity
+            now = time.time()
+            keep = [i for i, exp in enumerate(expiries) if exp > now]
+            if len(keep) >= self.max_entries:
+                keep = keep[len(keep) - self.max_entries + 1:]
+            
+            self._scopes[scope] = (
+                np.vstack([vectors[keep], unit[None, :]]),
+                [values[i] for i in keep] + [value],
+                [expiries[i] for i in keep] + [expiry]
+            )
+            
+            # Dicts keep insertion order: drop the oldest scopes over the limit
+            while self.max_scopes is not None and len(self._scopes) > self.max_scopes:
+                del self._scopes[next(iter(self._scopes))]
+
+    def clear(self):
+        """Drop all entries (call when the indexed documents change)"""
+        with self._lock:
+            self._scopes.clear()
+
 
 _cache_service = None
+_semantic_cache = None
+_agent_search_cache = None
+_retrieval_generation = 0  # Bumped when the indexed documents change
 
 def get_cache_service():
     global _cache_service
     if _cache_service is None:
         _cache_service = CacheService()
     return _cache_service
+
+def get_semantic_cache() -> SemanticCache:
+    global _semantic_cache
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache()
+    return _semantic_cache
+
+def get_agent_search_cache() -> SemanticCache:
+    """Research agent's per-step search results (cleared with the RAG cache)"""
+    global _agent_search_cache
+    if _agent_search_cache is None:
+        _agent_search_cache = SemanticCache(
+            enabled=cache_config.ENABLE_AGENT_SEARCH_CACHE,
+            distance_threshold=1.0 - cache_config.AGENT_SEARCH_CACHE_SIM_THRESHOLD,
+            max_entries=cache_config.AGENT_SEARCH_CACHE_MAX_ENTRIES
+        )
+    return _agent_search_cache
+
+def retrieval_generation() -> int:
+    """Part of exact retrieval cache keys: entries from before a document change stop matching"""
+    return _retrieval_generation
+
+def clear_retrieval_caches():
+    """Drop cached retrieval results (call when the indexed documents change)"""
+    global _retrieval_generation
+    _retrieval_generation += 1
+    get_semantic_cache().clear()
+    get_agent_search_cache().clear()
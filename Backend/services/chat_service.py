@@ -4,10 +4,12 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-import json
-import time
+import asyncio
+import importlib
+import orjson
+import numpy as np
 from typing import List, Dict, Optional, AsyncGenerator
-from openai import AzureOpenAI, APIError, APIConnectionError
+from openai import AzureOpenAI, AsyncAzureOpenAI, APIError, APIConnectionError
 from config.settings import settings
 from config import agent_config
 from services.vector_store import get_vector_store
@@ -17,16 +19,29 @@ from services.hybrid_retriever import get_hybrid_retriever
 from services.reranker_service import get_reranker_service
 from services.graph_traversal import get_graph_traversal
 from services.query_transform_service import get_query_transform_service
-from services.context_compressor import get_context_compressor
-from services.research_agent import get_research_agent
-from services.cache_service import get_cache_service
-from services.query_router import get_query_router
+from config import compression_config
+from services.cache_service import get_cache_service, get_semantic_cache, retrieval_generation
+from services.query_router import get_query_router, ALL_RETRIEVERS
 from services.toon_formatter import ToonFormatter
 from services.response_formatter import ResponseFormatter
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
+# SSE frames are yielded as bytes (StreamingResponse sends them as-is);
+# only the content payload is serialized per token, with orjson
+SSE_DONE = b"data: " + orjson.dumps({"done": True}) + b"\n\n"
+
+# Sent while retrieval/compression run so the client's stream opens early
+# and the connection stays warm (frames without 'content' are ignored by the UI)
+SSE_THINKING = b"data: " + orjson.dumps({"status": "thinking"}) + b"\n\n"
+SSE_HEARTBEAT_INTERVAL = 1.0  # seconds
+
+
+def _sse_frame(payload: Dict) -> bytes:
+    """Encode one SSE data frame"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
 
 # ─────────────────────────────────────────────────────────────
 #  🛡️ System Prompt - Knowledge-Bound Guardrail
@@ -53,6 +68,11 @@ You are Cosmic AI, an intelligent and professional assistant.
 **Important:** Never use your general training knowledge to answer document-specific questions. Only use the provided CONTEXT.
 """
 
+# Built once and shared by every request: the system block is byte-identical
+# across calls and replicas, keeping it a reusable prompt-cache prefix.
+# Read-only - never mutate it.
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
 
 class ChatService:
     """
@@ -68,10 +88,69 @@ class ChatService:
             api_version=settings.AZURE_OPENAI_API_VERSION,
             azure_endpoint=settings.AZURE_OPENAI_API_BASE
         )
+        
+        # Async client for the request path: awaiting it never blocks the event loop
+        self.async_client = AsyncAzureOpenAI(
+            api_key=settings.AZURE_OPENAI_API_KEY,
+            api_version=settings.AZURE_OPENAI_API_VERSION,
+            azure_endpoint=settings.AZURE_OPENAI_API_BASE
+        )
         self.deployment = settings.AZURE_OPENAI_DEPLOYMENT_NAME
+        self.deployment_mini = settings.AZURE_OPENAI_DEPLOYMENT_MINI or self.deployment
+        
+        # ─────────────────────────────────────
+        # Service singletons, resolved once instead of on every request
+        # ─────────────────────────────────────
+        self._cache = get_cache_service()
+        self._semantic_cache = get_semantic_cache()
+        self._router = get_query_router()
+        self._qt = get_query_transform_service()
+        self._embeddings = get_embedding_service()
+        self._vector_store = get_vector_store()
+        self._bm25 = get_bm25_service()
+        self._hybrid = get_hybrid_retriever()
+        self._reranker = get_reranker_service()
+        # Neo4j may be unreachable at startup: bound on first successful use
+        self._graph = None
+        
+        # Optional features: their modules are only imported when enabled
+        self._agent_module = (
+            importlib.import_module("services.research_agent")
+            if agent_config.ENABLE_AGENTIC_RAG else None
+        )
+        self._compressor = None
+        self._statistical_compressor = None
+        if compression_config.ENABLE_COMPRESSION or compression_config.ENABLE_STATISTICAL_COMPRESSION:
+            compressor_module = importlib.import_module("services.context_compressor")
+            self._compressor = compressor_module.get_context_compressor()
+            if compression_config.ENABLE_STATISTICAL_COMPRESSION:
+                self._statistical_compressor = compressor_module.get_statistical_compressor()
         
         logger.info(f"💬 ChatService initialized")
         logger.info(f"   └─ Deployment: {self.deployment}")
+        if self.deployment_mini != self.deployment:
+            logger.info(f"   └─ Mini Deployment: {self.deployment_mini}")
+    
+    def _pick_deployment(
+        self,
+        route_metadata: Dict,
+        user_content: str,
+        context_chunks: List[Dict]
+    ) -> str:
+        """
+        Tiered model routing:
+        - Full model: many context chunks or multi-hop graph evidence
+        - Mini model: simple routes (no HyDE needed) with a short prompt
+        - Full model otherwise
+        """
+        if len(context_chunks) > 5 or any(chunk.get('graph_path') for chunk in context_chunks):
+            return self.deployment
+        
+        is_simple = route_metadata.get('skip_rag', False) or route_metadata.get('skip_hyde', False)
+        if is_simple and len(user_content) < settings.MODEL_ROUTING_MINI_MAX_CHARS:
+            return self.deployment_mini
+        
+        return self.deployment
     
     async def stream_chat_response(
         self,
@@ -79,8 +158,9 @@ class ChatService:
         history: List[Dict] = None,
         current_summary: str = "",
         use_rag: bool = True,
-        file_ids: List[str] = None
-    ) -> AsyncGenerator[str, None]:
+        file_ids: List[str] = None,
+        session_id: Optional[str] = None
+    ) -> AsyncGenerator[bytes, None]:
         """
         ┌─────────────────────────────────────────────┐
         │  🌊 Stream chat response with RAG           │
@@ -96,7 +176,7 @@ class ChatService:
         # ─────────────────────────────────────
         # SMART QUERY ROUTING
         # ─────────────────────────────────────
-        router = get_query_router()
+        router = self._router
         route, route_metadata = router.route_query(query)
         
         # Check if we can skip RAG entirely
@@ -111,53 +191,47 @@ class ChatService:
                 for i, word in enumerate(words):
                     # Add space back unless it's the last word
                     content = word + (" " if i < len(words) - 1 else "")
-                    yield f"data: {json.dumps({'content': content})}\n\n"
+                    yield _sse_frame({"content": content})
                     # Tiny delay to ensure frontend processes the chunk
-                    time.sleep(0.05)
+                    await asyncio.sleep(0.05)
                 
-                yield f"data: {json.dumps({'done': True})}\n\n"
+                yield SSE_DONE
                 logger.info(f"✅ Quick response streamed successfully")
                 return
         
         # ─────────────────────────────────────
-        # RAG Retrieval (Threaded to avoid blocking)
+        # RAG Retrieval (blocking steps run in worker threads)
         # ─────────────────────────────────────
         if use_rag:
+            yield SSE_THINKING
+            retrieval_task = asyncio.create_task(self._retrieve_rag_context(
+                query=query,
+                file_ids=file_ids,
+                route_metadata=route_metadata
+            ))
+            async for frame in self._heartbeat_until(retrieval_task):
+                yield frame
             try:
-                # Run heavy retrieval in a separate thread
-                import asyncio
-                context_chunks = await asyncio.to_thread(
-                    self._retrieve_rag_context,
-                    query=query,
-                    file_ids=file_ids,
-                    route_metadata=route_metadata
-                )
+                context_chunks = retrieval_task.result()
             except Exception as e:
-                logger.error(f"❌ RAG retrieval error in thread: {e}")
+                logger.error(f"❌ RAG retrieval error: {e}")
                 
         # ─────────────────────────────────────
-        # Step 2: Context Compression (Local LLM)
+        # Step 2: Context Compression (Local LLM, in a worker thread)
         # ─────────────────────────────────────
         context_text = ""
         if context_chunks:
-            # Save to cache if new
-            if use_rag:
-                # We can't easily check 'cached_context' here since we moved logic
-                # But we can cache the result
-                pass 
-                
-            try:
-                compressor = get_context_compressor()
-                # Returns compressed text OR full formatted text if compression disabled
-                context_text = compressor.compress(context_chunks, query)
-            except Exception as e:
-                logger.error(f"⚠️ Context compression failed: {e}")
-                context_text = ToonFormatter.format_full_context(context_chunks)
+            compress_task = asyncio.create_task(
+                asyncio.to_thread(self._compress_context, context_chunks, query)
+            )
+            async for frame in self._heartbeat_until(compress_task):
+                yield frame
+            context_text = compress_task.result()
 
         # ─────────────────────────────────────
         # Step 3: Prepare Messages
         # ─────────────────────────────────────
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        messages = [SYSTEM_MESSAGE]
         
         # Add Long-Term Memory (Recap) if available
         if current_summary:
@@ -166,49 +240,38 @@ class ChatService:
                 "content": f"PREVIOUS_RECAP: {current_summary}"
             })
         
-        # Build input payload (Combined for token efficiency)
-        input_parts = []
-        
-        # Add recent history (last 10 messages)
-        if history:
-            recent_history = history[-10:]
-            history_text = ToonFormatter.format_history(recent_history)
-            if history_text:
-                input_parts.append(f"HISTORY:\n{history_text}")
-        
-        # Add RAG context
-        if context_text:
-            input_parts.append(f"CONTEXT:\n{context_text}")
-        
-        # Add the query
-        input_parts.append(f"QUERY: {query}")
+        # Stable prefix first (system, recap, history) and the volatile
+        # CONTEXT + QUERY last, so the model-side prompt cache can reuse
+        # the prefix across turns of a session
+        self._append_user_messages(messages, history, context_text, query)
+        user_content = "\n\n".join(m["content"] for m in messages if m["role"] == "user")
         
-        # Combine into single user message
-        user_content = "\n\n".join(input_parts)
-        messages.append({"role": "user", "content": user_content})
+        deployment = self._pick_deployment(route_metadata, user_content, context_chunks)
         
         logger.info(f"📤 Sending to Azure OpenAI...")
         logger.info(f"   └─ Messages: {len(messages)}")
+        logger.info(f"   └─ Deployment: {deployment}")
         
         # ─────────────────────────────────────
         # Step 4: Stream Response
         # ─────────────────────────────────────
         try:
-            stream = self.client.chat.completions.create(
-                model=self.deployment,
+            stream = await self.async_client.chat.completions.create(
+                model=deployment,
                 messages=messages,
                 stream=True,
                 temperature=settings.GPT_TEMPERATURE,
                 max_tokens=settings.GPT_MAX_COMPLETION_TOKENS,
                 top_p=settings.GPT_TOP_P,
                 frequency_penalty=settings.GPT_FREQUENCY_PENALTY,
-                presence_penalty=settings.GPT_PRESENCE_PENALTY
+                presence_penalty=settings.GPT_PRESENCE_PENALTY,
+                **self._session_kwargs(session_id)
             )
 
             
             full_response = ""
             
-            for chunk in stream:
+            async for chunk in stream:
                 if chunk.choices and len(chunk.choices) > 0:
                     delta = chunk.choices[0].delta
                     if delta and delta.content:
@@ -216,103 +279,219 @@ class ChatService:
                         full_response += content
                         
                         # Yield SSE formatted data
-                        yield f"data: {json.dumps({'content': content})}\n\n"
+                        yield _sse_frame({"content": content})
             
             # Send completion signal
-            yield f"data: {json.dumps({'done': True})}\n\n"
+            yield SSE_DONE
             
             logger.info(f"✅ Response completed: {len(full_response)} chars")
             
         except Exception as e:
             logger.error(f"❌ Streaming error: {e}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield _sse_frame({"error": str(e)})
     
-    def _retrieve_rag_context(self, query: str, file_ids: List[str], route_metadata: Dict = None) -> List[Dict]:
-        """Synchronous method for heavy RAG retrieval"""
+    @staticmethod
+    async def _heartbeat_until(task: asyncio.Task) -> AsyncGenerator[bytes, None]:
+        """Yield a 'thinking' SSE frame every SSE_HEARTBEAT_INTERVAL until task finishes"""
+        while not task.done():
+            done, _ = await asyncio.wait({task}, timeout=SSE_HEARTBEAT_INTERVAL)
+            if not done:
+                yield SSE_THINKING
+
+    def _graph_traversal(self):
+        """Graph traversal singleton, bound once Neo4j is reachable"""
+        if self._graph is None:
+            self._graph = get_graph_traversal()
+        return self._graph
+
+    def _compress_context(self, context_chunks: List[Dict], query: str) -> str:
+        """Compress retrieved chunks into the CONTEXT text (blocking: Ollama call)"""
+        if self._compressor is None:
+            context_text = ToonFormatter.format_full_context(context_chunks)
+        else:
+            try:
+                # Returns compressed text OR full formatted text if compression disabled
+                context_text = self._compressor.compress(context_chunks, query)
+            except Exception as e:
+                logger.error(f"⚠️ Context compression failed: {e}")
+                context_text = ToonFormatter.format_full_context(context_chunks)
+        
+        # Still large (compression skipped/failed): drop low-information sentences
+        if (self._statistical_compressor is not None and
+                len(context_text) > compression_config.STATISTICAL_COMPRESSION_THRESHOLD_CHARS):
+            context_text = self._statistical_compressor.compress(context_text, query)
+        
+        return context_text
+
+    @staticmethod
+    def _append_user_messages(
+        messages: List[Dict],
+        history: List[Dict],
+        context_text: str,
+        query: str
+    ):
+        """
+        Append the user turn as two messages:
+        A. HISTORY (last 10 messages) - stable across a session's turns
+        B. CONTEXT + QUERY - changes on every call, so it goes last
+        """
+        if history:
+            history_text = ToonFormatter.format_history(history[-10:])
+            if history_text:
+                messages.append({"role": "user", "content": f"HISTORY:\n{history_text}"})
+        
+        query_parts = []
+        if context_text:
+            query_parts.append(f"CONTEXT:\n{context_text}")
+        query_parts.append(f"QUERY: {query}")
+        messages.append({"role": "user", "content": "\n\n".join(query_parts)})
+
+    @staticmethod
+    def _session_kwargs(session_id: Optional[str]) -> Dict:
+        """Stable per-session 'user' field so requests can be affinity-routed to a warm prompt cache"""
+        return {"user": session_id} if session_id else {}
+
+    async def _retrieve_rag_context(self, query: str, file_ids: List[str], route_metadata: Dict = None) -> List[Dict]:
+        """
+        Heavy RAG retrieval.
+        Independent blocking calls (LLM transforms, retrievers) run concurrently
+        in worker threads, so latency follows the slowest call, not the sum.
+        """
         context_chunks = []
         route_metadata = route_metadata or {}
         
+        # Retrieval methods worth running for this query (router decides)
+        retrievers = route_metadata.get('retrievers', ALL_RETRIEVERS)
+        
         # ─────────────────────────────────────
         # Cache Check
         # ─────────────────────────────────────
-        cache = get_cache_service()
-        cache_key = cache.generate_key("rag_context", query)
+        cache = self._cache
+        # Scoped like the semantic cache (same query, other documents = other
+        # entry) and versioned so document changes invalidate it
+        cache_key = cache.generate_key(
+            "rag_context", [retrieval_generation(), sorted(file_ids) if file_ids else [], query]
+        )
         cached_context = cache.get(cache_key)
         
         if cached_context:
             logger.info("⚡ Cache Hit: Using cached retrieval results")
             return cached_context
 
+        # Embed the original query once: reused by the semantic cache and vector search
+        # (keyword-only routes skip the embedding, and with it the semantic cache)
+        query_embedding = None
+        if 'vector' in retrievers:
+            try:
+                query_embedding = await asyncio.to_thread(
+                    self._embeddings.embed_query, query
+                )
+            except Exception as e:
+                logger.error(f"⚠️ Query embedding failed: {e}")
+
+        # ─────────────────────────────────────
+        # Semantic Cache Check (paraphrases of earlier queries)
+        # ─────────────────────────────────────
+        semantic_cache = self._semantic_cache
+        if semantic_cache.enabled and query_embedding is not None:
+            semantic_context = semantic_cache.check(vector=query_embedding, file_ids=file_ids)
+            if semantic_context:
+                logger.info("⚡ Semantic Cache Hit: Using retrieval results of a similar query")
+                cache.set(cache_key, semantic_context)
+                return semantic_context
+
+        def store(chunks: List[Dict]):
+            cache.set(cache_key, chunks)
+            if query_embedding is not None:
+                semantic_cache.store(vector=query_embedding, value=chunks, file_ids=file_ids)
+
         # ─────────────────────────────────────
         # Agentic RAG Check
         # ─────────────────────────────────────
-        if route_metadata.get('use_agent', False):
+        if route_metadata.get('use_agent', False) and self._agent_module is not None:
             logger.info(f"🤖 Agentic RAG Triggered: '{query}'")
             try:
-                agent = get_research_agent()
-                context_chunks = agent.research(query)
+                agent = await asyncio.to_thread(self._agent_module.get_research_agent)
+                context_chunks = await agent.research(query)
                 if context_chunks:
-                    cache.set(cache_key, context_chunks)
+                    store(context_chunks)
                     return context_chunks
             except Exception as e:
                 logger.error(f"❌ Agent failed: {e}")
 
+        # BM25 and Graph search use the original query, so they can start
+        # right away and overlap with the query transformation below
+        retriever_tasks = {}
+        if 'bm25' in retrievers:
+            retriever_tasks['BM25'] = asyncio.create_task(
+                asyncio.to_thread(self._bm25.search, query, top_k=10)
+            )
+        if 'graph' in retrievers:
+            retriever_tasks['Graph'] = asyncio.create_task(
+                asyncio.to_thread(lambda: self._graph_traversal().search_by_query(query))
+            )
+
         # ─────────────────────────────────────
         # Step 0: Query Transformation
         # ─────────────────────────────────────
         search_query = query
         search_weights = [0.35, 0.35, 0.30]
         
-        # Check if we should skip HyDE (for simple queries)
-        use_hyde = not route_metadata.get('skip_hyde', False)
+        # Check if we should skip HyDE (for simple queries; it only feeds vector search)
+        use_hyde = not route_metadata.get('skip_hyde', False) and 'vector' in retrievers
         
-        try:
-            qt_service = get_query_transform_service()
+        # Weights and HyDE only matter when several retrievers are fused
+        if len(retrievers) == 1:
+            logger.info(f"⚡ Single retriever ({next(iter(retrievers))}): skipping query transformation")
+        else:
+            try:
+                qt_service = self._qt
             
-            # A. Analysis (always run for weight optimization)
-            analysis = qt_service.analyze_query(query)
-            weights = analysis.get('weights', {})
-            search_weights = [
-                weights.get('vector', 0.35),
-                weights.get('bm25', 0.35),
-                weights.get('graph', 0.30)
-            ]
+                # A. Analysis (always run for weight optimization)
+                # B. HyDE (conditionally based on route) - independent of A, run together
+                # on the async client, overlapping the BM25 / Graph searches above
+                if use_hyde:
+                    logger.info("🧠 Using HyDE for query enhancement")
+                    analysis, hyde_doc = await asyncio.gather(
+                        qt_service.aanalyze_query(query),
+                        qt_service.agenerate_hyde_doc(query)
+                    )
+                else:
+                    analysis = await qt_service.aanalyze_query(query)
             
-            # B. HyDE (conditionally based on route)
-            # B. HyDE (conditionally based on route)
-            if use_hyde:
-                logger.info("🧠 Using HyDE for query enhancement")
-                hyde_doc = qt_service.generate_hyde_doc(query)
-                
-                # C. Self-Critique & Weight Adjustment
-                critique = qt_service.critique_hyde(query, hyde_doc)
-                adjusted_weights_dict = qt_service.adjust_weights(weights, critique)
+                weights = analysis.get('weights', {})
+                search_weights = analysis['weight_vector'].tolist()
+            
+                if use_hyde:
+                    # C. Self-Critique & Weight Adjustment
+                    critique = await asyncio.to_thread(qt_service.critique_hyde, query, hyde_doc)
+                    adjusted_weights_dict = qt_service.adjust_weights(weights, critique)
                 
-                # Update search weights list [vector, bm25, graph]
-                search_weights = [
-                    adjusted_weights_dict.get('vector', 0.35),
-                    adjusted_weights_dict.get('bm25', 0.35),
-                    adjusted_weights_dict.get('graph', 0.30)
-                ]
+                    # Update search weights list [vector, bm25, graph]
+                    search_weights = [
+                        adjusted_weights_dict.get('vector', 0.35),
+                        adjusted_weights_dict.get('bm25', 0.35),
+                        adjusted_weights_dict.get('graph', 0.30)
+                    ]
                 
-                # Handle Low Confidence / Fallback
-                if critique.get('recommendation') == 'trust_low':
-                    logger.info("⚠️ Low Confidence HyDE: Generating fallback from alternative causes")
-                    alts = critique.get('alternative_causes', [])
-                    if alts:
-                         fallback_text = f"Alternative causes: {', '.join(alts)}"
-                         search_query = f"{query}\n{fallback_text}"
+                    # Handle Low Confidence / Fallback
+                    if critique.get('recommendation') == 'trust_low':
+                        logger.info("⚠️ Low Confidence HyDE: Generating fallback from alternative causes")
+                        alts = critique.get('alternative_causes', [])
+                        if alts:
+                             fallback_text = f"Alternative causes: {', '.join(alts)}"
+                             search_query = f"{query}\n{fallback_text}"
+                        else:
+                             search_query = query # Revert to original if no alternatives
                     else:
-                         search_query = query # Revert to original if no alternatives
-                else:
-                    search_query = hyde_doc
+                        search_query = hyde_doc
 
-            else:
-                logger.info("⚡ Skipping HyDE (simple query - exact matching preferred)")
-                search_query = query
+                else:
+                    logger.info("⚡ Skipping HyDE (simple query - exact matching preferred)")
+                    search_query = query
             
-        except Exception as e:
-            logger.error(f"⚠️ Query transformation failed: {e}")
+            except Exception as e:
+                logger.error(f"⚠️ Query transformation failed: {e}")
             
         # ─────────────────────────────────────
         # Step 1: Ultimate Hybrid RAG Retrieval
@@ -320,48 +499,57 @@ class ChatService:
         logger.info("🔍 Ultimate Hybrid Retrieval Pipeline Starting...")
         
         try:
-            embedding_service = get_embedding_service()
-            vector_store = get_vector_store()
-            bm25_service = get_bm25_service()
-            hybrid_retriever = get_hybrid_retriever()
-            reranker = get_reranker_service()
+            hybrid_retriever = self._hybrid
+            reranker = self._reranker
             
-            # 1A. Vector
-            query_embedding = embedding_service.embed_query(search_query)
-            vector_results = vector_store.search(query_embedding, top_k=10, file_ids=file_ids)
-            vector_results_formatted = [
-                ({
-                    "id": f"vector_{i}",
-                    "content": result["content"],
-                    "file_id": result["file_id"],
-                    "chunk_index": result["chunk_index"]
-                }, result["score"])
-                for i, result in enumerate(vector_results)
-            ]
+            # 1A. Vector (needs the transformed query) + 1B. BM25 + 1C. Graph
+            if 'vector' in retrievers:
+                retriever_tasks['Vector'] = asyncio.create_task(asyncio.to_thread(
+                    self._vector_search, query, search_query, query_embedding, file_ids
+                ))
+            results = await asyncio.gather(*retriever_tasks.values(), return_exceptions=True)
             
-            # 1B. BM25
-            bm25_results = bm25_service.search(query, top_k=10)
+            # A failed or skipped retriever contributes no results instead of failing the query
+            retrieved = {'Vector': [], 'BM25': [], 'Graph': []}
+            for name, result in zip(retriever_tasks, results):
+                if isinstance(result, Exception):
+                    logger.error(f"❌ {name} search failed: {result}")
+                else:
+                    retrieved[name] = result
+            vector_results_formatted, bm25_results, graph_results = (
+                retrieved['Vector'], retrieved['BM25'], retrieved['Graph']
+            )
             
-            # 1C. Graph
-            graph_traversal = get_graph_traversal()
-            graph_results = graph_traversal.search_by_query(query)
+            # Skipped retrievers carry no weight in fusion
+            search_weights = [
+                weight if method in retrievers else 0.0
+                for weight, method in zip(search_weights, ('vector', 'bm25', 'graph'))
+            ]
             
             # 2. Fusion
             if vector_results_formatted or bm25_results or graph_results:
                 fused_results = hybrid_retriever.fuse(
                     result_sets=[vector_results_formatted, bm25_results, graph_results],
                     weights=search_weights,
-                    method_names=['Vector', 'BM25', 'Graph']
+                    method_names=['Vector', 'BM25', 'Graph'],
+                    # Nothing past the reranker candidate window is used as a chunk
+                    top_k=max(settings.TOP_K_RESULTS, settings.RERANK_MAX_CANDIDATES)
                 )
                 
-                # 3. Rerank
+                # 3. Rerank (skipped when fusion is already confident)
                 if fused_results:
-                    reranked_results = reranker.rerank(
-                        query=query,
-                        candidates=fused_results[:20],
-                        top_k=settings.TOP_K_RESULTS,
-                        threshold=0.0
-                    )
+                    top_k = settings.TOP_K_RESULTS
+                    if self._fusion_is_confident(fused_results, hybrid_retriever.k, top_k):
+                        logger.info("⚡ Skipping reranker: fused top result is confident")
+                        reranked_results = fused_results[:top_k]
+                    else:
+                        reranked_results = await asyncio.to_thread(
+                            reranker.rerank,
+                            query=query,
+                            candidates=fused_results[:self._rerank_candidate_count(fused_results, top_k)],
+                            top_k=top_k,
+                            threshold=0.0
+                        )
                     
                     context_chunks = [
                         {
@@ -376,7 +564,7 @@ class ChatService:
                         for chunk, score in reranked_results
                     ]
                     
-                    cache.set(cache_key, context_chunks)
+                    store(context_chunks)
                     return context_chunks
                     
         except Exception as e:
@@ -384,12 +572,72 @@ class ChatService:
             
         return []
 
+    @staticmethod
+    def _fusion_is_confident(fused_results: List[tuple], rrf_k: int, top_k: int) -> bool:
+        """
+        True when the fused top result clearly wins on its own: its RRF score
+        (normalized by the max possible 1/k) is high and well ahead of rank top_k.
+        """
+        top_score = fused_results[0][1] * rrf_k
+        cutoff_score = fused_results[top_k][1] * rrf_k if len(fused_results) > top_k else 0.0
+        return (
+            top_score > settings.RERANK_SKIP_SCORE and
+            top_score - cutoff_score > settings.RERANK_SKIP_GAP
+        )
+
+    @staticmethod
+    def _rerank_candidate_count(fused_results: List[tuple], top_k: int) -> int:
+        """Smallest prefix holding RERANK_CANDIDATE_MASS of the fused score mass (within [top_k, max])"""
+        scores = np.fromiter((score for _, score in fused_results), dtype=np.float64, count=len(fused_results))
+        total = scores.sum()
+        if total <= 0:
+            return settings.RERANK_MAX_CANDIDATES
+        needed = int(np.searchsorted(np.cumsum(scores) / total, settings.RERANK_CANDIDATE_MASS)) + 1
+        return max(top_k, min(settings.RERANK_MAX_CANDIDATES, needed))
+
+    def _vector_search(
+        self,
+        query: str,
+        search_query: str,
+        query_embedding: Optional[np.ndarray],
+        file_ids: List[str]
+    ) -> List[tuple]:
+        """
+        Vector search, formatted for RRF.
+        Reuses the precomputed query embedding; when HyDE rewrote the query,
+        searches with the mean of the unit query and HyDE embeddings.
+        """
+        embedding_service = self._embeddings
+        if query_embedding is None:
+            query_embedding = embedding_service.embed_query(query)
+        
+        search_embedding = query_embedding
+        if search_query != query:
+            hyde_embedding = embedding_service.embed_query(search_query)
+            search_embedding = (
+                0.5 * query_embedding / max(np.linalg.norm(query_embedding), 1e-12) +
+                0.5 * hyde_embedding / max(np.linalg.norm(hyde_embedding), 1e-12)
+            )
+        
+        vector_results = self._vector_store.search(search_embedding, top_k=10, file_ids=file_ids)
+        return [
+            ({
+                # Same id scheme as the BM25 index, so RRF merges both hits on a chunk
+                "id": f"{result['file_id']}_chunk_{result['chunk_index']}",
+                "content": result["content"],
+                "file_id": result["file_id"],
+                "chunk_index": result["chunk_index"]
+            }, result["score"])
+            for result in vector_results
+        ]
+
     async def get_chat_response(
         self,
         query: str,
         history: List[Dict] = None,
         use_rag: bool = True,
-        file_ids: List[str] = None
+        file_ids: List[str] = None,
+        session_id: Optional[str] = None
     ) -> Dict:
         """
         Get non-streaming chat response
@@ -401,11 +649,8 @@ class ChatService:
         # RAG Retrieval
         if use_rag:
             try:
-                embedding_service = get_embedding_service()
-                vector_store = get_vector_store()
-                
-                query_embedding = embedding_service.embed_query(query)
-                context_chunks = vector_store.search(
+                query_embedding = self._embeddings.embed_query(query)
+                context_chunks = self._vector_store.search(
                     query_embedding,
                     top_k=settings.TOP_K_RESULTS,
                     file_ids=file_ids
@@ -414,43 +659,34 @@ class ChatService:
                 logger.error(f"❌ RAG retrieval error: {e}")
         
         # Prepare messages
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        
-        # Add context
-        input_parts = []
-        
-        if history:
-            recent_history = history[-10:]
-            history_text = ToonFormatter.format_history(recent_history)
-            if history_text:
-                input_parts.append(f"HISTORY:\n{history_text}")
-        
-        if context_chunks:
-            context_text = ToonFormatter.format_full_context(context_chunks)
-            input_parts.append(f"CONTEXT:\n{context_text}")
+        messages = [SYSTEM_MESSAGE]
         
-        input_parts.append(f"QUERY: {query}")
+        # Add history + context
+        context_text = ToonFormatter.format_full_context(context_chunks) if context_chunks else ""
+        self._append_user_messages(messages, history, context_text, query)
+        user_content = "\n\n".join(m["content"] for m in messages if m["role"] == "user")
         
-        user_content = "\n\n".join(input_parts)
-        messages.append({"role": "user", "content": user_content})
+        _, route_metadata = self._router.route_query(query)
+        deployment = self._pick_deployment(route_metadata, user_content, context_chunks)
         
         # Get response
         try:
-            response = self.client.chat.completions.create(
-                model=self.deployment,
+            response = await self.async_client.chat.completions.create(
+                model=deployment,
                 messages=messages,
                 temperature=settings.GPT_TEMPERATURE,
                 max_tokens=settings.GPT_MAX_COMPLETION_TOKENS,
                 top_p=settings.GPT_TOP_P,
                 frequency_penalty=settings.GPT_FREQUENCY_PENALTY,
-                presence_penalty=settings.GPT_PRESENCE_PENALTY
+                presence_penalty=settings.GPT_PRESENCE_PENALTY,
+                **self._session_kwargs(session_id)
             )
 
             
             return {
                 "response": response.choices[0].message.content,
                 "retrieved_chunks": context_chunks,
-                "model": self.deployment
+                "model": deployment
             }
             
         except Exception as e:
@@ -4,7 +4,7 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-import json
+import orjson
 import time
 from typing import List, Dict, Optional, AsyncGenerator
 from openai import AzureOpenAI, APIError, APIConnectionError
@@ -106,8 +106,8 @@ class ChatService:
         # Handle non-RAG routes immediately
         if not router.should_use_rag(route_type):
             quick_response = router.format_quick_response(route_type, query)
-            yield f"data: {json.dumps({'content': quick_response})}\\n\\n"
-            yield f"data: {json.dumps({'done': True, 'response_time_ms': 0, 'chunks_used': 0})}\\n\\n"
+            yield f"data: {orjson.dumps({'content': quick_response}).decode()}\\n\\n"
+            yield f"data: {orjson.dumps({'done': True, 'response_time_ms': 0, 'chunks_used': 0}).decode()}\\n\\n"
             return
 
         # 2. Analyze Intent & Get Initial Weights
@@ -248,7 +248,7 @@ class ChatService:
                             chunk_count += 1
                             
                             # Yield SSE formatted data
-                            yield f"data: {json.dumps({'content': content})}\\n\\n"
+                            yield f"data: {orjson.dumps({'content': content}).decode()}\\n\\n"
                 
                 # Calculate response time
                 response_time_ms = int((time.time() - start_time) * 1000)
@@ -260,7 +260,7 @@ class ChatService:
                     'response_time_ms': response_time_ms,
                     'model': self.deployment
                 }
-                yield f"data: {json.dumps(metadata)}\\n\\n"
+                yield f"data: {orjson.dumps(metadata).decode()}\\n\\n"
                 
                 logger.info(f"✅ Response completed:")
                 logger.info(f"   └─ Length: {len(full_response)} chars")
@@ -282,21 +282,21 @@ class ChatService:
                     # Max retries reached
                     error_msg = "Connection to Azure OpenAI failed. Please check your network and try again."
                     formatted_error = ResponseFormatter.format_error_response(error_msg, query)
-                    yield f"data: {json.dumps({'error': error_msg, 'formatted_error': formatted_error})}\\n\\n"
+                    yield f"data: {orjson.dumps({'error': error_msg, 'formatted_error': formatted_error}).decode()}\\n\\n"
                     logger.error(f"❌ Max retries reached for connection error")
                     
             except APIError as e:
                 logger.error(f"❌ Azure API error (truncated)")
                 error_msg = f"Azure OpenAI API error: {str(e)[:100]}"
                 formatted_error = ResponseFormatter.format_error_response(error_msg, query)
-                yield f"data: {json.dumps({'error': error_msg, 'formatted_error': formatted_error})}\\n\\n"
+                yield f"data: {orjson.dumps({'error': error_msg, 'formatted_error': formatted_error}).decode()}\\n\\n"
                 break
                 
             except Exception as e:
                 logger.error(f"❌ Unexpected streaming error")
                 error_msg = f"An unexpected error occurred"
                 formatted_error = ResponseFormatter.format_error_response(error_msg, query)
-                yield f"data: {json.dumps({'error': error_msg, 'formatted_error': formatted_error})}\\n\\n"
+                yield f"data: {orjson.dumps({'error': error_msg, 'formatted_error': formatted_error}).decode()}\\n\\n"
                 break
     
     async def get_chat_response(
@@ -4,16 +4,26 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-import json
+import asyncio
+import hashlib
 import re
-from typing import List, Dict
-from openai import AzureOpenAI
+import orjson
+import pysbd
+from typing import List, Dict, Optional
+from openai import AsyncAzureOpenAI
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from config.settings import settings
+from services.cache_service import get_cache_service
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
+# Breakpoints of a sentence window depend only on its text: keep them for 30 days
+AGENTIC_BREAKPOINT_TTL = 30 * 86400
+
+# Whitespace runs collapsed to a single space in chunk post-processing
+_WS_RE = re.compile(r"\s+")
+
 
 class RecursiveTextChunker:
     """
@@ -45,15 +55,12 @@ class RecursiveTextChunker:
         logger.info(f"✂️ Recursive chunking: {len(text)} chars")
         chunks = self.splitter.split_text(text)
         
-        # Post-process
-        processed_chunks = []
+        # Post-process: normalize whitespace, drop chunks below the minimum size
         min_chunk_chars = settings.MIN_CHUNK_SIZE * 4
-        
-        for chunk in chunks:
-            chunk = " ".join(chunk.split())
-            if len(chunk) < min_chunk_chars:
-                continue
-            processed_chunks.append(chunk)
+        processed_chunks = [
+            chunk for chunk in (_WS_RE.sub(" ", c).strip() for c in chunks)
+            if len(chunk) >= min_chunk_chars
+        ]
             
         return processed_chunks
 
@@ -67,20 +74,12 @@ class AgenticTextChunker:
     """
     
     def __init__(self):
-        self.client = AzureOpenAI(
-            api_key=settings.AZURE_OPENAI_API_KEY,
-            api_version=settings.AZURE_OPENAI_API_VERSION,
-            azure_endpoint=settings.AZURE_OPENAI_API_BASE
-        )
-        self.deployment = settings.AZURE_OPENAI_DEPLOYMENT_NAME
+        # Breakpoint detection is pure classification: always use the small model
+        self.deployment = settings.AZURE_OPENAI_DEPLOYMENT_MINI or settings.AZURE_OPENAI_DEPLOYMENT_NAME
         
-        # Helper splitter for "atomic" sentences (step 1)
-        self.sentence_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, # Large enough to hold a few sentences if needed, but we rely on separators
-            chunk_overlap=0,
-            separators=["\n\n", "\n", ". ", "? ", "! "],
-            keep_separator=True
-        )
+        # Rule-based sentence boundary detection for "atomic" sentences (step 1)
+        # Handles abbreviations, decimals, etc. in a single pass over the text
+        self.sentence_segmenter = pysbd.Segmenter(language="en", clean=False)
         
         logger.info(f"🧠 AgenticTextChunker initialized")
 
@@ -108,9 +107,8 @@ class AgenticTextChunker:
 
     def _split_into_sentences(self, text: str) -> List[str]:
         """Split text into atomic units (roughly sentences)"""
-        # We use LangChain's splitter but tuned for sentences
-        # This keeps the punctuation attached
-        raw_splits = self.sentence_splitter.split_text(text)
+        # pysbd keeps the punctuation attached and lands on real sentence ends
+        raw_splits = self.sentence_segmenter.segment(text)
         
         # Clean up
         sentences = [s.strip() for s in raw_splits if s.strip()]
@@ -119,63 +117,121 @@ class AgenticTextChunker:
     def _find_breakpoints(self, sentences: List[str]) -> List[int]:
         """
         Ask LLM to identify start indices of new topics using Sliding Window
+        
+        Windows are independent, so they are classified concurrently.
+        chunk_text runs in a worker thread, so this drives its own event loop.
         """
+        return asyncio.run(self._find_breakpoints_async(sentences))
+
+    async def _find_breakpoints_async(self, sentences: List[str]) -> List[int]:
+        """Classify all windows concurrently (bounded by AGENTIC_MAX_CONCURRENCY)"""
         breakpoints = {0} # Always start at 0
         window_size = settings.AGENTIC_WINDOW_SIZE
         
         total_sentences = len(sentences)
         logger.info(f"   └─ Identifying topics in {total_sentences} sentences...")
         
-        # Process in batches
-        for i in range(0, total_sentences, window_size):
-            batch = sentences[i : i + window_size]
-            if not batch:
-                continue
-                
-            # Prepare TOON input
-            toon_input = self._format_sentences_to_toon(batch, start_index=i)
-            
-            system_prompt = (
-                "You are an expert Document Segmenter. "
-                "Identify logical breakpoints where a NEW topic or distinct sub-topic begins.\n"
-                "Output ONLY a JSON list of indices (e.g. [0, 5, 12])."
-            )
-            
-            user_prompt = (
-                f"Analyze these sentences provided in TOON format:\n\n"
-                f"{toon_input}\n\n"
-                f"Return valid start indices for new chunks. "
-                f"Always include the first index {i} if it starts a thought."
-            )
-            
-            try:
-                response = self.client.chat.completions.create(
+        # Limit in-flight requests to respect Azure TPM limits
+        semaphore = asyncio.Semaphore(settings.AGENTIC_MAX_CONCURRENCY)
+        
+        # Client is scoped to this event loop (asyncio.run creates a new one per call)
+        async with AsyncAzureOpenAI(
+            api_key=settings.AZURE_OPENAI_API_KEY,
+            api_version=settings.AZURE_OPENAI_API_VERSION,
+            azure_endpoint=settings.AZURE_OPENAI_API_BASE
+        ) as client:
+            results = await asyncio.gather(*[
+                self._classify_batch_async(client, semaphore, sentences[i : i + window_size], i)
+                for i in range(0, total_sentences, window_size)
+            ])
+        
+        for batch_breakpoints in results:
+            breakpoints.update(batch_breakpoints)
+        
+        return sorted(list(breakpoints))
+
+    async def _classify_batch_async(
+        self,
+        client: AsyncAzureOpenAI,
+        semaphore: asyncio.Semaphore,
+        batch: List[str],
+        i: int
+    ) -> List[int]:
+        """Find topic breakpoints within one window of sentences starting at index i"""
+        window_size = settings.AGENTIC_WINDOW_SIZE
+        
+        # Cached by content (offsets relative to the window, so the same text
+        # at a different position in another document still hits)
+        cache = get_cache_service()
+        digest = hashlib.blake2b(
+            "\n".join(batch).encode(), digest_size=16
+        ).hexdigest()
+        cache_key = f"agentic_bp:{self.deployment}:{digest}"
+        cached_offsets = cache.get(cache_key)
+        if cached_offsets is not None:
+            return [i + offset for offset in cached_offsets]
+        
+        # Prepare TOON input
+        toon_input = self._format_sentences_to_toon(batch, start_index=i)
+        
+        system_prompt = (
+            "You are an expert Document Segmenter. "
+            "Identify logical breakpoints where a NEW topic or distinct sub-topic begins.\n"
+            "Output ONLY a JSON object with the list of indices (e.g. {\"indices\": [0, 5, 12]})."
+        )
+        
+        user_prompt = (
+            f"Analyze these sentences provided in TOON format:\n\n"
+            f"{toon_input}\n\n"
+            f"Return valid start indices for new chunks. "
+            f"Always include the first index {i} if it starts a thought."
+        )
+        
+        try:
+            async with semaphore:
+                response = await client.chat.completions.create(
                     model=self.deployment,
                     messages=[
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": user_prompt}
                     ],
                     temperature=0.0,
-                    max_tokens=100
+                    max_tokens=100,
+                    response_format={"type": "json_object"}  # Force JSON response
                 )
-                
-                content = response.choices[0].message.content.strip()
-                
-                # Extract JSON from potential markdown wrappers
-                match = re.search(r"\[.*\]", content, re.DOTALL)
-                if match:
-                    indices = json.loads(match.group())
-                    # Validate indices are within this batch's range
-                    valid_indices = [idx for idx in indices if i <= idx < i + window_size]
-                    breakpoints.update(valid_indices)
-                    logger.info(f"      └─ Batch {i}-{i+window_size}: Found breaks at {valid_indices}")
-                
-            except Exception as e:
-                logger.error(f"⚠️ Agentic chunking error on batch {i}: {e}")
-                # Fallback: Just add the batch start as a breakpoint to keep things safe
-                breakpoints.add(i)
+            
+            indices = self._parse_indices(response.choices[0].message.content)
+            if indices is not None:
+                # Validate indices are within this batch's range
+                valid_indices = [idx for idx in indices if i <= idx < i + window_size]
+                logger.info(f"      └─ Batch {i}-{i+window_size}: Found breaks at {valid_indices}")
+                cache.set(cache_key, [idx - i for idx in valid_indices], ttl=AGENTIC_BREAKPOINT_TTL)
+                return valid_indices
+            
+        except Exception as e:
+            logger.error(f"⚠️ Agentic chunking error on batch {i}: {e}")
+            # Fallback: Just add the batch start as a breakpoint to keep things safe
+            return [i]
         
-        return sorted(list(breakpoints))
+        return []
+
+    @staticmethod
+    def _parse_indices(content: str) -> Optional[List[int]]:
+        """Parse {"indices": [...]} (or a bare list, e.g. inside markdown fences)"""
+        try:
+            data = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Fall back to the outermost [...] span
+            lo, hi = content.find("["), content.rfind("]")
+            if lo == -1 or hi < lo:
+                return None
+            data = orjson.loads(content[lo:hi + 1])
+        
+        if isinstance(data, dict):
+            data = data.get("indices", [])
+        if not isinstance(data, list):
+            return None
+        return [idx for idx in data if isinstance(idx, int)]
 
     def _merge_sentences(self, sentences: List[str], breakpoints: List[int]) -> List[str]:
         """Reconstruct chunks from breakpoints"""
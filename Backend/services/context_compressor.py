@@ -4,15 +4,42 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-import json
+import hashlib
+import math
+import orjson
+import re
 import requests
-from typing import List, Dict
+from requests.adapters import HTTPAdapter
+from collections import Counter, OrderedDict
+from threading import Lock
+from typing import Iterator, List, Dict, Optional
 from config import compression_config
+from services.cache_service import SemanticCache
+from services.embeddings import get_embedding_service
 from services.toon_formatter import ToonFormatter
 from utils.logger import setup_logger
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 logger = setup_logger()
 
+COMPRESSION_SYSTEM_PROMPT = (
+    "You are a Context Compressor. Your goal is to extract ONLY the information "
+    "relevant to the user's query from the context provided.\n"
+    "Remove all irrelevant details, boilerplate, and redundancy.\n"
+    "Keep specific IDs, error codes, and steps."
+)
+
+# Persistent keep-alive session for the (local) Ollama server. Responses are
+# requested uncompressed: on localhost gzip only costs CPU on both ends
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=32))
+_session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=32))
+_session.headers.update({"Accept-Encoding": "identity", "Connection": "keep-alive"})
+
 class ContextCompressor:
     """
     Compresses retrieved context using Local LLM (Ollama) to reduce token usage.
@@ -21,6 +48,17 @@ class ContextCompressor:
     def __init__(self):
         self.provider = compression_config.COMPRESSION_PROVIDER
         self.enabled = compression_config.ENABLE_COMPRESSION
+        
+        # Compressed outputs, scoped by raw context digest, matched by query embedding
+        self.cache = SemanticCache(
+            enabled=compression_config.ENABLE_COMPRESSION_CACHE,
+            distance_threshold=1.0 - compression_config.COMPRESSION_CACHE_SIM_THRESHOLD,
+            max_entries=compression_config.COMPRESSION_CACHE_MAX_ENTRIES,
+            max_scopes=compression_config.COMPRESSION_CACHE_MAX_CONTEXTS
+        )
+        # Exact (context digest, query) → compressed output, checked before embedding the query
+        self._exact_cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._exact_lock = Lock()
         logger.info(f"📉 ContextCompressor initialized (Provider: {self.provider}, Enabled: {self.enabled})")
 
     def compress(self, chunks: List[Dict], query: str) -> str:
@@ -31,66 +69,96 @@ class ContextCompressor:
         if not self.enabled or not chunks:
             return ToonFormatter.format_full_context(chunks)
 
+        # DIRECT: a single short chunk already is the answer context
+        if len(chunks) == 1 and len(chunks[0].get('content', '')) < compression_config.DIRECT_MAX_CHUNK_CHARS:
+            logger.info("📉 Single short chunk, returning it directly (no compression).")
+            return chunks[0].get('content', '')
+
         # 1. format input context (Raw)
         raw_context = "\n\n".join([c.get('content', '') for c in chunks])
         
+        # Deterministic shrinking first: may bring the context under the threshold
+        if compression_config.ENABLE_RULE_PRECOMPRESSION:
+            precompressed = ToonFormatter.rule_precompress(raw_context)
+            if len(precompressed) < len(raw_context):
+                logger.info(f"📉 Rule pre-compression: {len(raw_context)} -> {len(precompressed)} chars")
+                raw_context = precompressed
+        
         # Check if compression is needed (if too short, just return)
         if len(raw_context) < compression_config.MAX_CONTEXT_TOKENS:
              logger.info(f"📉 Context small enough ({len(raw_context)} chars), skipping compression.")
              return raw_context
 
-        # 2. Compress via Provider
+        # 2. Caches: same context + same query (exact), then similar query (semantic)
+        context_digest = self._digest(raw_context)
+        exact_key = (context_digest, query)
+        cached = self._exact_get(exact_key)
+        if cached is not None:
+            logger.info("⚡ Compression Cache Hit (exact): Reusing compressed context")
+            return cached
+        
+        context_scope = [context_digest]
+        query_embedding = None
+        if self.cache.enabled:
+            try:
+                query_embedding = get_embedding_service().embed_query(query)
+                cached = self.cache.check(query_embedding, file_ids=context_scope)
+                if cached is not None:
+                    logger.info("⚡ Compression Cache Hit: Reusing compressed context")
+                    self._exact_set(exact_key, cached)
+                    return cached
+            except Exception as e:
+                logger.warning(f"⚠️ Compression cache lookup failed: {e}")
+
+        # 3. Compress via Provider
         if self.provider == "ollama":
-            return self._compress_with_ollama(raw_context, query)
+            compressed = self._compress_with_ollama(raw_context, query)
         else:
-            return self._compress_with_openai(raw_context, query)
+            compressed = self._compress_with_openai(raw_context, query)
+        
+        # Providers return the raw context on failure: only cache real compressions
+        if compressed is not raw_context:
+            self._exact_set(exact_key, compressed)
+            if query_embedding is not None:
+                self.cache.store(query_embedding, compressed, file_ids=context_scope)
+        
+        return compressed
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        data = text.encode()
+        if xxhash is not None:
+            return xxhash.xxh3_128_hexdigest(data)
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def _exact_get(self, key: tuple) -> Optional[str]:
+        with self._exact_lock:
+            value = self._exact_cache.get(key)
+            if value is not None:
+                self._exact_cache.move_to_end(key)
+            return value
+
+    def _exact_set(self, key: tuple, value: str):
+        if compression_config.COMPRESSION_EXACT_CACHE_SIZE <= 0:
+            return
+        with self._exact_lock:
+            self._exact_cache[key] = value
+            self._exact_cache.move_to_end(key)
+            while len(self._exact_cache) > compression_config.COMPRESSION_EXACT_CACHE_SIZE:
+                self._exact_cache.popitem(last=False)
 
     def _compress_with_ollama(self, context: str, query: str) -> str:
         """
         Call Ollama API to compress context.
         """
-        prompt = f"""
-        You are a Context Compressor. Your goal is to exact ONLY the information relevant to the user's query from the context below.
-        Remove all irrelevant details, boilerplate, and redundancy.
-        Keep specific IDs, error codes, and steps.
-        
-        QUERY: {query}
-        
-        CONTEXT:
-        {context}
-        
-        COMPRESSED RELEVANT INFO:
-        """
-        
         try:
-            payload = {
-                "model": compression_config.OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.0,
-                    "num_predict": compression_config.TARGET_OUTPUT_TOKENS
-                }
-            }
-            
             logger.info(f"📉 Sending to Ollama ({compression_config.OLLAMA_MODEL})...")
-            response = requests.post(
-                compression_config.OLLAMA_BASE_URL,
-                json=payload,
-                timeout=compression_config.OLLAMA_TIMEOUT
-            )
+            compressed_text = "".join(self.compress_stream(context, query)).strip()
             
-            if response.status_code == 200:
-                result = response.json()
-                compressed_text = result.get('response', '').strip()
-                
-                reduction = 100 * (1 - (len(compressed_text) / len(context)))
-                logger.info(f"📉 Compressed: {len(context)} -> {len(compressed_text)} chars ({reduction:.1f}% reduction)")
-                
-                return compressed_text
-            else:
-                logger.warning(f"⚠️ Ollama error {response.status_code}: {response.text}")
-                return context
+            reduction = 100 * (1 - (len(compressed_text) / len(context)))
+            logger.info(f"📉 Compressed: {len(context)} -> {len(compressed_text)} chars ({reduction:.1f}% reduction)")
+            
+            return compressed_text
                 
         except requests.exceptions.ConnectionError:
             logger.warning(f"⚠️ Could not connect to Ollama at {compression_config.OLLAMA_BASE_URL}. Is it running?")
@@ -99,6 +167,52 @@ class ContextCompressor:
             logger.error(f"❌ Compression failed: {e}")
             return context
 
+    def compress_stream(self, context: str, query: str) -> Iterator[str]:
+        """
+        Stream the Ollama compression piece by piece.
+        Stops reading once the output budget (TARGET_OUTPUT_TOKENS, ~4 chars
+        per token) is reached; closing the response ends generation server-side.
+        Raises on connection / HTTP errors.
+        """
+        # Static instructions go first (system) and never change, so Ollama can
+        # reuse their KV cache; the context, then the query, follow
+        prompt = f"CONTEXT:\n{context}\n\nQUERY: {query}\n\nCOMPRESSED RELEVANT INFO:"
+        
+        payload = {
+            "model": compression_config.OLLAMA_MODEL,
+            "system": COMPRESSION_SYSTEM_PROMPT,
+            "prompt": prompt,
+            "stream": True,
+            "options": {
+                "temperature": 0.0,
+                "num_predict": compression_config.TARGET_OUTPUT_TOKENS
+            }
+        }
+        max_chars = compression_config.TARGET_OUTPUT_TOKENS * 4
+        
+        with _session.post(
+            compression_config.OLLAMA_BASE_URL,
+            data=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"},
+            timeout=compression_config.OLLAMA_TIMEOUT,
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"Ollama error {response.status_code}: {response.text}")
+            
+            produced = 0
+            # NDJSON: one {"response": "...", "done": bool} object per line
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = orjson.loads(line)
+                piece = event.get('response', '')
+                if piece:
+                    produced += len(piece)
+                    yield piece
+                if event.get('done') or produced >= max_chars:
+                    break
+
     def _compress_with_openai(self, context: str, query: str) -> str:
         """
         Fallback to OpenAI (mock implementation - passthrough for now to avoid accidental costs)
@@ -107,11 +221,98 @@ class ContextCompressor:
         return context
 
 
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"\w+")
+_CHUNK_HEADER_RE = re.compile(r"^\[Chunk \d+\]:")
+
+
+class StatisticalCompressor:
+    """
+    Extractive, LLMLingua-style compression without a model call.
+    
+    Sentences are scored by self-information (sum of term IDF across the
+    context's sentences) plus a boost for query terms, and the best ones are
+    kept until the character budget is spent. Original order and the
+    "[Chunk N]:" headers are preserved so citations still resolve.
+    """
+    
+    QUERY_TERM_BOOST = 2.0
+    
+    def compress(self, context: str, query: str, ratio: float = None) -> str:
+        if ratio is None:
+            ratio = compression_config.STATISTICAL_COMPRESSION_RATIO
+        
+        # (block header or None, [sentences]) per paragraph block
+        blocks = []
+        for block in context.split("\n\n"):
+            header = None
+            first_line, _, rest = block.partition("\n")
+            if _CHUNK_HEADER_RE.match(first_line):
+                header, block = first_line, rest
+            sentences = [s for s in _SENTENCE_SPLIT_RE.split(block.strip()) if s]
+            blocks.append((header, sentences))
+        
+        sentence_terms = [
+            set(_WORD_RE.findall(sentence.lower()))
+            for _, sentences in blocks for sentence in sentences
+        ]
+        if len(sentence_terms) < 2:
+            return context
+        
+        # IDF over sentences: terms repeated everywhere carry little information
+        doc_freq = Counter(term for terms in sentence_terms for term in terms)
+        n = len(sentence_terms)
+        idf = {term: math.log(n / df) + 1.0 for term, df in doc_freq.items()}
+        query_terms = set(_WORD_RE.findall(query.lower()))
+        
+        sentences_flat = [sentence for _, sentences in blocks for sentence in sentences]
+        # Score = average self-information per term (density) + IDF mass of
+        # the query terms the sentence covers
+        scores = []
+        for terms in sentence_terms:
+            density = sum(idf[t] for t in terms) / max(len(terms), 1)
+            relevance = sum(idf[t] for t in terms & query_terms)
+            scores.append(density + self.QUERY_TERM_BOOST * relevance)
+        
+        # Greedily keep the highest scoring sentences within the budget
+        budget = int(len(context) * ratio)
+        keep = set()
+        used = 0
+        for idx in sorted(range(n), key=lambda i: scores[i], reverse=True):
+            length = len(sentences_flat[idx]) + 1
+            if used + length > budget and keep:
+                continue
+            keep.add(idx)
+            used += length
+        
+        # Rebuild in original order
+        output_blocks = []
+        idx = 0
+        for header, sentences in blocks:
+            kept = [s for j, s in enumerate(sentences, start=idx) if j in keep]
+            idx += len(sentences)
+            if kept:
+                body = " ".join(kept)
+                output_blocks.append(f"{header}\n{body}" if header else body)
+        
+        compressed = "\n\n".join(output_blocks)
+        reduction = 100 * (1 - len(compressed) / max(len(context), 1))
+        logger.info(f"📉 Statistical compression: {len(context)} -> {len(compressed)} chars ({reduction:.1f}% reduction)")
+        return compressed
+
+
 # Global instance
 _compressor = None
+_statistical_compressor = None
 
 def get_context_compressor() -> ContextCompressor:
     global _compressor
     if _compressor is None:
         _compressor = ContextCompressor()
     return _compressor
+
+def get_statistical_compressor() -> StatisticalCompressor:
+    global _statistical_compressor
+    if _statistical_compressor is None:
+        _statistical_compressor = StatisticalCompressor()
+    return _statistical_compressor
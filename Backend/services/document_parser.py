@@ -5,13 +5,78 @@
 """
 
 import os
-from typing import Optional
+import asyncio
+import hashlib
+import mmap
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Set, Tuple
 from config.settings import settings
 import io
 from utils.logger import setup_logger
 
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
 logger = setup_logger()
 
+# Per-page extraction results of already-seen PDFs: (text, image descriptions)
+_page_cache = None
+
+IMAGE_DESCRIPTION_PROMPT = (
+    'Describe this image in detail. If it is a chart or graph, summarize the data points and trends. '
+    'If it is a diagram, explain the flow.'
+)
+
+
+@contextmanager
+def _mapped_pdf(file_path: str):
+    """Memory-map a PDF (pages are read from the OS page cache, not the Python heap)"""
+    with open(file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _get_page_cache():
+    """Disk-backed page cache (None when disabled or diskcache is missing)"""
+    global _page_cache
+    if _page_cache is None and settings.PDF_PAGE_CACHE_SIZE_MB > 0 and diskcache is not None:
+        _page_cache = diskcache.Cache(
+            settings.PDF_PAGE_CACHE_DIR,
+            size_limit=settings.PDF_PAGE_CACHE_SIZE_MB * 1024 * 1024
+        )
+    return _page_cache
+
+
+def _extract_page_range(
+    file_path: str,
+    start: int,
+    end: int,
+    with_images: bool
+) -> List[Tuple[int, str, List[bytes]]]:
+    """
+    Extract (page index, text, image bytes) for pages [start, end).
+    Module-level so it can run in a worker process; each worker opens its own reader.
+    """
+    from PyPDF2 import PdfReader
+    
+    pages = []
+    with _mapped_pdf(file_path) as mm:
+        reader = PdfReader(mm)
+        for page_num in range(start, end):
+            page = reader.pages[page_num]
+            text = page.extract_text() or ""
+            images = []
+            if with_images:
+                try:
+                    images = [img_obj.data for img_obj in page.images]
+                except Exception as img_err:
+                    logger.warning(f"         ⚠️ Failed to read images on page {page_num + 1}: {img_err}")
+            pages.append((page_num, text, images))
+    return pages
+
 
 class DocumentParser:
     """
@@ -63,59 +128,56 @@ class DocumentParser:
     
     @staticmethod
     def _parse_pdf(file_path: str) -> str:
-        """Parse PDF file"""
+        """
+        Parse PDF file
+        Page text is extracted in worker processes for large PDFs (CPU bound),
+        and image descriptions are requested concurrently (network bound).
+        Results are cached per page by file content, so re-ingesting an
+        unchanged PDF only costs a hash of the file.
+        """
         try:
             from PyPDF2 import PdfReader
             
-            reader = PdfReader(file_path)
-            text_parts = []
+            with _mapped_pdf(file_path) as mm:
+                doc_hash = hashlib.blake2b(mm, digest_size=16).hexdigest()
+                num_pages = len(PdfReader(mm).pages)
+            logger.info(f"   └─ Pages found: {num_pages}")
             
-            logger.info(f"   └─ Pages found: {len(reader.pages)}")
+            page_results = DocumentParser._cached_pages(doc_hash, num_pages)
+            if page_results is not None:
+                logger.info("   └─ ⚡ Unchanged PDF: reusing cached page extraction")
+            else:
+                pages = DocumentParser._extract_pages(file_path, num_pages, settings.ENABLE_MULTIMODAL)
+                
+                # 🖼️ MULTIMODAL EXTRACTION
+                descriptions = {}
+                if settings.ENABLE_MULTIMODAL and any(images for _, _, images in pages):
+                    descriptions = DocumentParser._describe_images(pages)
+                
+                page_results = [
+                    (text, [
+                        descriptions[(page_num, img_idx)]
+                        for img_idx in range(len(images))
+                        if descriptions.get((page_num, img_idx))
+                    ])
+                    for page_num, text, images in pages
+                ]
+                # A page whose image description failed is retried on the next ingest
+                incomplete = {
+                    page_num
+                    for page_num, _, images in pages
+                    if any(not descriptions.get((page_num, img_idx)) for img_idx in range(len(images)))
+                }
+                DocumentParser._store_pages(doc_hash, page_results, skip=incomplete)
             
-            for page_num, page in enumerate(reader.pages):
-                text = page.extract_text()
-                if text and text.strip():
+            # Reassemble in page order: page text, then its image descriptions
+            text_parts = []
+            for page_num, (text, page_descriptions) in enumerate(page_results):
+                if text.strip():
                     text_parts.append(text)
                     logger.info(f"      └─ Page {page_num + 1}: {len(text)} chars")
-                
-                # 🖼️ MULTIMODAL EXTRACTION
-                if settings.ENABLE_MULTIMODAL:
-                    try:
-                        # Try to import dependencies locally to avoid crash if missing
-                        import ollama
-                        from PIL import Image
-                        
-                        if hasattr(page, 'images') and page.images:
-                            logger.info(f"      └─ Found {len(page.images)} images on page {page_num + 1}")
-                            
-                            for img_obj in page.images:
-                                try:
-                                    # Convert bytes to PIL Image (validation)
-                                    image_bytes = img_obj.data
-                                    
-                                    # Call Ollama Vision (Llama 3.2 Vision)
-                                    # Note: This adds latency but enriches content significantly
-                                    response = ollama.chat(
-                                        model=settings.OLLAMA_VISION_MODEL,
-                                        messages=[{
-                                            'role': 'user',
-                                            'content': 'Describe this image in detail. If it is a chart or graph, summarize the data points and trends. If it is a diagram, explain the flow.',
-                                            'images': [image_bytes]
-                                        }]
-                                    )
-                                    
-                                    description = response['message']['content']
-                                    desc_marker = f"\n\n[IMAGE DESCRIPTION: {description}]\n\n"
-                                    text_parts.append(desc_marker)
-                                    logger.info(f"         └─ Generated description: {description[:50]}...")
-                                    
-                                except Exception as img_err:
-                                    logger.warning(f"         ⚠️ Failed to process image: {img_err}")
-                                    
-                    except ImportError:
-                        logger.warning("      ⚠️ Multimodal dependencies (ollama, pillow) missing. Skipping images.")
-                    except Exception as mm_err:
-                        logger.warning(f"      ⚠️ Multimodal processing error: {mm_err}")
+                for description in page_descriptions:
+                    text_parts.append(f"\n\n[IMAGE DESCRIPTION: {description}]\n\n")
             
             full_text = "\n\n".join(text_parts)
             logger.info(f"   └─ Total extracted: {len(full_text)} characters")
@@ -126,6 +188,113 @@ class DocumentParser:
             logger.error(f"❌ PDF parsing error: {e}")
             raise
     
+    @staticmethod
+    def _page_key(doc_hash: str, page_num: int) -> str:
+        # Descriptions only exist when multimodal extraction is on, and depend on the vision model
+        vision_model = settings.OLLAMA_VISION_MODEL if settings.ENABLE_MULTIMODAL else ""
+        return f"pdf_page:{doc_hash}:{page_num}:{vision_model}"
+    
+    @staticmethod
+    def _cached_pages(doc_hash: str, num_pages: int) -> Optional[List[Tuple[str, List[str]]]]:
+        """All pages from the cache, or None if any page is missing"""
+        cache = _get_page_cache()
+        if cache is None:
+            return None
+        
+        pages = []
+        for page_num in range(num_pages):
+            cached = cache.get(DocumentParser._page_key(doc_hash, page_num))
+            if cached is None:
+                return None
+            pages.append(cached)
+        return pages
+    
+    @staticmethod
+    def _store_pages(doc_hash: str, page_results: List[Tuple[str, List[str]]], skip: Set[int] = frozenset()):
+        cache = _get_page_cache()
+        if cache is None:
+            return
+        try:
+            for page_num, result in enumerate(page_results):
+                if page_num in skip:
+                    continue
+                cache.set(DocumentParser._page_key(doc_hash, page_num), result)
+        except Exception as e:
+            logger.warning(f"   ⚠️ Failed to cache extracted pages: {e}")
+    
+    @staticmethod
+    def _extract_pages(file_path: str, num_pages: int, with_images: bool) -> List[Tuple[int, str, List[bytes]]]:
+        """Extract all pages, splitting large PDFs into page ranges across processes"""
+        if num_pages < settings.PDF_PARALLEL_MIN_PAGES:
+            return _extract_page_range(file_path, 0, num_pages, with_images)
+        
+        workers = settings.PDF_PARSE_WORKERS or os.cpu_count() or 1
+        workers = min(workers, num_pages)
+        step = -(-num_pages // workers)  # ceil division: one contiguous range per worker
+        ranges = [(start, min(start + step, num_pages)) for start in range(0, num_pages, step)]
+        
+        logger.info(f"   └─ Extracting pages with {len(ranges)} worker processes")
+        with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+            results = executor.map(
+                _extract_page_range,
+                [file_path] * len(ranges),
+                [start for start, _ in ranges],
+                [end for _, end in ranges],
+                [with_images] * len(ranges)
+            )
+            return [page for page_range in results for page in page_range]
+    
+    @staticmethod
+    def _describe_images(pages: List[Tuple[int, str, List[bytes]]]) -> dict:
+        """
+        Describe all images with Ollama Vision: {(page, image index): description}
+        All requests of the document go out together on one async client,
+        bounded by OLLAMA_VISION_CONCURRENCY, so the server can batch them.
+        Called from the parser's worker thread (no running event loop).
+        """
+        try:
+            # Try to import dependencies locally to avoid crash if missing
+            import ollama
+        except ImportError:
+            logger.warning("      ⚠️ Multimodal dependencies (ollama, pillow) missing. Skipping images.")
+            return {}
+        
+        jobs = [
+            ((page_num, img_idx), image_bytes)
+            for page_num, _, images in pages
+            for img_idx, image_bytes in enumerate(images)
+        ]
+        logger.info(f"      └─ Describing {len(jobs)} images ({settings.OLLAMA_VISION_CONCURRENCY} concurrent)")
+        
+        async def describe_all() -> List[Optional[str]]:
+            client = ollama.AsyncClient()
+            semaphore = asyncio.Semaphore(max(1, settings.OLLAMA_VISION_CONCURRENCY))
+            
+            async def describe(image_bytes: bytes) -> Optional[str]:
+                async with semaphore:
+                    try:
+                        # Call Ollama Vision (Llama 3.2 Vision)
+                        # Note: This adds latency but enriches content significantly
+                        response = await client.chat(
+                            model=settings.OLLAMA_VISION_MODEL,
+                            messages=[{
+                                'role': 'user',
+                                'content': IMAGE_DESCRIPTION_PROMPT,
+                                'images': [image_bytes]
+                            }]
+                        )
+                        description = response['message']['content']
+                        logger.info(f"         └─ Generated description: {description[:50]}...")
+                        return description
+                    except Exception as img_err:
+                        logger.warning(f"         ⚠️ Failed to process image: {img_err}")
+                        return None
+            
+            return await asyncio.gather(*(describe(image_bytes) for _, image_bytes in jobs))
+        
+        descriptions = asyncio.run(describe_all())
+        return {key: description for (key, _), description in zip(jobs, descriptions)}
+    
     @staticmethod
     def _parse_docx(file_path: str) -> str:
         """Parse DOCX file"""
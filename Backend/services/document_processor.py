@@ -16,6 +16,7 @@ from services.bm25_service import get_bm25_service
 from services.entity_extractor import get_entity_extractor
 from services.graph_service import get_graph_service
 from services.progress_service import get_progress_tracker, ProcessingStage
+from services.cache_service import clear_retrieval_caches
 from utils.logger import setup_logger
 
 logger = setup_logger()
@@ -31,6 +32,9 @@ async def process_document(file_path: str, file_id: str):
     │  2. Chunk text → Recursive splitting                        │
     │  3. Generate embeddings → Azure OpenAI                      │
     │  4. Store in vector database → FAISS HNSW                   │
+    │                                                             │
+    │  Blocking steps run in worker threads so the event loop     │
+    │  keeps serving status polls and progress websockets.        │
     └─────────────────────────────────────────────────────────────┘
     """
     
@@ -52,10 +56,11 @@ async def process_document(file_path: str, file_id: str):
         logger.info("─" * 40)
         
         parser = DocumentParser()
-        text = parser.parse(file_path)
+        text = await asyncio.to_thread(parser.parse, file_path)
         
         if not text or not text.strip():
             logger.warning("⚠️ No text extracted from document")
+            _mark_failed(file_id, "No text could be extracted from the document")
             return
         
         logger.info(f"✅ Extracted: {len(text)} characters")
@@ -68,10 +73,11 @@ async def process_document(file_path: str, file_id: str):
         logger.info("─" * 40)
         
         chunker = get_text_chunker()
-        chunks = chunker.chunk_text(text)
+        chunks = await asyncio.to_thread(chunker.chunk_text, text)
         
         if not chunks:
             logger.warning("⚠️ No chunks generated")
+            _mark_failed(file_id, "No chunks could be generated from the document text")
             return
         
         logger.info(f"✅ Generated: {len(chunks)} chunks")
@@ -83,7 +89,7 @@ async def process_document(file_path: str, file_id: str):
         logger.info("\n🧠 STEP 3/6: Generating Embeddings")
         logger.info("─" * 40)
         
-        embedding_service = get_embedding_service()
+        embedding_service = await asyncio.to_thread(get_embedding_service)
         
         # Process in batches to avoid token limits
         BATCH_SIZE = 16  # Azure OpenAI batch limit
@@ -104,7 +110,7 @@ async def process_document(file_path: str, file_id: str):
             )
             logger.info(f"   └─ Batch {batch_num}/{total_batches}: {len(batch)} chunks")
             
-            batch_embeddings = embedding_service.embed_texts(batch)
+            batch_embeddings = await asyncio.to_thread(embedding_service.embed_texts, batch)
             all_embeddings.append(batch_embeddings)
         
         # Concatenate all embeddings
@@ -121,7 +127,8 @@ async def process_document(file_path: str, file_id: str):
         
         vector_store = get_vector_store()
         
-        vector_store.add_chunks(
+        await asyncio.to_thread(
+            vector_store.add_chunks,
             file_id=file_id,
             filename=filename,
             chunks=chunks,
@@ -135,7 +142,7 @@ async def process_document(file_path: str, file_id: str):
         logger.info("\n🔨 STEP 5/6: Building BM25 Keyword Index")
         logger.info("─" * 40)
         
-        bm25_service = get_bm25_service()
+        bm25_service = await asyncio.to_thread(get_bm25_service)
         
         # Prepare chunks for BM25 (need id and content)
         bm25_chunks = [
@@ -148,7 +155,7 @@ async def process_document(file_path: str, file_id: str):
             for i, chunk in enumerate(chunks)
         ]
         
-        bm25_service.build_index(bm25_chunks)
+        await asyncio.to_thread(bm25_service.build_index, bm25_chunks)
         
         # ─────────────────────────────────────
         # Step 6: Extract Knowledge Graph
@@ -158,7 +165,7 @@ async def process_document(file_path: str, file_id: str):
         logger.info("─" * 40)
         
         entity_extractor = get_entity_extractor()
-        graph_service = get_graph_service()
+        graph_service = await asyncio.to_thread(get_graph_service)
         
         # Process larger parent chunks for graph extraction
         # (better context for entity relationships)
@@ -176,52 +183,32 @@ async def process_document(file_path: str, file_id: str):
         
         logger.info(f"   └─ Processing {len(parent_chunks)} parent chunks for extraction...")
         
-        total_entities = 0
-        total_relationships = 0
-        
-        # Prepare for parallel execution
-        # Use a semaphore to limit concurrent API calls (Rate Limit Protection)
-        MAX_CONCURRENT_REQUESTS = 5
-        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-        
-        async def bounded_extract(chunk_data):
-            async with semaphore:
-                # Update substage happens here differently or we just log completion
-                return await entity_extractor.extract_async(
-                    text=chunk_data['text'],
-                    chunk_id=chunk_data['id']
-                )
-
-        logger.info(f"   └─ launching {len(parent_chunks)} parallel extraction tasks (max {MAX_CONCURRENT_REQUESTS} concurrent)...")
-        
-        # Create tasks
-        tasks = [bounded_extract(chunk) for chunk in parent_chunks]
+        # Extract all parent chunks concurrently (bounded inside extract_batch)
+        results = await entity_extractor.extract_batch(
+            [(chunk_data['id'], chunk_data['text']) for chunk_data in parent_chunks]
+        )
         
-        # Run all tasks concurrently
-        results = await asyncio.gather(*tasks)
+        total_entities = sum(len(r.get('entities', [])) for r in results)
+        total_relationships = sum(len(r.get('relationships', [])) for r in results)
         
-        # Process results
-        for idx, extraction_result in enumerate(results, 1):
-            # Update progress (less granular updates in parallel, but good to show we are assembling)
-            progress_tracker.update_substage(
-                file_id,
-                f"Saving graph data {idx}/{len(parent_chunks)}",
-                current=idx,
-                total=len(parent_chunks)
-            )
-            
-            # Add to graph
-            graph_service.add_extraction_result(extraction_result, file_id)
-            
-            total_entities += len(extraction_result.get('entities', []))
-            total_relationships += len(extraction_result.get('relationships', []))
+        # Add to graph: all chunks in one transaction
+        progress_tracker.update_substage(
+            file_id,
+            f"Saving graph data ({len(results)} chunks)",
+            current=len(results),
+            total=len(parent_chunks)
+        )
+        await asyncio.to_thread(graph_service.add_extraction_results, results, file_id)
         
         logger.info(f"   └─ Extracted: {total_entities} entities, {total_relationships} relationships")
         
         # Get graph stats
-        graph_stats = graph_service.get_stats()
+        graph_stats = await graph_service.get_stats_async()
         logger.info(f"   └─ Graph now contains: {graph_stats['total_nodes']} nodes, {graph_stats['total_edges']} edges")
         
+        # Cached RAG contexts predate this document
+        clear_retrieval_caches()
+        
         # ─────────────────────────────────────
         # Complete!
         # ─────────────────────────────────────
@@ -246,14 +233,19 @@ async def process_document(file_path: str, file_id: str):
     except Exception as e:
         logger.error(f"❌ Error processing document {file_id}: {e}")
         
-        # Mark as failed in progress tracker
-        progress_tracker.mark_failed(file_id, str(e))
-        
-        # Mark as failed in vector store
-        try:
-            vector_store = get_vector_store()
-            vector_store.mark_as_failed(file_id, str(e))
-        except Exception as ve:
-            logger.error(f"Failed to update vector store status: {ve}")
-            
+        _mark_failed(file_id, str(e))
         raise
+
+
+def _mark_failed(file_id: str, error: str):
+    """
+    Final failed state in the progress tracker (sends the final update, which
+    ends the file's sender and releases websocket clients) and vector store
+    """
+    progress_tracker.mark_failed(file_id, error)
+    
+    try:
+        vector_store = get_vector_store()
+        vector_store.mark_as_failed(file_id, error)
+    except Exception as ve:
+        logger.error(f"Failed to update vector store status: {ve}")
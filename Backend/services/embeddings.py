@@ -10,6 +10,7 @@ import numpy as np
 from typing import List
 from sentence_transformers import SentenceTransformer
 from config.settings import settings
+from services.cache_service import get_cache_service
 from utils.logger import setup_logger
 
 logger = setup_logger()
@@ -27,14 +28,33 @@ class EmbeddingService:
     MODEL_NAME = "all-mpnet-base-v2"
     EMBEDDING_DIMENSION = 768
     
+    # Pre-quantized int8 ONNX export shipped with the model (AVX512-VNNI kernels)
+    INT8_ONNX_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+    
     def __init__(self):
         logger.info(f"🧠 Loading local embedding model: {self.MODEL_NAME}...")
-        self.model = SentenceTransformer(self.MODEL_NAME)
+        self.model = self._load_model()
         self.dimension = self.EMBEDDING_DIMENSION
         
         logger.info(f"🧠 EmbeddingService initialized (LOCAL)")
         logger.info(f"   └─ Model: {self.MODEL_NAME}")
         logger.info(f"   └─ Dimension: {self.dimension}")
+    
+    def _load_model(self) -> SentenceTransformer:
+        """Load the int8 ONNX encoder when configured, else the float32 model"""
+        if settings.EMBEDDING_DTYPE == "int8":
+            try:
+                model = SentenceTransformer(
+                    self.MODEL_NAME,
+                    backend="onnx",
+                    model_kwargs={"file_name": self.INT8_ONNX_FILE}
+                )
+                logger.info(f"   └─ Backend: ONNX int8 ({self.INT8_ONNX_FILE})")
+                return model
+            except Exception as e:
+                logger.warning(f"⚠️ int8 ONNX encoder unavailable ({e}), using float32 model")
+        
+        return SentenceTransformer(self.MODEL_NAME)
 
     
     def embed_texts(self, texts: List[str]) -> np.ndarray:
@@ -45,7 +65,7 @@ class EmbeddingService:
             texts: List of text strings to embed
             
         Returns:
-            NumPy array of shape (len(texts), 768)
+            NumPy array of shape (len(texts), 768), float32, unit-norm rows
         """
         if not texts:
             return np.array([])
@@ -53,9 +73,11 @@ class EmbeddingService:
         logger.info(f"🧠 Generating embeddings for {len(texts)} texts...")
         
         try:
-            # Generate embeddings using sentence-transformers
-            embeddings = self.model.encode(texts, convert_to_numpy=True)
-            embeddings_array = embeddings.astype(np.float32)
+            # Generate embeddings using sentence-transformers. Normalized once
+            # here, so inner products are cosines for every consumer (the
+            # SQ8 index, semantic caches) and the float32 cast is free
+            embeddings = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+            embeddings_array = np.ascontiguousarray(embeddings, dtype=np.float32)
             
             logger.info(f"   └─ Generated: {len(embeddings)} embeddings")
             logger.info(f"   └─ Shape: {embeddings_array.shape}")
@@ -76,8 +98,19 @@ class EmbeddingService:
         Returns:
             NumPy array of shape (768,)
         """
+        cache = get_cache_service()
+        cache_key = cache.generate_key(f"embedding:{self.MODEL_NAME}", query)
+        cached_embedding = cache.get(cache_key)
+        if cached_embedding is not None:
+            return cached_embedding
+        
         embeddings = self.embed_texts([query])
-        return embeddings[0] if len(embeddings) > 0 else np.array([])
+        embedding = embeddings[0] if len(embeddings) > 0 else np.array([])
+        
+        if len(embedding) > 0:
+            cache.set(cache_key, embedding)
+        
+        return embedding
 
 
 # Global embedding service instance
@@ -4,17 +4,26 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-import json
+import asyncio
+import hashlib
+import orjson
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from openai import AzureOpenAI, AsyncAzureOpenAI
 from config.settings import settings
 from config import graph_config
 from utils.logger import setup_logger
 
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
 logger = setup_logger()
 
-# Entity extraction prompt (embedded since .txt files are gitignored)
+# Entity extraction instructions (embedded since .txt files are gitignored)
+# Static and sent verbatim as the system message, so the provider can reuse
+# its cached prefix across calls; only the chunk text varies (user message)
 ENTITY_EXTRACTION_PROMPT = """You are an expert knowledge graph extractor. Extract entities and relationships from the text.
 
 ENTITY TYPES: PERSON, ORGANIZATION, SYSTEM, CONCEPT, ERROR_CODE, FEATURE, LOCATION, EVENT, DOCUMENT, TECHNOLOGY, DATABASE, API
@@ -29,14 +38,22 @@ CONFIDENCE SCORES:
 - Below 0.3: Do not include
 
 Return ONLY valid JSON (no markdown, no additional text):
-{{
-  "entities": [{{"id": "...", "type": "...", "name": "...", "description": "..."}}],
-  "relationships": [{{"from_id": "...", "to_id": "...", "type": "...", "confidence": 0.95, "description": "..."}}]
-}}
+{
+  "entities": [{"id": "...", "type": "...", "name": "...", "description": "..."}],
+  "relationships": [{"from_id": "...", "to_id": "...", "type": "...", "confidence": 0.95, "description": "..."}]
+}"""
 
-TEXT: {text}
+# User message = prefix + chunk text + suffix (plain concatenation, no template parsing)
+USER_PROMPT_PREFIX = "TEXT: "
+USER_PROMPT_SUFFIX = "\n\nJSON RESULT:"
 
-JSON RESULT:"""
+# Static part of the extraction cache key (model, instructions, temperature),
+# hashed once so each key only hashes the chunk text
+_PROMPT_FINGERPRINT = hashlib.sha256(orjson.dumps({
+    "m": settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+    "s": ENTITY_EXTRACTION_PROMPT,
+    "t": graph_config.EXTRACTION_TEMPERATURE
+}, option=orjson.OPT_SORT_KEYS)).digest()
 
 class EntityExtractor:
     """
@@ -47,6 +64,9 @@ class EntityExtractor:
     │  • Entities (people, systems, concepts)    │
     │  • Relationships (how entities connect)    │
     │  • Confidence scores                       │
+    │                                             │
+    │  Results are cached on disk by prompt, so  │
+    │  re-ingesting unchanged text is free.      │
     └─────────────────────────────────────────────┘
     """
     
@@ -63,7 +83,97 @@ class EntityExtractor:
             azure_endpoint=settings.AZURE_OPENAI_API_BASE
         )
         
+        # Exact-match cache of parsed extraction results (survives restarts)
+        self.cache = None
+        if graph_config.ENABLE_EXTRACTION_CACHE:
+            if diskcache is not None:
+                self.cache = diskcache.Cache(graph_config.EXTRACTION_CACHE_DIR)
+            else:
+                logger.warning("⚠️ diskcache not installed, extraction cache disabled")
+        
         logger.info("🧠 EntityExtractor initialized")
+        logger.info(f"   └─ Extraction cache: {'✅' if self.cache is not None else '❌'}")
+    
+    @staticmethod
+    def _build_prompt(text: str) -> str:
+        """Dynamic part of the request: the chunk text only"""
+        return USER_PROMPT_PREFIX + text[:4000] + USER_PROMPT_SUFFIX
+    
+    @staticmethod
+    def _request_kwargs(prompt: str) -> Dict:
+        """Chat completion arguments (shared by sync and async calls)"""
+        return {
+            "model": settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+            "messages": [
+                {"role": "system", "content": ENTITY_EXTRACTION_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": graph_config.EXTRACTION_TEMPERATURE,
+            "max_tokens": 2000,
+            "response_format": {"type": "json_object"}  # Force JSON response
+        }
+    
+    @staticmethod
+    def _cache_key(prompt: str) -> str:
+        """The response is a function of model, prompt and temperature only"""
+        return hashlib.sha256(_PROMPT_FINGERPRINT + prompt.encode()).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[Dict]:
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Extraction cache read failed: {e}")
+            return None
+    
+    def _cache_set(self, key: str, result: Dict):
+        if self.cache is None:
+            return
+        try:
+            self.cache.set(key, result, expire=graph_config.EXTRACTION_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ Extraction cache write failed: {e}")
+    
+    @staticmethod
+    def _finalize(result: Dict, text: str, chunk_id: str) -> Dict:
+        """Attach chunk metadata, prefix IDs per chunk and apply the limits"""
+        # Add metadata
+        result['chunk_id'] = chunk_id
+        result['source_text_length'] = len(text)
+        
+        # Add unique prefixes to IDs to avoid collisions across chunks.
+        # Prefixed once per entity; relationship endpoints reuse the mapping
+        prefix = f"{chunk_id}_"
+        
+        def prefixed(raw_id: str) -> str:
+            return raw_id if raw_id.startswith(prefix) else prefix + raw_id
+        
+        entities = result.get('entities', [])
+        id_map = {entity['id']: prefixed(entity['id']) for entity in entities}
+        for entity in entities:
+            entity['id'] = id_map[entity['id']]
+        
+        for rel in result.get('relationships', []):
+            from_id, to_id = rel['from_id'], rel['to_id']
+            rel['from_id'] = id_map.get(from_id) or prefixed(from_id)
+            rel['to_id'] = id_map.get(to_id) or prefixed(to_id)
+        
+        # Limit entities/relationships
+        if len(result.get('entities', [])) > graph_config.MAX_ENTITIES_PER_CHUNK:
+            logger.warning(f"⚠️  Truncating {len(result['entities'])} entities to {graph_config.MAX_ENTITIES_PER_CHUNK}")
+            result['entities'] = result['entities'][:graph_config.MAX_ENTITIES_PER_CHUNK]
+        
+        if len(result.get('relationships', [])) > graph_config.MAX_RELATIONSHIPS_PER_CHUNK:
+            logger.warning(f"⚠️  Truncating {len(result['relationships'])} relationships to {graph_config.MAX_RELATIONSHIPS_PER_CHUNK}")
+            result['relationships'] = result['relationships'][:graph_config.MAX_RELATIONSHIPS_PER_CHUNK]
+        
+        logger.info(
+            f"   └─ Found: {len(result.get('entities', []))} entities, "
+            f"{len(result.get('relationships', []))} relationships"
+        )
+        
+        return result
     
     def extract(self, text: str, chunk_id: str) -> Dict:
         """
@@ -82,70 +192,22 @@ class EntityExtractor:
         """
         logger.info(f"🧠 Extracting entities from chunk {chunk_id}...")
         
-        # Prepare prompt (Escape braces in text to prevent format errors)
-        safe_text = text[:4000].replace("{", "{{").replace("}", "}}")
-        prompt = ENTITY_EXTRACTION_PROMPT.format(text=safe_text)
+        prompt = self._build_prompt(text)
+        cache_key = self._cache_key(prompt)
         
         try:
-            # Call GPT-5
-            response = self.client.chat.completions.create(
-                model=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a knowledge graph extraction expert. Return only valid JSON."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=graph_config.EXTRACTION_TEMPERATURE,
-                max_tokens=2000,
-                response_format={"type": "json_object"}  # Force JSON response
-            )
-            
-            # Parse response
-            result_text = response.choices[0].message.content
-            
-            # Clean JSON (remove markdown if present)
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0]
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0]
-            
-            result = json.loads(result_text.strip())
+            result = self._cache_get(cache_key)
+            if result is not None:
+                logger.info("   └─ ⚡ Extraction cache hit")
+            else:
+                # Call GPT-5
+                response = self.client.chat.completions.create(**self._request_kwargs(prompt))
+                # json_object response format: the content is bare JSON, parsed straight away
+                result = orjson.loads(response.choices[0].message.content)
+                # Stored before ID prefixing: the same text may recur under another chunk_id
+                self._cache_set(cache_key, result)
             
-            # Add metadata
-            result['chunk_id'] = chunk_id
-            result['source_text_length'] = len(text)
-            
-            # Add unique prefixes to IDs to avoid collisions across chunks
-            for entity in result.get('entities', []):
-                if not entity['id'].startswith(f"{chunk_id}_"):
-                    entity['id'] = f"{chunk_id}_{entity['id']}"
-            
-            for rel in result.get('relationships', []):
-                if not rel['from_id'].startswith(f"{chunk_id}_"):
-                    rel['from_id'] = f"{chunk_id}_{rel['from_id']}"
-                if not rel['to_id'].startswith(f"{chunk_id}_"):
-                    rel['to_id'] = f"{chunk_id}_{rel['to_id']}"
-            
-            # Limit entities/relationships
-            if len(result.get('entities', [])) > graph_config.MAX_ENTITIES_PER_CHUNK:
-                logger.warning(f"⚠️  Truncating {len(result['entities'])} entities to {graph_config.MAX_ENTITIES_PER_CHUNK}")
-                result['entities'] = result['entities'][:graph_config.MAX_ENTITIES_PER_CHUNK]
-            
-            if len(result.get('relationships', [])) > graph_config.MAX_RELATIONSHIPS_PER_CHUNK:
-                logger.warning(f"⚠️  Truncating {len(result['relationships'])} relationships to {graph_config.MAX_RELATIONSHIPS_PER_CHUNK}")
-                result['relationships'] = result['relationships'][:graph_config.MAX_RELATIONSHIPS_PER_CHUNK]
-            
-            logger.info(
-                f"   └─ Found: {len(result.get('entities', []))} entities, "
-                f"{len(result.get('relationships', []))} relationships"
-            )
-            
-            return result
+            return self._finalize(result, text, chunk_id)
             
         except Exception as e:
             logger.error(f"❌ Entity extraction failed: {e}")
@@ -169,70 +231,21 @@ class EntityExtractor:
         """
         logger.info(f"🧠 [Async] Extracting entities from chunk {chunk_id}...")
         
-        # Prepare prompt (Escape braces in text to prevent format errors)
-        safe_text = text[:4000].replace("{", "{{").replace("}", "}}")
-        prompt = ENTITY_EXTRACTION_PROMPT.format(text=safe_text)
+        prompt = self._build_prompt(text)
+        cache_key = self._cache_key(prompt)
         
         try:
-            # Call GPT-5 Asynchronously
-            response = await self.async_client.chat.completions.create(
-                model=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a knowledge graph extraction expert. Return only valid JSON."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=graph_config.EXTRACTION_TEMPERATURE,
-                max_tokens=2000,
-                response_format={"type": "json_object"}  # Force JSON response
-            )
-            
-            # Parse response
-            result_text = response.choices[0].message.content
-            
-            # Clean JSON (remove markdown if present)
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0]
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0]
-            
-            result = json.loads(result_text.strip())
-            
-            # Add metadata
-            result['chunk_id'] = chunk_id
-            result['source_text_length'] = len(text)
-            
-            # Add unique prefixes to IDs to avoid collisions across chunks
-            for entity in result.get('entities', []):
-                if not entity['id'].startswith(f"{chunk_id}_"):
-                    entity['id'] = f"{chunk_id}_{entity['id']}"
-            
-            for rel in result.get('relationships', []):
-                if not rel['from_id'].startswith(f"{chunk_id}_"):
-                    rel['from_id'] = f"{chunk_id}_{rel['from_id']}"
-                if not rel['to_id'].startswith(f"{chunk_id}_"):
-                    rel['to_id'] = f"{chunk_id}_{rel['to_id']}"
-            
-            # Limit entities/relationships
-            if len(result.get('entities', [])) > graph_config.MAX_ENTITIES_PER_CHUNK:
-                logger.warning(f"⚠️  Truncating {len(result['entities'])} entities to {graph_config.MAX_ENTITIES_PER_CHUNK}")
-                result['entities'] = result['entities'][:graph_config.MAX_ENTITIES_PER_CHUNK]
+            result = self._cache_get(cache_key)
+            if result is not None:
+                logger.info("   └─ ⚡ Extraction cache hit")
+            else:
+                # Call GPT-5 Asynchronously
+                response = await self.async_client.chat.completions.create(**self._request_kwargs(prompt))
+                result = orjson.loads(response.choices[0].message.content)
+                # Stored before ID prefixing: the same text may recur under another chunk_id
+                self._cache_set(cache_key, result)
             
-            if len(result.get('relationships', [])) > graph_config.MAX_RELATIONSHIPS_PER_CHUNK:
-                logger.warning(f"⚠️  Truncating {len(result['relationships'])} relationships to {graph_config.MAX_RELATIONSHIPS_PER_CHUNK}")
-                result['relationships'] = result['relationships'][:graph_config.MAX_RELATIONSHIPS_PER_CHUNK]
-            
-            logger.info(
-                f"   └─ Found: {len(result.get('entities', []))} entities, "
-                f"{len(result.get('relationships', []))} relationships"
-            )
-            
-            return result
+            return self._finalize(result, text, chunk_id)
             
         except Exception as e:
             logger.error(f"❌ Entity extraction failed: {e}")
@@ -243,6 +256,29 @@ class EntityExtractor:
                 "error": str(e)
             }
 
+    async def extract_batch(self, items: List[Tuple[str, str]]) -> List[Dict]:
+        """
+        Extract from many chunks concurrently
+        
+        Args:
+            items: (chunk_id, text) pairs
+        
+        Returns:
+            Results in the same order as items
+        """
+        # Bounded so a large document stays within the deployment's rate limits
+        semaphore = asyncio.Semaphore(graph_config.EXTRACTION_MAX_CONCURRENCY)
+        
+        async def bounded_extract(chunk_id: str, text: str) -> Dict:
+            async with semaphore:
+                return await self.extract_async(text=text, chunk_id=chunk_id)
+        
+        logger.info(
+            f"🧠 Batch extraction: {len(items)} chunks "
+            f"(max {graph_config.EXTRACTION_MAX_CONCURRENCY} concurrent)"
+        )
+        return await asyncio.gather(*[bounded_extract(chunk_id, text) for chunk_id, text in items])
+
 
 # Global instance
 _entity_extractor = None
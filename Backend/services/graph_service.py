@@ -5,14 +5,193 @@
 """
 
 import os
+import sys
+import asyncio
+import threading
+from array import array
 from typing import List, Dict, Optional
 from collections import defaultdict
-from neo4j import GraphDatabase, basic_auth
+from neo4j import AsyncGraphDatabase, GraphDatabase, basic_auth
 from config import graph_config
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
+# Graph statistics in one call, from the counts Neo4j maintains (needs APOC)
+META_STATS_QUERY = (
+    "CALL apoc.meta.stats() YIELD nodeCount, relCount, labels, relTypesCount "
+    "RETURN nodeCount, relCount, labels, relTypesCount"
+)
+
+# Fallback graph statistics without apoc.meta (node_types still needs APOC)
+STATS_QUERIES = {
+    "nodes": "MATCH (n) RETURN count(n) as c",
+    "edges": "MATCH ()-[r]->() RETURN count(r) as c",
+    "node_types": (
+        "CALL db.labels() YIELD label "
+        "CALL apoc.cypher.run('MATCH (:`'+label+'`) RETURN count(*) as count', {}) YIELD value "
+        "RETURN label, value.count as count"
+    ),
+    "edge_types": "MATCH ()-[r]->() RETURN type(r) as t, count(r) as c",
+}
+
+# Batched MERGE templates; labels / relationship types cannot be parameters
+NODE_MERGE_TEMPLATE = """
+UNWIND range(0, size($ids) - 1) AS i
+MERGE (n:`{base}` {{id: $ids[i]}})
+ON CREATE SET 
+    n:`{label}`,
+    n.name = $names[i],
+    n.name_lower = toLower($names[i]),
+    n.description = $descs[i],
+    n.file_id = $file_ids[i],
+    n.created_at = timestamp(),
+    n.source_chunks = $chunk_ids[i]
+ON MATCH SET
+    n.description = CASE 
+        WHEN size(toString($descs[i])) > size(toString(n.description)) 
+        THEN $descs[i] 
+        ELSE n.description 
+    END,
+    n.source_chunks = n.source_chunks + [c IN $chunk_ids[i] WHERE NOT c IN n.source_chunks],
+    n.updated_at = timestamp()
+"""
+
+REL_MERGE_TEMPLATE = """
+UNWIND range(0, size($from_ids) - 1) AS i
+MATCH (source:`{base}` {{id: $from_ids[i]}})
+MATCH (target:`{base}` {{id: $to_ids[i]}})
+MERGE (source)-[r:`{label}`]->(target)
+ON CREATE SET
+    r.confidence = $confidences[i],
+    r.description = $descs[i],
+    r.file_id = $file_ids[i],
+    r.chunk_id = $chunk_ids[i],
+    r.created_at = timestamp()
+ON MATCH SET
+    r.confidence = CASE 
+        WHEN $confidences[i] > r.confidence THEN $confidences[i] 
+        ELSE r.confidence 
+    END
+"""
+
+# Rendered once per label: every batch of a type sends the identical string,
+# so Neo4j's query plan cache hits. Known types are pre-built, others on first use
+_node_merge_queries: Dict[str, str] = {
+    t: NODE_MERGE_TEMPLATE.format(base=graph_config.BASE_NODE_LABEL, label=t)
+    for t in graph_config.ENTITY_TYPES
+}
+_rel_merge_queries: Dict[str, str] = {
+    t: REL_MERGE_TEMPLATE.format(base=graph_config.BASE_NODE_LABEL, label=t)
+    for t in graph_config.RELATIONSHIP_TYPES
+}
+
+
+def _node_merge_query(node_type: str) -> str:
+    query = _node_merge_queries.get(node_type)
+    if query is None:
+        query = _node_merge_queries.setdefault(
+            node_type, NODE_MERGE_TEMPLATE.format(base=graph_config.BASE_NODE_LABEL, label=node_type)
+        )
+    return query
+
+
+def _rel_merge_query(rel_type: str) -> str:
+    query = _rel_merge_queries.get(rel_type)
+    if query is None:
+        query = _rel_merge_queries.setdefault(
+            rel_type, REL_MERGE_TEMPLATE.format(base=graph_config.BASE_NODE_LABEL, label=rel_type)
+        )
+    return query
+
+
+class EdgeTable:
+    """
+    Columnar (struct-of-arrays) store of the edges fetched for traversal.
+    
+    Nodes get dense integer ids on first sight (node_ids[i] is the string id),
+    so traversal hashes small ints instead of long chunk-prefixed strings.
+    Each relationship gets one row; the scalar columns traversal and scoring
+    read (endpoint node ints, type id, confidence) are parallel arrays, and
+    the adjacency lists hold row numbers instead of edge dicts. The full edge
+    dict (row -> dict) is only materialized for returned paths.
+    Rows are filled on demand from Neo4j via `fetch(node_id, direction)`.
+    """
+    
+    def __init__(self, fetch):
+        self._fetch = fetch
+        self._lock = threading.RLock()
+        self.node_ids: List[str] = []
+        self._node_of: Dict[str, int] = {}
+        self.from_nodes = array('q')
+        self.to_nodes = array('q')
+        self.type_ids = array('q')
+        self.confidences = array('d')
+        self.edges: List[Dict] = []
+        # (from node, to node, type) -> row: an edge seen from both ends shares a row
+        self._row_of: Dict[tuple, int] = {}
+        self._out_rows: Dict[int, List[int]] = {}
+        self._in_rows: Dict[int, List[int]] = {}
+    
+    def node_count(self) -> int:
+        return len(self._out_rows) + len(self._in_rows)
+    
+    def node(self, node_id: str) -> int:
+        """Dense integer id of a node (assigned on first use)"""
+        node = self._node_of.get(node_id)
+        if node is None:
+            with self._lock:
+                node = self._node_of.get(node_id)
+                if node is None:
+                    node = self._node_of[node_id] = len(self.node_ids)
+                    self.node_ids.append(node_id)
+        return node
+    
+    def out_rows(self, node: int) -> List[int]:
+        """Rows of the node's outgoing edges (O(deg) once cached)"""
+        return self._rows(self._out_rows, node, 'outgoing')
+    
+    def in_rows(self, node: int) -> List[int]:
+        """Rows of the node's incoming edges"""
+        return self._rows(self._in_rows, node, 'incoming')
+    
+    def invalidate(self, from_ids, to_ids):
+        """Drop the adjacency of written relationship endpoints (refetched on next use)"""
+        for node_id in from_ids:
+            self._out_rows.pop(self._node_of.get(node_id), None)
+        for node_id in to_ids:
+            self._in_rows.pop(self._node_of.get(node_id), None)
+    
+    def _rows(self, index: Dict[int, List[int]], node: int, direction: str) -> List[int]:
+        rows = index.get(node)
+        if rows is None:
+            edges = self._fetch(self.node_ids[node], direction=direction)
+            with self._lock:
+                rows = [self._add(edge) for edge in edges]
+            index[node] = rows
+        return rows
+    
+    def _add(self, edge: Dict) -> int:
+        """Row for the edge (existing rows are refreshed: confidence may have grown)"""
+        confidence = edge.get('confidence')
+        confidence = 0.8 if confidence is None else confidence
+        from_node, to_node = self.node(edge['from_id']), self.node(edge['to_id'])
+        key = (from_node, to_node, edge['type_id'], edge['type'])
+        row = self._row_of.get(key)
+        if row is not None:
+            self.confidences[row] = confidence
+            self.edges[row] = edge
+            return row
+        
+        row = self._row_of[key] = len(self.edges)
+        self.from_nodes.append(from_node)
+        self.to_nodes.append(to_node)
+        self.type_ids.append(edge['type_id'])
+        self.confidences.append(confidence)
+        self.edges.append(edge)
+        return row
+
+
 class GraphService:
     """
     ┌─────────────────────────────────────────────┐
@@ -28,18 +207,66 @@ class GraphService:
         self.user = graph_config.NEO4J_USER
         self.password = graph_config.NEO4J_PASSWORD
         self.database = getattr(graph_config, 'NEO4J_DATABASE', 'neo4j')
+        # Columnar edge store + adjacency for traversal (see _traversal_table)
+        self._edge_table = EdgeTable(self.get_node_edges)
+        # Bumped on every write so derived caches (traversal results) go stale
+        self._version = 0
         
         try:
             self.driver = GraphDatabase.driver(
                 self.uri, 
-                auth=basic_auth(self.user, self.password)
+                auth=basic_auth(self.user, self.password),
+                max_connection_pool_size=graph_config.NEO4J_MAX_POOL_SIZE
             )
             self.driver.verify_connectivity()
+            self._ensure_schema()
+            
+            # Async driver for calls made directly from the event loop
+            # (connects lazily; must only be used from the server's loop)
+            self.async_driver = AsyncGraphDatabase.driver(
+                self.uri,
+                auth=basic_auth(self.user, self.password),
+                max_connection_pool_size=graph_config.NEO4J_MAX_POOL_SIZE
+            )
             logger.info("🕸️  Connected to Neo4j successfully")
         except Exception as e:
             logger.error(f"❌ Failed to connect to Neo4j: {e}")
             raise e
 
+    def _ensure_schema(self):
+        """
+        Unique id constraint and name text index on the base label.
+        Graphs written before the base label existed are backfilled once by
+        utils/setup_neo4j_indices.py, not on every start.
+        """
+        label = graph_config.BASE_NODE_LABEL
+        with self.driver.session(database=self.database) as session:
+            try:
+                session.run(
+                    f"CREATE CONSTRAINT constraint_{label}_id IF NOT EXISTS "
+                    f"FOR (n:`{label}`) REQUIRE n.id IS UNIQUE"
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Could not create :{label}(id) constraint: {e}")
+            
+            # Name search matches a stored lowercase copy through a (trigram) text index
+            try:
+                session.run(
+                    f"CREATE TEXT INDEX index_{label}_name_lower IF NOT EXISTS "
+                    f"FOR (n:`{label}`) ON (n.name_lower)"
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Could not create :{label}(name_lower) text index: {e}")
+
+
+    @staticmethod
+    def _node_type(labels) -> str:
+        """Entity type = first label other than the base label"""
+        for label in labels:
+            if label != graph_config.BASE_NODE_LABEL:
+                return label
+        return 'Unknown'
+
     def close(self):
         """Close Neo4j driver connection"""
         if self.driver:
@@ -50,144 +277,191 @@ class GraphService:
         Add entities and relationships from extraction result
         Uses atomic transactions for consistency.
         """
-        entities = extraction_result.get('entities', [])
-        relationships = extraction_result.get('relationships', [])
-        chunk_id = extraction_result.get('chunk_id', 'unknown')
+        self.add_extraction_results([extraction_result], file_id)
+
+    def add_extraction_results(self, extraction_results: List[Dict], file_id: str):
+        """
+        Add entities and relationships from many extraction results at once.
+        All node and relationship types are written in a single transaction,
+        so a document costs one commit instead of one per type per chunk.
+        """
+        nodes_by_type = defaultdict(list)
+        rels_by_type = defaultdict(list)
+        
+        # Relationship endpoints are chunk-prefixed entity ids of the same batch;
+        # anything else would only cost a failed MATCH in Neo4j
+        entity_ids = {
+            entity['id']
+            for extraction_result in extraction_results
+            for entity in extraction_result.get('entities', [])
+        }
+        dropped = 0
+        
+        for extraction_result in extraction_results:
+            chunk_id = extraction_result.get('chunk_id', 'unknown')
+            
+            # 1. Prepare Nodes (Group by Type)
+            for entity in extraction_result.get('entities', []):
+                # Add metadata
+                entity['file_id'] = file_id
+                entity['chunk_id'] = chunk_id # Add current chunk to source_chunks logic
+                nodes_by_type[entity.get('type', 'Unknown')].append(entity)
+
+            # 2. Prepare Relationships (Group by Type)
+            relationships = extraction_result.get('relationships', [])
+            valid = [
+                rel for rel in relationships
+                if rel['from_id'] in entity_ids and rel['to_id'] in entity_ids
+            ]
+            dropped += len(relationships) - len(valid)
+            for rel in valid:
+                rel['file_id'] = file_id
+                rel['chunk_id'] = chunk_id
+                rels_by_type[rel.get('type', 'RELATED_TO')].append(rel)
+        
+        if dropped:
+            logger.warning(f"⚠️ Skipped {dropped} relationships with missing endpoints")
         
-        if not entities and not relationships:
+        if not nodes_by_type and not rels_by_type:
             return
 
         logger.info(
-            f"📥 Adding to Neo4j: {len(entities)} entities, "
-            f"{len(relationships)} relationships"
+            f"📥 Adding to Neo4j: {sum(map(len, nodes_by_type.values()))} entities, "
+            f"{sum(map(len, rels_by_type.values()))} relationships"
         )
+
+        # 3. Execute Writes (nodes first: relationships MATCH them in the same tx)
+        with self.driver.session(database=self.database) as session:
+            session.execute_write(self._write_graph_tx, nodes_by_type, rels_by_type)
         
-        # 1. Prepare Nodes (Group by Type)
-        nodes_by_type = defaultdict(list)
-        for entity in entities:
-            # Add metadata
-            entity['file_id'] = file_id
-            entity['chunk_id'] = chunk_id # Add current chunk to source_chunks logic
-            nodes_by_type[entity.get('type', 'Unknown')].append(entity)
+        self._version += 1
+        # Endpoints of new/updated relationships have stale adjacency lists
+        written = [rel for rels in rels_by_type.values() for rel in rels]
+        self._edge_table.invalidate(
+            [rel['from_id'] for rel in written],
+            [rel['to_id'] for rel in written]
+        )
 
-        # 2. Prepare Relationships (Group by Type)
-        rels_by_type = defaultdict(list)
-        for rel in relationships:
-            rel['file_id'] = file_id
-            rel['chunk_id'] = chunk_id
-            rels_by_type[rel.get('type', 'RELATED_TO')].append(rel)
+    @classmethod
+    def _write_graph_tx(cls, tx, nodes_by_type: Dict, rels_by_type: Dict):
+        """Transaction function writing all node and relationship types"""
+        for node_type, nodes in nodes_by_type.items():
+            cls._create_nodes_tx(tx, node_type, cls._pack_nodes(nodes))
+        
+        for rel_type, rels in rels_by_type.items():
+            cls._create_rels_tx(tx, rel_type, cls._pack_rels(rels))
+
+    # Rows are sent as parallel columns (one homogeneous list per field) instead
+    # of a list of maps, so Bolt does not repeat every key name for every row
+    @staticmethod
+    def _pack_nodes(nodes: List[Dict]) -> Dict[str, List]:
+        # One row per id: repeated mentions are merged here (longest description,
+        # deduplicated chunk ids) so each node is MERGEd and its source_chunks
+        # list scanned once per batch, not once per mention
+        merged: Dict[str, Dict] = {}
+        for n in nodes:
+            row = merged.get(n['id'])
+            if row is None:
+                merged[n['id']] = {**n, 'chunk_ids': {n.get('chunk_id'): None}}
+                continue
+            if len(str(n.get('description'))) > len(str(row.get('description'))):
+                row['description'] = n.get('description')
+            row['chunk_ids'][n.get('chunk_id')] = None
+        
+        rows = merged.values()
+        return {
+            "ids": [n['id'] for n in rows],
+            "names": [n.get('name') for n in rows],
+            "descs": [n.get('description') for n in rows],
+            "file_ids": [n.get('file_id') for n in rows],
+            "chunk_ids": [list(n['chunk_ids']) for n in rows],
+        }
 
-        # 3. Execute Writes
-        with self.driver.session(database=self.database) as session:
-            # Write Nodes
-            for node_type, nodes in nodes_by_type.items():
-                session.execute_write(self._create_nodes_tx, node_type, nodes)
-            
-            # Write Relationships
-            for rel_type, rels in rels_by_type.items():
-                session.execute_write(self._create_rels_tx, rel_type, rels)
-                
     @staticmethod
-    def _create_nodes_tx(tx, node_type, nodes):
+    def _pack_rels(rels: List[Dict]) -> Dict[str, List]:
+        # One row per (from, to) edge of this type: the first mention creates it
+        # and the highest confidence wins, the same end state as MERGE-ing every
+        # mention, with one MERGE per distinct edge
+        merged: Dict[tuple, Dict] = {}
+        for r in rels:
+            key = (r['from_id'], r['to_id'])
+            row = merged.get(key)
+            if row is None:
+                merged[key] = dict(r)
+            elif (r.get('confidence') or 0) > (row.get('confidence') or 0):
+                row['confidence'] = r['confidence']
+        
+        rels = list(merged.values())
+        return {
+            "from_ids": [r['from_id'] for r in rels],
+            "to_ids": [r['to_id'] for r in rels],
+            "confidences": [r.get('confidence') for r in rels],
+            "descs": [r.get('description') for r in rels],
+            "file_ids": [r.get('file_id') for r in rels],
+            "chunk_ids": [r.get('chunk_id') for r in rels],
+        }
+
+    @staticmethod
+    def _create_nodes_tx(tx, node_type, columns: Dict[str, List]):
         """Transaction function to create nodes"""
-        query = f"""
-        UNWIND $batch AS row
-        MERGE (n:`{node_type}` {{id: row.id}})
-        ON CREATE SET 
-            n.name = row.name,
-            n.description = row.description,
-            n.file_id = row.file_id,
-            n.created_at = timestamp(),
-            n.source_chunks = [row.chunk_id]
-        ON MATCH SET
-            n.description = CASE 
-                WHEN size(toString(row.description)) > size(toString(n.description)) 
-                THEN row.description 
-                ELSE n.description 
-            END,
-            n.source_chunks = CASE
-                WHEN NOT row.chunk_id IN n.source_chunks 
-                THEN n.source_chunks + row.chunk_id
-                ELSE n.source_chunks
-            END,
-            n.updated_at = timestamp()
-        """
-        tx.run(query, batch=nodes)
+        tx.run(_node_merge_query(node_type), **columns)
 
     @staticmethod
-    def _create_rels_tx(tx, rel_type, rels):
+    def _create_rels_tx(tx, rel_type, columns: Dict[str, List]):
         """Transaction function to create relationships"""
-        query = f"""
-        UNWIND $batch AS row
-        MATCH (source {{id: row.from_id}})
-        MATCH (target {{id: row.to_id}})
-        MERGE (source)-[r:`{rel_type}`]->(target)
-        ON CREATE SET
-            r.confidence = row.confidence,
-            r.description = row.description,
-            r.file_id = row.file_id,
-            r.chunk_id = row.chunk_id,
-            r.created_at = timestamp()
-        ON MATCH SET
-            r.confidence = CASE 
-                WHEN row.confidence > r.confidence THEN row.confidence 
-                ELSE r.confidence 
-            END
-        """
-        tx.run(query, batch=rels)
+        tx.run(_rel_merge_query(rel_type), **columns)
 
     def get_node(self, node_id: str) -> Optional[Dict]:
         """Get a node by ID"""
         with self.driver.session(database=self.database) as session:
             result = session.run(
-                "MATCH (n {id: $id}) RETURN n", 
+                f"MATCH (n:`{graph_config.BASE_NODE_LABEL}` {{id: $id}}) RETURN n", 
                 id=node_id
             ).single()
             
             if result:
                 node = dict(result['n'])
-                # Add implicit 'type' from labels (taking the first one usually)
-                labels = list(result['n'].labels)
-                node['type'] = labels[0] if labels else 'Unknown'
+                # Add implicit 'type' from labels
+                node['type'] = self._node_type(result['n'].labels)
                 return node
             return None
 
     def find_nodes_by_name(self, name: str, limit: int = 10) -> List[Dict]:
         """Find nodes by name (case-insensitive partial match)"""
         with self.driver.session(database=self.database) as session:
-            query = """
-            MATCH (n)
-            WHERE toLower(n.name) CONTAINS toLower($name)
+            query = f"""
+            MATCH (n:`{graph_config.BASE_NODE_LABEL}`)
+            WHERE n.name_lower CONTAINS $name_lower
             RETURN n, labels(n) as labels
             LIMIT $limit
             """
-            result = session.run(query, name=name, limit=limit)
+            result = session.run(query, name_lower=name.lower(), limit=limit)
             nodes = []
             for record in result:
                 node = dict(record['n'])
-                node['type'] = record['labels'][0] if record['labels'] else 'Unknown'
+                node['type'] = self._node_type(record['labels'])
                 nodes.append(node)
             return nodes
 
     def get_node_edges(self, node_id: str, direction: str = 'both') -> List[Dict]:
         """
         Get all edges connected to a node
-        Returns list of dicts: { ...edge_props, type, from_id, to_id, direction }
+        Returns list of dicts: { ...edge_props, type, type_id, from_id, to_id, direction }
         """
         query = ""
         if direction == 'outgoing':
-            query = """
-            MATCH (n {id: $node_id})-[r]->(target)
+            query = f"""
+            MATCH (n:`{graph_config.BASE_NODE_LABEL}` {{id: $node_id}})-[r]->(target)
             RETURN r, type(r) as type, startNode(r).id as from_id, endNode(r).id as to_id, 'outgoing' as direction
             """
         elif direction == 'incoming':
-            query = """
-            MATCH (n {id: $node_id})<-[r]-(source)
+            query = f"""
+            MATCH (n:`{graph_config.BASE_NODE_LABEL}` {{id: $node_id}})<-[r]-(source)
             RETURN r, type(r) as type, startNode(r).id as from_id, endNode(r).id as to_id, 'incoming' as direction
             """
         else: # both
-            query = """
-            MATCH (n {id: $node_id})-[r]-(other)
+            query = f"""
+            MATCH (n:`{graph_config.BASE_NODE_LABEL}` {{id: $node_id}})-[r]-(other)
             RETURN r, type(r) as type, startNode(r).id as from_id, endNode(r).id as to_id, 
                    CASE WHEN startNode(r).id = $node_id THEN 'outgoing' ELSE 'incoming' END as direction
             """
@@ -197,44 +471,113 @@ class GraphService:
             edges = []
             for record in result:
                 edge_props = dict(record['r'])
-                edge_props['type'] = record['type']
+                # Interned: the adjacency index holds many edges per type, and the
+                # type-id lookup then compares by identity
+                edge_type = sys.intern(record['type'])
+                edge_props['type'] = edge_type
+                edge_props['type_id'] = graph_config.get_edge_type_id(edge_type)
                 edge_props['from_id'] = record['from_id']
                 edge_props['to_id'] = record['to_id']
                 edge_props['direction'] = record['direction']
                 edges.append(edge_props)
             return edges
 
+    def _traversal_table(self) -> EdgeTable:
+        """
+        The edge table for one traversal. Callers keep this reference for the
+        whole search: when the table is full it is replaced, never emptied,
+        so rows a search already holds stay valid.
+        """
+        if self._edge_table.node_count() >= graph_config.ADJACENCY_CACHE_MAX_NODES:
+            self._edge_table = EdgeTable(self.get_node_edges)
+        return self._edge_table
+
     def get_stats(self) -> Dict:
         """Get graph statistics"""
         with self.driver.session(database=self.database) as session:
-            # Fast approximations or exact counts
-            nodes_count = session.run("MATCH (n) RETURN count(n) as c").single()['c']
-            edges_count = session.run("MATCH ()-[r]->() RETURN count(r) as c").single()['c']
-            
-            # Count by labels (approximated for speed logic, but simple enough here)
-            node_types_res = session.run("CALL db.labels() YIELD label CALL apoc.cypher.run('MATCH (:`'+label+'`) RETURN count(*) as count', {}) YIELD value RETURN label, value.count as count")
-            # Fallback if apoc not available or complex:
-            # Just do simple match for types if few
+            try:
+                return self._build_meta_stats(session.run(META_STATS_QUERY).single())
+            except Exception as e:
+                logger.debug(f"apoc.meta.stats unavailable, counting directly: {e}")
             
-            node_types = {}
+            nodes = session.run(STATS_QUERIES['nodes']).data()
+            edges = session.run(STATS_QUERIES['edges']).data()
             try:
-                for record in node_types_res:
-                    node_types[record['label']] = record['count']
-            except Exception:
-                # Basic redundant fallback
-                node_types = {"Status": "Detailed stats require APOC"}
-
-            # Simple edge type count
-            edge_types_res = session.run("MATCH ()-[r]->() RETURN type(r) as t, count(r) as c")
-            edge_types = {record['t']: record['c'] for record in edge_types_res}
-
-            return {
-                "total_nodes": nodes_count,
-                "total_edges": edges_count,
-                "node_types": node_types,
-                "edge_types": edge_types,
-                "avg_edges_per_node": edges_count / max(nodes_count, 1)
+                node_types = session.run(STATS_QUERIES['node_types']).data()
+            except Exception as e:
+                node_types = e
+            edge_types = session.run(STATS_QUERIES['edge_types']).data()
+        
+        return self._build_stats(nodes, edges, node_types, edge_types)
+
+    async def get_stats_async(self) -> Dict:
+        """
+        Get graph statistics from the event loop.
+        Without APOC, each count query gets its own pooled session, so they run concurrently.
+        """
+        try:
+            async with self.async_driver.session(database=self.database) as session:
+                result = await session.run(META_STATS_QUERY)
+                return self._build_meta_stats(await result.single())
+        except Exception as e:
+            logger.debug(f"apoc.meta.stats unavailable, counting directly: {e}")
+        
+        async def fetch(query: str) -> List[Dict]:
+            async with self.async_driver.session(database=self.database) as session:
+                result = await session.run(query)
+                return await result.data()
+        
+        nodes, edges, node_types, edge_types = await asyncio.gather(
+            fetch(STATS_QUERIES['nodes']),
+            fetch(STATS_QUERIES['edges']),
+            fetch(STATS_QUERIES['node_types']),
+            fetch(STATS_QUERIES['edge_types']),
+            return_exceptions=True
+        )
+        for result in (nodes, edges, edge_types):
+            if isinstance(result, Exception):
+                raise result
+        
+        return self._build_stats(nodes, edges, node_types, edge_types)
+
+    @staticmethod
+    def _build_meta_stats(record) -> Dict:
+        """Shape an apoc.meta.stats() record like _build_stats"""
+        nodes_count = record['nodeCount']
+        edges_count = record['relCount']
+        return {
+            "total_nodes": nodes_count,
+            "total_edges": edges_count,
+            "node_types": {
+                label: count for label, count in record['labels'].items()
+                if label != graph_config.BASE_NODE_LABEL
+            },
+            "edge_types": dict(record['relTypesCount']),
+            "avg_edges_per_node": edges_count / max(nodes_count, 1)
+        }
+
+    @staticmethod
+    def _build_stats(nodes: List[Dict], edges: List[Dict], node_types, edge_types: List[Dict]) -> Dict:
+        """Shape the stats query rows (node_types is an Exception when APOC is unavailable)"""
+        nodes_count = nodes[0]['c']
+        edges_count = edges[0]['c']
+        
+        if isinstance(node_types, Exception):
+            # Basic redundant fallback
+            node_types = {"Status": "Detailed stats require APOC"}
+        else:
+            node_types = {
+                record['label']: record['count'] for record in node_types
+                if record['label'] != graph_config.BASE_NODE_LABEL
             }
+        
+        return {
+            "total_nodes": nodes_count,
+            "total_edges": edges_count,
+            "node_types": node_types,
+            "edge_types": {record['t']: record['c'] for record in edge_types},
+            "avg_edges_per_node": edges_count / max(nodes_count, 1)
+        }
 
     def clear_all(self):
         """
@@ -245,6 +588,8 @@ class GraphService:
         logger.info("🗑️ CLEARING ALL NEO4J DATA")
         with self.driver.session(database=self.database) as session:
             session.run("MATCH (n) DETACH DELETE n")
+        self._edge_table = EdgeTable(self.get_node_edges)
+        self._version += 1
         logger.info("✅ Neo4j database cleared")
 
 # Global instance
@@ -4,14 +4,27 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-from typing import List, Dict, Tuple, Set
-from collections import deque
+import re
+from threading import Lock
+from typing import List, Dict, Tuple, Set, Optional
+import numpy as np
+from cachetools import LRUCache
 from config import graph_config
-from services.graph_service import get_graph_service
+from services.graph_service import EdgeTable, get_graph_service
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
+# Query keywords: 3+ chars, internal - . / _ ' kept (service-name, v2.1, user's)
+_QUERY_TOKEN_RE = re.compile(r"\w[\w\-./']+\w")
+_STOP_WORDS = frozenset({
+    'what', 'when', 'where', 'how', 'why', 'who', 'the', 'is', 'are',
+    'was', 'were', 'to', 'from', 'in', 'on', 'at', 'by', 'with', 'and', 'or'
+})
+
+# Length score by hop count (index); longer paths score 0.4
+_LENGTH_SCORE_LUT = np.array([0.4, 1.0, 0.8, 0.6])
+
 class GraphTraversal:
     """
     ┌─────────────────────────────────────────────┐
@@ -26,6 +39,13 @@ class GraphTraversal:
     
     def __init__(self):
         self.graph_service = get_graph_service()
+        
+        # Memoized per graph version (a write makes old entries unreachable):
+        # (entity ref, version) → resolved IDs, (normalized query, version) → results
+        self._resolution_cache = LRUCache(maxsize=max(graph_config.ENTITY_RESOLUTION_CACHE_SIZE, 1))
+        self._search_cache = LRUCache(maxsize=max(graph_config.GRAPH_SEARCH_CACHE_SIZE, 1))
+        self._cache_lock = Lock()
+        
         logger.info("🔍 GraphTraversal initialized")
     
     def find_paths(
@@ -61,20 +81,20 @@ class GraphTraversal:
             logger.info("   └─ Could not resolve entities")
             return []
         
-        # Find all paths
+        # Find all paths (as edge-table rows; one table for the whole search)
+        table = self.graph_service._traversal_table()
         all_paths = []
         for start_id in start_ids:
             for end_id in end_ids:
                 if start_id != end_id:
-                    paths = self._bfs_paths(start_id, end_id, max_hops)
+                    paths = self._bfs_paths(table, start_id, end_id, max_hops)
                     all_paths.extend(paths)
         
-        # Score and rank paths
-        scored_paths = []
-        for path in all_paths:
-            scored = self._score_path(path)
-            if scored and scored['score'] > 0:
-                scored_paths.append(scored)
+        # Score and rank paths (all at once)
+        scored_paths = [
+            scored for scored in self._score_paths_batch(table, all_paths)
+            if scored and scored['score'] > 0
+        ]
         
         # Sort by score
         scored_paths.sort(key=lambda x: x['score'], reverse=True)
@@ -86,69 +106,136 @@ class GraphTraversal:
     def _resolve_entities(self, entity_refs: List[str]) -> List[str]:
         """Resolve entity names/IDs to actual IDs"""
         resolved = []
+        graph_version = self.graph_service._version
         for ref in entity_refs:
-            # Try direct ID lookup
-            if self.graph_service.get_node(ref):
-                resolved.append(ref)
-            else:
-                # Try name search
-                matches = self.graph_service.find_nodes_by_name(ref, limit=3)
-                resolved.extend([m['id'] for m in matches])
+            resolved.extend(self._resolve_single(ref, graph_version))
         return list(set(resolved))[:10]  # Limit to 10 unique IDs
     
+    def _resolve_single(self, ref: str, graph_version: int) -> Tuple[str, ...]:
+        """IDs for one entity reference, memoized per graph version"""
+        key = (ref, graph_version)
+        with self._cache_lock:
+            cached = self._resolution_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        # Try direct ID lookup
+        if self.graph_service.get_node(ref):
+            ids = (ref,)
+        else:
+            # Try name search
+            matches = self.graph_service.find_nodes_by_name(ref, limit=3)
+            ids = tuple(m['id'] for m in matches)
+        
+        with self._cache_lock:
+            self._resolution_cache[key] = ids
+        return ids
+    
     def _bfs_paths(
         self,
+        table: EdgeTable,
         start_id: str,
         end_id: str,
         max_hops: int
-    ) -> List[List[Dict]]:
+    ) -> List[List[int]]:
         """
-        BFS to find all paths from start to end
+        Bidirectional BFS to find paths from start to end
+        
+        Grows a search tree forward from start (outgoing edges) and one
+        backward from end (incoming edges), always expanding the smaller
+        frontier by one level, so each side only goes ~max_hops / 2 deep.
+        Every edge joining the two trees yields one path (shortest first),
+        rebuilt by walking both trees' parent pointers.
+        
+        Pruning: edges below MIN_CONFIDENCE are never followed (scoring would
+        reject every path through them), and the search stops at
+        MAX_PATHS_PER_QUERY paths, as many as find_paths can return.
         
-        Returns: List of paths, where each path is a list of edges
+        Returns: List of paths, where each path is a list of edge-table rows
         """
-        # Queue: (current_node, path_so_far, visited_nodes)
-        queue = deque([(start_id, [], {start_id})])
+        from_nodes, to_nodes, confidences = table.from_nodes, table.to_nodes, table.confidences
+        min_confidence = graph_config.MIN_CONFIDENCE
+        max_paths = graph_config.MAX_PATHS_PER_QUERY
+        # Nodes are the table's dense ints: sets / dicts below hash small ints
+        start, end = table.node(start_id), table.node(end_id)
+        # node -> (neighbour towards start / end, edge row) on the first path found to it.
+        # A node belongs to at most one tree, so joined paths never repeat a node
+        fwd_parent: Dict[int, Optional[Tuple[int, int]]] = {start: None}
+        bwd_parent: Dict[int, Optional[Tuple[int, int]]] = {end: None}
+        fwd_frontier, bwd_frontier = [start], [end]
+        fwd_level = bwd_level = 0
         found_paths = []
+        joined = set()
         
-        while queue and len(found_paths) < 20:  # Limit total paths
-            current, path, visited = queue.popleft()
-            
-            # Stop if too long
-            if len(path) >= max_hops:
-                continue
+        # Joining edges found while expanding add at most max_hops edges in total
+        while fwd_frontier and bwd_frontier and fwd_level + bwd_level < max_hops:
+            forward = len(fwd_frontier) <= len(bwd_frontier)
+            if forward:
+                frontier, own_parent, other_parent = fwd_frontier, fwd_parent, bwd_parent
+            else:
+                frontier, own_parent, other_parent = bwd_frontier, bwd_parent, fwd_parent
             
-            # Get outgoing edges from current node
-            edges = self.graph_service.get_node_edges(current, direction='outgoing')
+            next_frontier = []
+            for node in frontier:
+                # Adjacency index, O(deg)
+                rows = table.out_rows(node) if forward else table.in_rows(node)
+                for row in rows:
+                    if confidences[row] < min_confidence:
+                        continue
+                    next_node = to_nodes[row] if forward else from_nodes[row]
+                    
+                    # Trees meet: start → from_id → to_id → end
+                    if next_node in other_parent:
+                        if row not in joined:
+                            joined.add(row)
+                            found_paths.append(self._join_paths(table, fwd_parent, bwd_parent, row))
+                            if len(found_paths) >= max_paths:  # Limit total paths
+                                return found_paths
+                        continue
+                    
+                    if next_node not in own_parent:
+                        own_parent[next_node] = (node, row)
+                        next_frontier.append(next_node)
             
-            for edge in edges:
-                next_node = edge.get('to_id')
-                
-                if not next_node:
-                    continue
-                
-                # Found target!
-                if next_node == end_id:
-                    found_paths.append(path + [edge])
-                    if len(found_paths) >= 20:
-                        break
-                    continue
-                
-                # Visit if not seen and within hop limit
-                if next_node not in visited and len(path) < max_hops - 1:
-                    queue.append((
-                        next_node,
-                        path + [edge],
-                        visited | {next_node}
-                    ))
+            if forward:
+                fwd_frontier, fwd_level = next_frontier, fwd_level + 1
+            else:
+                bwd_frontier, bwd_level = next_frontier, bwd_level + 1
         
         return found_paths
     
-    def _score_path(self, path: List[Dict]) -> Optional[Dict]:
+    @staticmethod
+    def _join_paths(
+        table: EdgeTable,
+        fwd_parent: Dict[int, Optional[Tuple[int, int]]],
+        bwd_parent: Dict[int, Optional[Tuple[int, int]]],
+        link: int
+    ) -> List[int]:
+        """Rows start → from(link) (forward tree), link, to(link) → end (backward tree)"""
+        path = [link]
+        node = table.from_nodes[link]
+        while fwd_parent[node] is not None:
+            node, row = fwd_parent[node]
+            path.append(row)
+        path.reverse()
+        
+        node = table.to_nodes[link]
+        while bwd_parent[node] is not None:
+            node, row = bwd_parent[node]
+            path.append(row)
+        return path
+    
+    def _score_paths_batch(self, table: EdgeTable, paths: List[List[int]]) -> List[Optional[Dict]]:
         """
-        Score a path based on multiple factors
+        Score many paths at once based on multiple factors
         
-        Returns:
+        Paths are edge-table rows: the type-id and confidence columns are
+        gathered into (paths × hops) arrays without touching the edge dicts;
+        the length / edge-type / confidence scores, the confidence filters and
+        the weighted sum are then vector operations over all paths. Edge dicts
+        are only looked up for the paths that survive.
+        
+        Returns (per path, None if rejected):
             {
                 'path': path,
                 'score': float,
@@ -157,61 +244,83 @@ class GraphTraversal:
                 'source_chunks': [chunk_ids]
             }
         """
-        if not path:
-            return None
+        n = len(paths)
+        if n == 0:
+            return []
         
-        # Factor 1: Length (shorter is better)
-        hop_count = len(path)
-        length_score = {1: 1.0, 2: 0.8, 3: 0.6}.get(hop_count, 0.4)
-        
-        # Factor 2: Edge relevance (weighted by type)
-        edge_scores = [
-            graph_config.EDGE_WEIGHTS.get(edge.get('type', ''), 0.5)
-            for edge in path
-        ]
-        edge_score = sum(edge_scores) / len(edge_scores) if edge_scores else 0.5
+        lengths = np.fromiter((len(path) for path in paths), dtype=np.intp, count=n)
+        width = max(int(lengths.max()), 1)
+        mask = np.arange(width) < lengths[:, None]
         
+        # Row-major mask order == concatenated path order: scatter the gathered columns
+        flat_rows = [row for path in paths for row in path]
+        type_ids = np.full((n, width), graph_config.UNKNOWN_EDGE_TYPE_ID, dtype=np.intp)
+        type_ids[mask] = [table.type_ids[row] for row in flat_rows]
         # Factor 3: Confidence (from extraction)
-        confidences = [edge.get('confidence', 0.8) for edge in path]
+        conf = np.zeros((n, width), dtype=np.float64)
+        conf[mask] = [table.confidences[row] for row in flat_rows]
+        
+        hops = np.maximum(lengths, 1)
+        
+        # Factor 1: Length (shorter is better)
+        length_score = np.where(
+            lengths < len(_LENGTH_SCORE_LUT),
+            _LENGTH_SCORE_LUT[np.minimum(lengths, len(_LENGTH_SCORE_LUT) - 1)],
+            0.4
+        )
+        
+        # Factor 2: Edge relevance (weighted by type, via the precomputed lookup table)
+        edge_score = np.where(mask, graph_config.EDGE_WEIGHT_VEC[type_ids], 0.0).sum(axis=1) / hops
         
         # Apply hybrid confidence filtering
-        min_confidence = min(confidences) if confidences else 0.5
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0.5
+        min_confidence = np.where(mask, conf, np.inf).min(axis=1)
+        avg_confidence = np.where(mask, conf, 0.0).sum(axis=1) / hops
         
-        # Hard filter for very low confidence
-        if min_confidence < graph_config.MIN_CONFIDENCE:
-            return None  # Reject this path
+        # Hard filter for very low confidence (and empty paths)
+        keep = (lengths > 0) & (min_confidence >= graph_config.MIN_CONFIDENCE)
         
         # Soft penalty for medium confidence
-        if min_confidence < graph_config.SOFT_CONFIDENCE:
-            normalized = (min_confidence - graph_config.MIN_CONFIDENCE) / \
-                        (graph_config.SOFT_CONFIDENCE - graph_config.MIN_CONFIDENCE)
-            avg_confidence *= (0.5 + 0.5 * max(0, normalized))
+        normalized = (min_confidence - graph_config.MIN_CONFIDENCE) / \
+                    (graph_config.SOFT_CONFIDENCE - graph_config.MIN_CONFIDENCE)
+        avg_confidence *= np.where(
+            min_confidence < graph_config.SOFT_CONFIDENCE,
+            0.5 + 0.5 * np.maximum(0.0, normalized),
+            1.0
+        )
         
         # Final score (weighted combination)
         weights = graph_config.PATH_SCORING_WEIGHTS
-        final_score = (
+        final_scores = (
             weights['length'] * length_score +
             weights['edge_type'] * edge_score +
             weights['confidence'] * avg_confidence
         )
         
-        # Extract info
-        nodes = [path[0].get('from_id', '')] + [e.get('to_id', '') for e in path]
-        source_chunks = list(set(
-            e.get('chunk_id', '') for e in path if e.get('chunk_id')
-        ))
-        
-        return {
-            'path': path,
-            'score': final_score,
-            'hop_count': hop_count,
-            'nodes': nodes,
-            'edges': [e.get('type', '') for e in path],
-            'source_chunks': source_chunks,
-            'confidence_scores': confidences,
-            'low_confidence_warning': min_confidence < 0.70
-        }
+        scored = []
+        for i, rows in enumerate(paths):
+            if not keep[i]:
+                scored.append(None)  # Reject this path
+                continue
+            
+            # Extract info
+            path = [table.edges[row] for row in rows]
+            nodes = [path[0]['from_id']] + [e['to_id'] for e in path]
+            source_chunks = list(set(
+                e.get('chunk_id', '') for e in path if e.get('chunk_id')
+            ))
+            
+            scored.append({
+                'path': path,
+                'score': float(final_scores[i]),
+                'hop_count': len(path),
+                'nodes': nodes,
+                'edges': [e.get('type', '') for e in path],
+                'source_chunks': source_chunks,
+                'confidence_scores': conf[i, :len(rows)].tolist(),
+                'low_confidence_warning': bool(min_confidence[i] < 0.70)
+            })
+        
+        return scored
     
     def search_by_query(self, query: str) -> List[Tuple[Dict, float]]:
         """
@@ -223,16 +332,25 @@ class GraphTraversal:
         Returns:
             List of (chunk_dict, score) tuples for RRF fusion
         """
+        # Results depend only on the (normalized) query and the graph contents
+        query_norm = " ".join(query.lower().split())
+        key = (query_norm, self.graph_service._version)
+        with self._cache_lock:
+            cached = self._search_cache.get(key)
+        if cached is None:
+            cached = self._search(query_norm)
+            with self._cache_lock:
+                self._search_cache[key] = cached
+        return list(cached)
+    
+    def _search(self, query: str) -> List[Tuple[Dict, float]]:
+        """search_by_query body (uncached)"""
         logger.info(f"🕸️  Graph search: '{query[:50]}...'")
         
-        # Simple entity extraction from query (keywords)
-        # Remove common words
-        stop_words = {'what', 'when', 'where', 'how', 'why', 'who', 'the', 'is', 'are', 
-                     'was', 'were', 'to', 'from', 'in', 'on', 'at', 'by', 'with', 'and', 'or'}
+        # Simple entity extraction from query (keywords, common words removed)
         query_words = [
-            word.strip('.,!?;:()[]{}"\' ')
-            for word in query.lower().split()
-            if len(word) > 2 and word.lower() not in stop_words
+            word for word in _QUERY_TOKEN_RE.findall(query.lower())
+            if word not in _STOP_WORDS
         ]
         
         if len(query_words) < 2:
@@ -4,12 +4,29 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-from typing import List, Dict, Tuple
+import numpy as np
+from typing import List, Dict, Optional, Tuple
 from collections import defaultdict
+from utils.jit import njit
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
+
+@njit(cache=True, fastmath=True)
+def _weighted_rrf(slots, ranks, methods, weights, k, n_slots):
+    """
+    RRF kernel over flattened (slot, rank, method) triples of all result sets
+    Returns (scores per slot, slots ordered by descending score)
+    """
+    scores = np.zeros(n_slots, dtype=np.float64)
+    for i in range(slots.shape[0]):
+        scores[slots[i]] += weights[methods[i]] / (k + ranks[i])
+    # mergesort is stable: ties keep first-seen order
+    order = np.argsort(-scores, kind='mergesort')
+    return scores, order
+
+
 class HybridRetriever:
     """
     ┌─────────────────────────────────────────────┐
@@ -36,7 +53,9 @@ class HybridRetriever:
         self, 
         result_sets: List[List[Tuple[Dict, float]]], 
         weights: List[float] = None,
-        method_names: List[str] = None
+        method_names: List[str] = None,
+        return_details: bool = False,
+        top_k: Optional[int] = None
     ) -> List[Tuple[Dict, float]]:
         """
         Fuse multiple ranked result sets using RRF
@@ -45,6 +64,11 @@ class HybridRetriever:
             result_sets: List of result lists, each containing (chunk, score) tuples
             weights: Optional weights for each result set (default: equal weights)
             method_names: Optional names for each method (for logging)
+            return_details: Attach per-method 'fusion_details' (rank and RRF
+                contribution) to each chunk; off by default (debugging only)
+            top_k: Only the first top_k results are copied and annotated with
+                fusion metadata; the rest keep their score but reference the
+                caller's chunk dicts unchanged (default: annotate all)
         
         Returns:
             Fused results sorted by RRF score
@@ -62,54 +86,78 @@ class HybridRetriever:
         if method_names is None:
             method_names = [f"Method_{i+1}" for i in range(len(result_sets))]
         
-        # Normalize weights
+        # Normalize weights (all-zero weights fall back to equal weights)
         total_weight = sum(weights)
+        if total_weight <= 0:
+            weights, total_weight = [1.0] * len(result_sets), float(len(result_sets))
         weights = [w / total_weight for w in weights]
         
-        # Calculate RRF scores
-        rrf_scores = defaultdict(float)
-        chunk_map = {}
-        contribution_tracker = defaultdict(list)
+        # Assign each unique chunk a dense slot; every result entry becomes a
+        # (slot, rank, method) triple in flat arrays (SoA) for the RRF kernel
+        slot_of = {}
+        chunk_map = []
+        contribution_tracker = defaultdict(list) if return_details else None
+        total = sum(len(result_set) for result_set in result_sets)
+        flat_slots = np.empty(total, dtype=np.int64)
+        flat_ranks = np.empty(total, dtype=np.float64)
+        flat_methods = np.empty(total, dtype=np.int64)
+        pos = 0
         
-        for result_set, weight, method_name in zip(result_sets, weights, method_names):
+        for m, (result_set, weight, method_name) in enumerate(zip(result_sets, weights, method_names)):
             for rank, (chunk, original_score) in enumerate(result_set):
-                # Use 'id' if available, otherwise create unique key from content
-                chunk_id = chunk.get('id') or hash(chunk.get('content', ''))
-                
-                # RRF formula: weight / (k + rank)
-                rrf_score = weight / (self.k + rank)
-                rrf_scores[chunk_id] += rrf_score
+                # Retrievers assign stable ids; an id-less chunk is keyed by object
+                # identity (not by hashing its whole content on every appearance)
+                chunk_id = chunk.get('id')
+                if chunk_id is None:
+                    chunk_id = id(chunk)
                 
-                # Track contribution
-                contribution_tracker[chunk_id].append({
-                    'method': method_name,
-                    'rank': rank,
-                    'original_score': original_score,
-                    'rrf_contribution': rrf_score
-                })
+                slot = slot_of.get(chunk_id)
+                if slot is None:
+                    slot = slot_of[chunk_id] = len(chunk_map)
+                    chunk_map.append(chunk)
+                flat_slots[pos] = slot
+                flat_ranks[pos] = rank
+                flat_methods[pos] = m
+                pos += 1
                 
-                # Store chunk (in case not stored yet)
-                if chunk_id not in chunk_map:
-                    chunk_map[chunk_id] = chunk
+                if return_details:
+                    # Track contribution (RRF formula: weight / (k + rank))
+                    contribution_tracker[slot].append({
+                        'method': method_name,
+                        'rank': rank,
+                        'original_score': original_score,
+                        'rrf_contribution': weight / (self.k + rank)
+                    })
         
-        # Sort by RRF score
-        sorted_results = sorted(
-            rrf_scores.items(),
-            key=lambda x: x[1],
-            reverse=True
+        # Calculate RRF scores and sort by them
+        rrf_scores, order = _weighted_rrf(
+            flat_slots, flat_ranks, flat_methods,
+            np.asarray(weights, dtype=np.float64), float(self.k), len(chunk_map)
         )
         
+        # Which methods returned each slot, as a bitmask (bit m = method m)
+        appeared_masks = np.zeros(len(chunk_map), dtype=np.int64)
+        np.bitwise_or.at(appeared_masks, flat_slots, np.left_shift(1, flat_methods))
+        
         # Convert back to (chunk, score) format with metadata
         fused_results = []
-        for chunk_id, score in sorted_results:
-            chunk = chunk_map[chunk_id].copy()
+        order = order.tolist()
+        annotated = len(order) if top_k is None else top_k
+        for slot in order[:annotated]:
+            score = float(rrf_scores[slot])
+            chunk = chunk_map[slot].copy()
+            mask = int(appeared_masks[slot])
             # Add fusion metadata
             chunk['rrf_score'] = score
-            chunk['appeared_in'] = [c['method'] for c in contribution_tracker[chunk_id]]
-            chunk['fusion_details'] = contribution_tracker[chunk_id]
+            chunk['appeared_in'] = [name for m, name in enumerate(method_names) if mask >> m & 1]
+            if return_details:
+                chunk['fusion_details'] = contribution_tracker[slot]
             
             fused_results.append((chunk, score))
         
+        # Tail (past top_k): scores only matter, no copies
+        fused_results.extend((chunk_map[slot], float(rrf_scores[slot])) for slot in order[annotated:])
+        
         logger.info(
             f"🔀 RRF Fusion: {len(result_sets)} methods ({', '.join(method_names)}) → "
             f"{len(fused_results)} unique results"
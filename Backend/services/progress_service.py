@@ -5,9 +5,27 @@
 """
 
 import asyncio
-from typing import Dict, List, Optional, Set
+import orjson
+import time
+from threading import Lock
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import datetime
 from enum import Enum
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Per-client send timeout (seconds) and cap on in-flight sends across all files
+SEND_TIMEOUT = 5.0
+MAX_CONCURRENT_SENDS = 100
+# Progress timestamps are reused for this long (seconds) instead of reformatted per update
+TIMESTAMP_RESOLUTION = 0.05
+# Intermediate updates are coalesced and broadcast at most this often (seconds)
+FLUSH_INTERVAL = 0.1
+SEND_QUEUE_SIZE = 32  # Pending update signals per file (oldest dropped when full)
+# Finished (completed/failed) records stay pollable this long (seconds), then are dropped
+PROGRESS_RETENTION = 300
 
 class ProcessingStage(str, Enum):
     """Document processing stages"""
@@ -22,6 +40,31 @@ class ProcessingStage(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+@dataclass(slots=True)
+class ProgressRecord:
+    """Progress of one file (fixed fields: no per-record dict)"""
+    file_id: str
+    filename: str
+    stage: ProcessingStage
+    progress: int
+    total_stages: int
+    current_stage_num: int
+    details: Dict
+    started_at: str
+    updated_at: str
+    error: Optional[str] = None
+    stage_emoji: str = ""
+    stage_display: str = ""
+    stage_description: str = ""
+    summary: Optional[Dict] = None
+    completed_at: Optional[str] = None
+    failed_at: Optional[str] = None
+    
+    def as_dict(self) -> Dict:
+        """Shallow dict of all fields (the status endpoint's JSON shape)"""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+
 class ProgressTracker:
     """
     ┌─────────────────────────────────────────────┐
@@ -35,10 +78,22 @@ class ProgressTracker:
     
     def __init__(self):
         # Storage for all file progress
-        self.progress_data: Dict[str, Dict] = {}
+        self.progress_data: Dict[str, ProgressRecord] = {}
+        # (time.time(), its ISO string) of the last formatted timestamp
+        self._now_cache = (0.0, "")
+        
+        # WebSocket connections (file_id -> ((websocket, done event), ...)).
+        # Copy-on-write tuples: a broadcast iterates its snapshot while
+        # (un)registrations swap in a new tuple
+        # The event is set once the socket has nothing more to receive
+        self.connections: Dict[str, Tuple[Tuple[object, asyncio.Event], ...]] = {}
+        # Bounds concurrent broadcast sends (file descriptors / buffers)
+        self._send_slots = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
         
-        # WebSocket connections (file_id -> set of websocket connections)
-        self.connections: Dict[str, Set] = {}
+        # One sender task per file in progress, fed through a bounded queue
+        # (an item = "state changed", True for the final update)
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._senders: Dict[str, asyncio.Task] = {}
         
         # Stage metadata with emoji and descriptions
         self.stage_info = {
@@ -93,21 +148,33 @@ class ProgressTracker:
                 "description": "An error occurred"
             }
         }
+        
+        # (emoji, display, description) per stage, snapshotted once
+        self._stage_meta = {
+            stage: (meta.get("emoji", "📄"), meta.get("display", stage), meta.get("description", ""))
+            for stage, meta in self.stage_info.items()
+        }
     
     def start_processing(self, file_id: str, filename: str, total_stages: int = 8):
         """Initialize progress tracking for a file"""
-        self.progress_data[file_id] = {
-            "file_id": file_id,
-            "filename": filename,
-            "stage": ProcessingStage.UPLOADING,
-            "progress": 0,
-            "total_stages": total_stages,
-            "current_stage_num": 0,
-            "details": {},
-            "started_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
-            "error": None
-        }
+        now = self._now_iso()
+        record = ProgressRecord(
+            file_id=file_id,
+            filename=filename,
+            stage=ProcessingStage.UPLOADING,
+            progress=0,
+            total_stages=total_stages,
+            current_stage_num=0,
+            details={},
+            started_at=now,
+            updated_at=now
+        )
+        self._set_stage(record, ProcessingStage.UPLOADING)
+        self.progress_data[file_id] = record
+        
+        if file_id not in self._senders:
+            self._queues[file_id] = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+            self._senders[file_id] = asyncio.create_task(self._sender_loop(file_id))
         
     def update_stage(
         self, 
@@ -117,123 +184,206 @@ class ProgressTracker:
         stage_num: Optional[int] = None
     ):
         """Update the current processing stage"""
-        if file_id not in self.progress_data:
+        record = self.progress_data.get(file_id)
+        if record is None:
             return
             
-        progress_info = self.progress_data[file_id]
-        progress_info["stage"] = stage
-        progress_info["updated_at"] = datetime.now().isoformat()
+        self._set_stage(record, stage)
+        record.updated_at = self._now_iso()
         
         if stage_num is not None:
-            progress_info["current_stage_num"] = stage_num
-            progress_info["progress"] = int((stage_num / progress_info["total_stages"]) * 100)
+            record.current_stage_num = stage_num
+            record.progress = int((stage_num / record.total_stages) * 100)
         
         if details:
-            progress_info["details"].update(details)
+            record.details.update(details)
         
-        # Broadcast update
-        asyncio.create_task(self._broadcast_update(file_id))
+        # Broadcast update (coalesced by the sender)
+        self._enqueue(file_id)
     
     def update_substage(self, file_id: str, message: str, current: int = None, total: int = None):
         """Update substage progress (e.g., "Batch 5/10")"""
-        if file_id not in self.progress_data:
+        record = self.progress_data.get(file_id)
+        if record is None:
             return
             
-        self.progress_data[file_id]["details"]["substage"] = message
+        record.details["substage"] = message
         if current is not None and total is not None:
-            self.progress_data[file_id]["details"]["substage_progress"] = {
+            record.details["substage_progress"] = {
                 "current": current,
                 "total": total,
                 "percent": int((current / total) * 100) if total > 0 else 0
             }
         
-        self.progress_data[file_id]["updated_at"] = datetime.now().isoformat()
-        asyncio.create_task(self._broadcast_update(file_id))
+        record.updated_at = self._now_iso()
+        self._enqueue(file_id)
     
     def mark_completed(self, file_id: str, summary: Optional[Dict] = None):
         """Mark processing as completed"""
-        if file_id not in self.progress_data:
+        record = self.progress_data.get(file_id)
+        if record is None:
             return
             
-        self.progress_data[file_id]["stage"] = ProcessingStage.COMPLETED
-        self.progress_data[file_id]["progress"] = 100
-        self.progress_data[file_id]["current_stage_num"] = self.progress_data[file_id]["total_stages"]
-        self.progress_data[file_id]["completed_at"] = datetime.now().isoformat()
+        self._set_stage(record, ProcessingStage.COMPLETED)
+        record.progress = 100
+        record.current_stage_num = record.total_stages
+        record.completed_at = self._now_iso()
         
         if summary:
-            self.progress_data[file_id]["summary"] = summary
+            record.summary = summary
         
-        asyncio.create_task(self._broadcast_update(file_id))
+        self._enqueue(file_id, final=True)
+        self._schedule_forget(file_id, record)
     
     def mark_failed(self, file_id: str, error: str):
         """Mark processing as failed"""
-        if file_id not in self.progress_data:
+        record = self.progress_data.get(file_id)
+        if record is None:
             return
             
-        self.progress_data[file_id]["stage"] = ProcessingStage.FAILED
-        self.progress_data[file_id]["error"] = error
-        self.progress_data[file_id]["failed_at"] = datetime.now().isoformat()
+        self._set_stage(record, ProcessingStage.FAILED)
+        record.error = error
+        record.failed_at = self._now_iso()
         
-        asyncio.create_task(self._broadcast_update(file_id))
+        self._enqueue(file_id, final=True)
+        self._schedule_forget(file_id, record)
+    
+    def _schedule_forget(self, file_id: str, record: ProgressRecord):
+        """Drop a finished record after PROGRESS_RETENTION (unless the file was restarted since)"""
+        def forget():
+            if self.progress_data.get(file_id) is record:
+                del self.progress_data[file_id]
+        asyncio.get_running_loop().call_later(PROGRESS_RETENTION, forget)
+    
+    def _now_iso(self) -> str:
+        """Current local time as ISO string, reformatted at most every TIMESTAMP_RESOLUTION"""
+        t = time.time()
+        cached_at, cached = self._now_cache
+        if t - cached_at < TIMESTAMP_RESOLUTION:
+            return cached
+        cached = datetime.fromtimestamp(t).isoformat()
+        self._now_cache = (t, cached)
+        return cached
+    
+    def _set_stage(self, record: "ProgressRecord", stage: ProcessingStage):
+        """Set the stage along with its display info (enriched once, not per read)"""
+        record.stage = stage
+        record.stage_emoji, record.stage_display, record.stage_description = (
+            self._stage_meta.get(stage) or ("📄", stage, "")
+        )
     
     def get_progress(self, file_id: str) -> Optional[Dict]:
-        """Get current progress for a file"""
-        progress = self.progress_data.get(file_id)
-        if not progress:
-            return None
-            
-        # Enrich with stage info
-        stage = progress["stage"]
-        stage_meta = self.stage_info.get(stage, {})
-        
-        return {
-            **progress,
-            "stage_emoji": stage_meta.get("emoji", "📄"),
-            "stage_display": stage_meta.get("display", stage),
-            "stage_description": stage_meta.get("description", "")
-        }
+        """Get current progress for a file (enriched with stage info)"""
+        record = self.progress_data.get(file_id)
+        return record.as_dict() if record is not None else None
     
-    async def register_connection(self, file_id: str, websocket):
-        """Register a WebSocket connection for progress updates"""
-        if file_id not in self.connections:
-            self.connections[file_id] = set()
-        self.connections[file_id].add(websocket)
+    async def register_connection(self, file_id: str, websocket) -> asyncio.Event:
+        """
+        Register a WebSocket connection for progress updates.
+        Returns an event that is set after the final (completed/failed)
+        update is sent, or when the socket turns out to be dead.
+        """
+        done = asyncio.Event()
+        self.connections[file_id] = self.connections.get(file_id, ()) + ((websocket, done),)
+        return done
     
     async def unregister_connection(self, file_id: str, websocket):
         """Unregister a WebSocket connection"""
-        if file_id in self.connections:
-            self.connections[file_id].discard(websocket)
-            if not self.connections[file_id]:
-                del self.connections[file_id]
+        self._drop_connections(file_id, {websocket})
+    
+    def _drop_connections(self, file_id: str, websockets: Set):
+        """Swap in the file's connection tuple without the given sockets"""
+        remaining = tuple(
+            (websocket, done) for websocket, done in self.connections.get(file_id, ())
+            if websocket not in websockets
+        )
+        if remaining:
+            self.connections[file_id] = remaining
+        else:
+            self.connections.pop(file_id, None)
+    
+    def _enqueue(self, file_id: str, final: bool = False):
+        """Signal the file's sender (drops the oldest signal when the queue is full)"""
+        queue = self._queues.get(file_id)
+        if queue is None:
+            return
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(final)
+    
+    async def _sender_loop(self, file_id: str):
+        """
+        Broadcast a file's updates until its final one is sent.
+        Intermediate updates wait FLUSH_INTERVAL so a burst goes out once;
+        the final (completed/failed) update is sent right away.
+        """
+        queue = self._queues[file_id]
+        try:
+            while True:
+                final = await queue.get()
+                if not final:
+                    await asyncio.sleep(FLUSH_INTERVAL)
+                while not queue.empty():
+                    final = queue.get_nowait() or final
+                
+                await self._broadcast_update(file_id)
+                if final:
+                    # Nothing more will be sent: the final update released every waiter
+                    self.connections.pop(file_id, None)
+                    break
+        except Exception as e:
+            logger.warning(f"⚠️ Progress sender for {file_id} stopped: {e}")
+        finally:
+            self._queues.pop(file_id, None)
+            self._senders.pop(file_id, None)
     
     async def _broadcast_update(self, file_id: str):
         """Broadcast progress update to all connected clients"""
         if file_id not in self.connections:
             return
             
-        progress = self.get_progress(file_id)
-        if not progress:
+        record = self.progress_data.get(file_id)
+        if record is None:
             return
         
-        # Send to all connected websockets
-        dead_connections = set()
-        for websocket in self.connections[file_id]:
-            try:
-                await websocket.send_json(progress)
-            except Exception:
-                dead_connections.add(websocket)
+        is_final = record.stage in (ProcessingStage.COMPLETED, ProcessingStage.FAILED)
+        connections = self.connections[file_id]
+        # Encode once (orjson serializes the slots dataclass directly), every client gets the same text
+        payload = orjson.dumps(record).decode()
+        
+        async def safe_send(websocket) -> bool:
+            # A slow client times out instead of holding up the others
+            async with self._send_slots:
+                try:
+                    await asyncio.wait_for(websocket.send_text(payload), timeout=SEND_TIMEOUT)
+                    return True
+                except Exception:
+                    return False
+        
+        # Send to all connected websockets concurrently (results follow the snapshot's order)
+        results = await asyncio.gather(*(safe_send(websocket) for websocket, _ in connections))
+        
+        dead = set()
+        for (websocket, done), ok in zip(connections, results):
+            if not ok:
+                dead.add(websocket)
+            if is_final or not ok:
+                done.set()
         
         # Remove dead connections
-        for websocket in dead_connections:
-            self.connections[file_id].discard(websocket)
+        if dead:
+            self._drop_connections(file_id, dead)
 
 
 # Global singleton instance
 _progress_tracker = None
+_progress_tracker_lock = Lock()
 
 def get_progress_tracker() -> ProgressTracker:
     """Get or create progress tracker singleton"""
     global _progress_tracker
     if _progress_tracker is None:
-        _progress_tracker = ProgressTracker()
+        with _progress_tracker_lock:
+            if _progress_tracker is None:
+                _progress_tracker = ProgressTracker()
     return _progress_tracker
@@ -6,41 +6,79 @@
 """
 
 import re
-from typing import Dict, Tuple
-from config import agent_config
+from threading import Lock
+from typing import Dict, FrozenSet, Tuple
+from cachetools import LRUCache
+from config import agent_config, query_config
 from utils.logger import setup_logger
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 logger = setup_logger()
 
 # ─────────────────────────────────────────────────────────────
 # QUERY PATTERNS
+# Alternatives sharing a prefix are factored (h(?:i|ello|ey) rather than
+# hi|hello|hey) so the matcher tries fewer branches per position
 # ─────────────────────────────────────────────────────────────
 
 GREETING_PATTERNS = [
-    r'\b(hi|hello|hey|greetings|good morning|good afternoon|good evening)\b',
-    r'\bhow are you\b',
+    r'\b(h(?:i|ello|ey|owdy|ow are you)|greetings|good (?:morning|afternoon|evening))\b',
     r'\bwhat\'?s up\b',
-    r'\bhowdy\b',
     r'\byo\b'
 ]
 
 CHITCHAT_PATTERNS = [
-    r'\b(thank you|thanks|thx|ty|appreciate it?)\b',
-    r'\b(ok|okay|got it|understood|i see|alright|cool|nice)\b',
+    r'\b(th(?:ank you|anks|x)|ty|appreciate it?)\b',
+    r'\b(ok(?:ay)?|got it|understood|i see|alright|cool|nice)\b',
     r'\b(bye|goodbye|see you|cya|later)\b',
     r'\byou\'?re welcome\b',
     r'\bno problem\b'
 ]
 
 SIMPLE_FACTUAL_INDICATORS = [
-    r'\bwhat is\b',
-    r'\bwho is\b',
-    r'\bwhen (was|is|did)\b',
-    r'\bwhere (is|was)\b',
+    r'\bwh(?:at is|o is|en (?:was|is|did)|ere (?:is|was))\b',
     r'\bdefine\b',
     r'\bmeaning of\b'
 ]
 
+# Intent classes scanned in one pass (greeting > chitchat > simple when several match)
+INTENT_PATTERNS = {
+    'greeting': GREETING_PATTERNS,
+    'chitchat': CHITCHAT_PATTERNS,
+    'simple': SIMPLE_FACTUAL_INDICATORS,
+}
+
+# Exact identifiers (error codes, SKUs, ticket IDs): keyword search wins
+IDENTIFIER_PATTERN = r'\b[A-Z]{2,}[-_]?\d{3,}\b'
+
+# Explanatory questions: semantic + relationship evidence, not exact terms
+CONCEPTUAL_PATTERNS = [
+    r'^\s*(explain|why|how)\b(?! (many|much|long|old)\b)',
+    r'\bexplain\b',
+    r'\bwhy (is|are|does|do|did|was|were)\b'
+]
+
+# Compiled once at import: one alternation with a named group per intent
+# class, so a single scan of the query finds every class that matches
+_INTENT_RE = re.compile(
+    '|'.join(f"(?P<{name}>{'|'.join(patterns)})" for name, patterns in INTENT_PATTERNS.items()),
+    re.IGNORECASE
+)
+_IDENTIFIER_RE = re.compile(IDENTIFIER_PATTERN)
+_CONCEPTUAL_RE = re.compile('|'.join(CONCEPTUAL_PATTERNS), re.IGNORECASE)
+
+# ─────────────────────────────────────────────────────────────
+# RETRIEVER SETS
+# ─────────────────────────────────────────────────────────────
+
+ALL_RETRIEVERS: FrozenSet[str] = frozenset({'vector', 'bm25', 'graph'})
+KEYWORD_RETRIEVERS: FrozenSet[str] = frozenset({'bm25'})
+CONCEPTUAL_RETRIEVERS: FrozenSet[str] = frozenset({'vector', 'graph'})
+
 
 class QueryRouter:
     """
@@ -56,9 +94,13 @@ class QueryRouter:
     """
     
     def __init__(self):
-        self.greeting_regex = re.compile('|'.join(GREETING_PATTERNS), re.IGNORECASE)
-        self.chitchat_regex = re.compile('|'.join(CHITCHAT_PATTERNS), re.IGNORECASE)
-        self.simple_regex = re.compile('|'.join(SIMPLE_FACTUAL_INDICATORS), re.IGNORECASE)
+        # Agentic trigger keyword matcher, rebuilt if the keyword list changes
+        self._trigger_keywords: Tuple[str, ...] = ()
+        self._trigger_matcher = None
+        
+        # Stripped short query → (route, metadata)
+        self._route_cache = LRUCache(maxsize=max(query_config.ROUTE_CACHE_SIZE, 1))
+        self._route_cache_lock = Lock()
         
         logger.info("🧭 QueryRouter initialized")
     
@@ -75,13 +117,43 @@ class QueryRouter:
             - 'simple': Simple factual query
             - 'complex': Complex query
             - 'agentic': Research/comparison query
+        
+        RAG routes also carry 'retrievers': the retrieval methods worth running
+        (see select_retrievers).
+        
+        Routes of short queries are cached per stripped query; callers get
+        their own metadata dict.
+        """
+        query = query.strip()
+        if len(query) > query_config.ROUTER_SHORT_QUERY_MAX_CHARS:
+            route, metadata = self._classify(query, short=False)
+        else:
+            route, metadata = self._route(query)
+        logger.info(f"🧭 Route: {route.upper()} (query: '{query[:30]}...')")
+        return route, dict(metadata)
+    
+    def _route(self, query: str) -> Tuple[str, Dict]:
+        """Cached classification of a short (stripped) query"""
+        with self._route_cache_lock:
+            cached = self._route_cache.get(query)
+        if cached is None:
+            cached = self._classify(query, short=True)
+            with self._route_cache_lock:
+                self._route_cache[query] = cached
+        return cached
+    
+    def _classify(self, query: str, short: bool) -> Tuple[str, Dict]:
         """
-        query_lower = query.lower().strip()
-        word_count = len(query.split())
+        Classification behind route_query. Long queries (short=False) only get
+        the agentic check: they are routed complex without scanning the
+        greeting / chitchat / simple patterns or splitting into words.
+        """
+        # ASCII (the common case) lowercases without Unicode case folding
+        query_lower = query.lower() if query.isascii() else query.casefold()
+        intents = self._match_intents(query_lower) if short else frozenset()
         
         # 1. GREETING DETECTION
-        if self.greeting_regex.search(query_lower):
-            logger.info(f"🧭 Route: GREETING (query: '{query[:30]}...')")
+        if 'greeting' in intents:
             return 'greeting', {
                 'skip_rag': True,
                 'skip_hyde': True,
@@ -90,8 +162,7 @@ class QueryRouter:
             }
         
         # 2. CHITCHAT DETECTION
-        if self.chitchat_regex.search(query_lower):
-            logger.info(f"🧭 Route: CHITCHAT (query: '{query[:30]}...')")
+        if 'chitchat' in intents:
             return 'chitchat', {
                 'skip_rag': True,
                 'skip_hyde': True,
@@ -100,39 +171,91 @@ class QueryRouter:
             }
         
         # 3. AGENTIC DETECTION (Complex research queries)
-        if agent_config.ENABLE_AGENTIC_RAG and any(
-            kw in query_lower for kw in agent_config.AUTO_TRIGGER_KEYWORDS
-        ):
-            logger.info(f"🧭 Route: AGENTIC (query: '{query[:30]}...')")
+        if agent_config.ENABLE_AGENTIC_RAG and self._has_trigger_keyword(query_lower):
             return 'agentic', {
                 'skip_rag': False,
                 'skip_hyde': False,
                 'use_cache': True,
                 'use_agent': True,
+                'retrievers': ALL_RETRIEVERS,
                 'reasoning': 'Complex research/comparison query detected'
             }
         
         # 4. SIMPLE FACTUAL QUERY
         # Short queries with factual indicators (what is, who is, etc.)
-        if (word_count <= 6 and self.simple_regex.search(query_lower)) or \
-           (word_count <= 3):
-            logger.info(f"🧭 Route: SIMPLE (query: '{query[:30]}...')")
-            return 'simple', {
-                'skip_rag': False,
-                'skip_hyde': True,  # Skip HyDE for simple lookups
-                'use_cache': True,
-                'reasoning': 'Short factual query - exact matching preferred'
-            }
+        if short:
+            word_count = len(query.split())
+            if (word_count <= 6 and 'simple' in intents) or word_count <= 3:
+                return 'simple', {
+                    'skip_rag': False,
+                    'skip_hyde': True,  # Skip HyDE for simple lookups
+                    'use_cache': True,
+                    'retrievers': self.select_retrievers(query),
+                    'reasoning': 'Short factual query - exact matching preferred'
+                }
         
         # 5. DEFAULT: COMPLEX QUERY
-        logger.info(f"🧭 Route: COMPLEX (query: '{query[:30]}...')")
         return 'complex', {
             'skip_rag': False,
             'skip_hyde': False,  # Use HyDE for semantic enhancement
             'use_cache': True,
+            'retrievers': self.select_retrievers(query),
             'reasoning': 'Standard complex query'
         }
     
+    def _has_trigger_keyword(self, query_lower: str) -> bool:
+        """
+        Whether the query contains any AUTO_TRIGGER_KEYWORDS (substring match).
+        All keywords are found in one pass: an Aho-Corasick automaton when
+        pyahocorasick is installed, otherwise one escaped regex alternation.
+        """
+        keywords = tuple(agent_config.AUTO_TRIGGER_KEYWORDS)
+        if keywords != self._trigger_keywords or self._trigger_matcher is None:
+            self._trigger_keywords = keywords
+            self._trigger_matcher = self._build_trigger_matcher(keywords)
+        return self._trigger_matcher(query_lower)
+    
+    @staticmethod
+    def _build_trigger_matcher(keywords: Tuple[str, ...]):
+        keywords = [kw.lower() for kw in keywords if kw]
+        if not keywords:
+            return lambda query_lower: False
+        
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for kw in keywords:
+                automaton.add_word(kw, kw)
+            automaton.make_automaton()
+            return lambda query_lower: next(automaton.iter(query_lower), None) is not None
+        
+        pattern = re.compile('|'.join(re.escape(kw) for kw in keywords))
+        return lambda query_lower: pattern.search(query_lower) is not None
+    
+    def _match_intents(self, query_lower: str) -> FrozenSet[str]:
+        """Intent classes (greeting / chitchat / simple) found in the query"""
+        return frozenset(m.lastgroup for m in _INTENT_RE.finditer(query_lower))
+    
+    def clear_cache(self):
+        """Drop cached routes (e.g. after changing patterns or agent_config)"""
+        with self._route_cache_lock:
+            self._route_cache.clear()
+    
+    def select_retrievers(self, query: str) -> FrozenSet[str]:
+        """
+        Pick the retrieval methods for a query:
+        - Exact identifiers (e.g. ERR503, SKU-1234) → BM25 only
+        - Explanatory questions (explain / why / how) → Vector + Graph
+        - Anything else (or both signals) → full hybrid
+        """
+        has_identifier = _IDENTIFIER_RE.search(query) is not None
+        is_conceptual = _CONCEPTUAL_RE.search(query) is not None
+        
+        if has_identifier and not is_conceptual:
+            return KEYWORD_RETRIEVERS
+        if is_conceptual and not has_identifier:
+            return CONCEPTUAL_RETRIEVERS
+        return ALL_RETRIEVERS
+    
     def should_use_rag(self, route: str) -> bool:
         """Determine if RAG retrieval should be used."""
         return route not in ['greeting', 'chitchat']
@@ -205,11 +328,14 @@ What would you like to know?"""
 
 # Global instance
 _query_router = None
+_query_router_lock = Lock()
 
 
 def get_query_router() -> QueryRouter:
     """Get or create query router singleton."""
     global _query_router
     if _query_router is None:
-        _query_router = QueryRouter()
+        with _query_router_lock:
+            if _query_router is None:
+                _query_router = QueryRouter()
     return _query_router
@@ -4,8 +4,12 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-import json
-from openai import AzureOpenAI
+import hashlib
+import msgspec
+from threading import Lock
+from cachetools import TTLCache
+from typing import Any, List, Optional, Union
+from openai import AzureOpenAI, AsyncAzureOpenAI
 from config.settings import settings
 from config import query_config
 from utils.logger import setup_logger
@@ -62,6 +66,34 @@ Return JSON ONLY:
   "recommendation": "trust_high" | "trust_medium" | "trust_low"
 }}"""
 
+# ─────────────────────────────────────────────────────────────
+# RESPONSE SCHEMAS
+# Decoded in one pass (msgspec); missing fields take the defaults, unknown
+# ones are ignored. Only fields the pipeline acts on are typed strictly;
+# informational ones (keywords, issues, ...) accept any JSON, so a null or
+# odd value there can't discard an otherwise usable reply
+# ─────────────────────────────────────────────────────────────
+
+class QueryAnalysis(msgspec.Struct):
+    query_type: Optional[str] = 'balanced'  # Unknown / null → 'balanced' profile
+    keywords: Any = []
+
+
+class HydeCritique(msgspec.Struct):
+    confidence: Union[float, str, None] = 50
+    technical_accuracy: Any = ''
+    issues: Any = []
+    alternative_causes: List[str] = []
+    recommendation: str = 'trust_medium'
+    
+    def __post_init__(self):
+        # Accept "85" / "85%" / null; anything unreadable counts as medium (50)
+        if not isinstance(self.confidence, float):
+            try:
+                self.confidence = float(str(self.confidence).strip().rstrip('%'))
+            except ValueError:
+                self.confidence = 50.0
+
 # ─────────────────────────────────────────────────────────────
 # SERVICE CLASS
 # ─────────────────────────────────────────────────────────────
@@ -79,46 +111,132 @@ class QueryTransformService:
             api_version=settings.AZURE_OPENAI_API_VERSION,
             azure_endpoint=settings.AZURE_OPENAI_API_BASE
         )
+        
+        # Async client for the chat request path (aanalyze_query / agenerate_hyde_doc)
+        self.async_client = AsyncAzureOpenAI(
+            api_key=settings.AZURE_OPENAI_API_KEY,
+            api_version=settings.AZURE_OPENAI_API_VERSION,
+            azure_endpoint=settings.AZURE_OPENAI_API_BASE
+        )
+        
+        # Repeated queries skip the LLM roundtrip (keyed on the normalized query)
+        self._analysis_cache = TTLCache(
+            maxsize=query_config.QUERY_TRANSFORM_CACHE_SIZE, ttl=query_config.QUERY_TRANSFORM_CACHE_TTL
+        )
+        self._hyde_cache = TTLCache(
+            maxsize=query_config.QUERY_TRANSFORM_CACHE_SIZE, ttl=query_config.QUERY_TRANSFORM_CACHE_TTL
+        )
+        self._cache_lock = Lock()
         logger.info("🧠 QueryTransformService initialized")
 
+    @staticmethod
+    def _cache_key(query: str) -> str:
+        """sha1 of the whitespace-normalized, lowercased query"""
+        return hashlib.sha1(" ".join(query.lower().split()).encode()).hexdigest()
+
+    def _cache_get(self, cache: TTLCache, key: str):
+        with self._cache_lock:
+            return cache.get(key)
+
+    def _cache_set(self, cache: TTLCache, key: str, value):
+        with self._cache_lock:
+            cache[key] = value
+
+    def clear_cache(self):
+        """Drop cached analyses and HyDE documents (e.g. after a config reload)"""
+        with self._cache_lock:
+            self._analysis_cache.clear()
+            self._hyde_cache.clear()
+
     def analyze_query(self, query: str) -> dict:
         """
         Analyze query to detect intent and return optimal weights.
         """
         if not query_config.ENABLE_QUERY_ANALYSIS:
-            return {'weights': query_config.WEIGHT_PROFILES['balanced'], 'type': 'balanced'}
+            return self._profile('balanced')
+        
+        key = self._cache_key(query)
+        cached = self._cached_analysis(key)
+        if cached is not None:
+            return cached
             
         logger.info(f"🧠 Analyzing query intent: '{query[:50]}...'")
         
         try:
-            response = self.client.chat.completions.create(
-                model=query_config.ANALYSIS_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a query intent analyzer. Output JSON only."},
-                    {"role": "user", "content": ANALYSIS_PROMPT_TEMPLATE.format(query=query)}
-                ],
-                temperature=query_config.ANALYSIS_TEMPERATURE,
-                response_format={"type": "json_object"}
-            )
-            
-            result_text = response.choices[0].message.content
-            result = json.loads(result_text)
-            
-            query_type = result.get('query_type', 'balanced')
-            weights = query_config.WEIGHT_PROFILES.get(query_type, query_config.WEIGHT_PROFILES['balanced'])
+            response = self.client.chat.completions.create(**self._analysis_request(query))
+            return self._analysis_profile(key, response.choices[0].message.content)
             
-            logger.info(f"   └─ Type: {query_type}")
-            logger.info(f"   └─ Recommended Weights: Vector={weights['vector']}, BM25={weights['bm25']}, Graph={weights['graph']}")
+        except Exception as e:
+            logger.error(f"❌ Query analysis failed: {e}. Using default weights.")
+            return self._profile('balanced')
+
+    async def aanalyze_query(self, query: str) -> dict:
+        """analyze_query on the async client (awaitable from the request path)"""
+        if not query_config.ENABLE_QUERY_ANALYSIS:
+            return self._profile('balanced')
+        
+        key = self._cache_key(query)
+        cached = self._cached_analysis(key)
+        if cached is not None:
+            return cached
             
-            return {
-                'type': query_type,
-                'weights': weights,
-                'analysis': result
-            }
+        logger.info(f"🧠 Analyzing query intent: '{query[:50]}...'")
+        
+        try:
+            response = await self.async_client.chat.completions.create(**self._analysis_request(query))
+            return self._analysis_profile(key, response.choices[0].message.content)
             
         except Exception as e:
             logger.error(f"❌ Query analysis failed: {e}. Using default weights.")
-            return {'weights': query_config.WEIGHT_PROFILES['balanced'], 'type': 'balanced'}
+            return self._profile('balanced')
+
+    @staticmethod
+    def _analysis_request(query: str) -> dict:
+        return {
+            "model": query_config.ANALYSIS_MODEL,
+            "messages": [
+                {"role": "system", "content": "You are a query intent analyzer. Output JSON only."},
+                {"role": "user", "content": ANALYSIS_PROMPT_TEMPLATE.format(query=query)}
+            ],
+            "temperature": query_config.ANALYSIS_TEMPERATURE,
+            "response_format": {"type": "json_object"}
+        }
+
+    def _cached_analysis(self, key: str) -> Optional[dict]:
+        cached = self._cache_get(self._analysis_cache, key)
+        if cached is None:
+            return None
+        logger.info(f"⚡ Query analysis cache hit: {cached['type']}")
+        return dict(cached)
+
+    def _analysis_profile(self, key: str, result_text: str) -> dict:
+        """Weight profile for an analysis response (cached on success)"""
+        result = msgspec.json.decode(result_text, type=QueryAnalysis, strict=False)
+        
+        query_type = result.query_type
+        if query_type not in query_config.WEIGHT_PROFILE_INDEX:
+            query_type = 'balanced'
+        profile = self._profile(query_type)
+        weights = profile['weights']
+        
+        logger.info(f"   └─ Type: {query_type}")
+        logger.info(f"   └─ Recommended Weights: Vector={weights['vector']}, BM25={weights['bm25']}, Graph={weights['graph']}")
+        
+        profile['analysis'] = msgspec.structs.asdict(result)
+        self._cache_set(self._analysis_cache, key, profile)
+        return dict(profile)
+
+    @staticmethod
+    def _profile(query_type: str) -> dict:
+        """
+        Weight profile for a query type. 'weight_vector' is the precomputed
+        [vector, bm25, graph] row of WEIGHT_PROFILE_MATRIX.
+        """
+        return {
+            'type': query_type,
+            'weights': query_config.WEIGHT_PROFILES[query_type],
+            'weight_vector': query_config.WEIGHT_PROFILE_MATRIX[query_config.WEIGHT_PROFILE_INDEX[query_type]]
+        }
 
     def generate_hyde_doc(self, query: str) -> str:
         """
@@ -127,31 +245,78 @@ class QueryTransformService:
         """
         if not query_config.ENABLE_HYDE:
             return query
+        
+        key = self._cache_key(query)
+        cached = self._cache_get(self._hyde_cache, key)
+        if cached is not None:
+            logger.info("⚡ HyDE cache hit")
+            return cached
             
         logger.info("🧠 Generating HyDE document...")
         
         try:
-            response = self.client.chat.completions.create(
-                model=query_config.HYDE_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a helpful AI assistant that generates hypothetical content."},
-                    {"role": "user", "content": HYDE_PROMPT_TEMPLATE.format(query=query)}
-                ],
-                temperature=query_config.HYDE_TEMPERATURE,
-                max_tokens=query_config.HYDE_MAX_TOKENS
-            )
-            
-            hypothetical_doc = response.choices[0].message.content.strip()
+            response = self.client.chat.completions.create(**self._hyde_request(query))
+            return self._hyde_result(key, response.choices[0].message.content)
             
-            # Log preview
-            preview = hypothetical_doc[:100].replace('\n', ' ') + "..."
-            logger.info(f"   └─ Generated: {preview}")
+        except Exception as e:
+            return query
+
+    async def agenerate_hyde_doc(self, query: str) -> str:
+        """
+        generate_hyde_doc on the async client, streamed: the passage is
+        accumulated as it is generated while the event loop keeps serving
+        the retrievers started alongside it.
+        """
+        if not query_config.ENABLE_HYDE:
+            return query
+        
+        key = self._cache_key(query)
+        cached = self._cache_get(self._hyde_cache, key)
+        if cached is not None:
+            logger.info("⚡ HyDE cache hit")
+            return cached
             
-            return hypothetical_doc
+        logger.info("🧠 Generating HyDE document (streaming)...")
+        
+        try:
+            stream = await self.async_client.chat.completions.create(
+                **self._hyde_request(query), stream=True
+            )
+            pieces = []
+            async for chunk in stream:
+                if chunk.choices:
+                    delta = chunk.choices[0].delta
+                    if delta and delta.content:
+                        pieces.append(delta.content)
+            return self._hyde_result(key, "".join(pieces))
             
         except Exception as e:
+            logger.error(f"❌ HyDE generation failed: {e}. Using the original query.")
             return query
 
+    @staticmethod
+    def _hyde_request(query: str) -> dict:
+        return {
+            "model": query_config.HYDE_MODEL,
+            "messages": [
+                {"role": "system", "content": "You are a helpful AI assistant that generates hypothetical content."},
+                {"role": "user", "content": HYDE_PROMPT_TEMPLATE.format(query=query)}
+            ],
+            "temperature": query_config.HYDE_TEMPERATURE,
+            "max_tokens": query_config.HYDE_MAX_TOKENS
+        }
+
+    def _hyde_result(self, key: str, text: str) -> str:
+        """Strip, log and cache a generated passage"""
+        hypothetical_doc = text.strip()
+        
+        # Log preview
+        preview = hypothetical_doc[:100].replace('\n', ' ') + "..."
+        logger.info(f"   └─ Generated: {preview}")
+        
+        self._cache_set(self._hyde_cache, key, hypothetical_doc)
+        return hypothetical_doc
+
     def critique_hyde(self, query: str, hyde_doc: str) -> dict:
         """
         Critique the generated HyDE document to assess confidence.
@@ -170,15 +335,13 @@ class QueryTransformService:
                 response_format={"type": "json_object"}
             )
             
-            result_text = response.choices[0].message.content
-            result = json.loads(result_text)
-            
-            confidence = result.get('confidence', 50)
-            recommendation = result.get('recommendation', 'trust_medium')
+            result = msgspec.json.decode(
+                response.choices[0].message.content, type=HydeCritique, strict=False
+            )
             
-            logger.info(f"   └─ Confidence: {confidence}/100 ({recommendation})")
+            logger.info(f"   └─ Confidence: {result.confidence:.0f}/100 ({result.recommendation})")
             
-            return result
+            return msgspec.structs.asdict(result)
             
         except Exception as e:
             logger.error(f"❌ HyDE critique failed: {e}. Assuming medium trust.")
@@ -221,9 +384,12 @@ class QueryTransformService:
 
 # Global instance
 _query_transform_service = None
+_query_transform_service_lock = Lock()
 
 def get_query_transform_service() -> QueryTransformService:
     global _query_transform_service
     if _query_transform_service is None:
-        _query_transform_service = QueryTransformService()
+        with _query_transform_service_lock:
+            if _query_transform_service is None:
+                _query_transform_service = QueryTransformService()
     return _query_transform_service
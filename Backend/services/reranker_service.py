@@ -4,12 +4,33 @@
 ═══════════════════════════════════════════════════════════════
 """
 
+import hashlib
+import numpy as np
+import torch
+from threading import Lock
 from typing import List, Dict, Tuple, Optional
+from cachetools import LRUCache
 from sentence_transformers import CrossEncoder
+from config.settings import settings
+from utils.jit import njit
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
+# A token spans at most this many characters (generous): content past
+# max_length tokens * this is truncated away by the tokenizer anyway
+MAX_CHARS_PER_TOKEN = 10
+
+
+@njit(cache=True)
+def _select_top(scores, threshold, use_threshold, top_k):
+    """Indices of the top_k scores (descending, stable), optionally >= threshold"""
+    order = np.argsort(-scores, kind='mergesort')
+    if use_threshold:
+        order = order[scores[order] >= threshold]
+    return order[:top_k]
+
+
 class RerankerService:
     """
     ┌─────────────────────────────────────────────┐
@@ -27,19 +48,33 @@ class RerankerService:
     └─────────────────────────────────────────────┘
     """
     
+    # Dynamic-quantized int8 ONNX export shipped with the model (AVX512-VNNI kernels)
+    INT8_ONNX_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+    GPU_BATCH_SIZE = 64  # fp16 on CUDA: larger batches are still cheap
+    
     def __init__(
         self,
         model_name: str = "cross-encoder/ms-marco-MiniLM-L-12-v2",
-        device: str = "cpu"
+        device: Optional[str] = None
     ):
         """
         Args:
             model_name: HuggingFace model for cross-encoding
-            device: 'cpu' or 'cuda'
+            device: 'cpu' or 'cuda' (default: RERANKER_DEVICE, 'auto' picks CUDA when available)
         """
+        device = (device or settings.RERANKER_DEVICE).lower()
+        if device == "auto":
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device
+        self.batch_size = max(settings.RERANK_BATCH_SIZE, self.GPU_BATCH_SIZE) if device == "cuda" else settings.RERANK_BATCH_SIZE
+        
+        # (query digest, chunk id, content hash) → cross-encoder score
+        self._score_cache = LRUCache(maxsize=max(settings.RERANK_SCORE_CACHE_SIZE, 1))
+        self._score_cache_lock = Lock()
+        
         logger.info(f"🔄 Loading cross-encoder: {model_name}...")
         try:
-            self.model = CrossEncoder(model_name, device=device)
+            self.model = self._load_model(model_name, device)
             logger.info(f"✅ Cross-encoder loaded successfully")
             self.model_loaded = True
         except Exception as e:
@@ -48,12 +83,34 @@ class RerankerService:
             self.model = None
             self.model_loaded = False
     
+    def _load_model(self, model_name: str, device: str) -> CrossEncoder:
+        """Load the int8 ONNX cross-encoder on CPU when configured, else the float32 model"""
+        if settings.RERANKER_DTYPE == "int8" and device == "cpu":
+            try:
+                model = CrossEncoder(
+                    model_name,
+                    device=device,
+                    backend="onnx",
+                    model_kwargs={"file_name": self.INT8_ONNX_FILE}
+                )
+                logger.info(f"   └─ Backend: ONNX int8 ({self.INT8_ONNX_FILE})")
+                return model
+            except Exception as e:
+                logger.warning(f"⚠️ int8 ONNX cross-encoder unavailable ({e}), using float32 model")
+        
+        model = CrossEncoder(model_name, device=device)
+        if device == "cuda":
+            model.model.half()
+            logger.info("   └─ Backend: PyTorch fp16 (CUDA)")
+        return model
+    
     def rerank(
         self,
         query: str,
         candidates: List[Tuple[Dict, float]],
         top_k: int = 10,
-        threshold: Optional[float] = None
+        threshold: Optional[float] = None,
+        rerank_candidate_cap: Optional[int] = None
     ) -> List[Tuple[Dict, float]]:
         """
         Rerank candidates using cross-encoder
@@ -63,6 +120,9 @@ class RerankerService:
             candidates: List of (chunk, score) from initial search
             top_k: Number of results to return
             threshold: Optional minimum score threshold (drop results below this)
+            rerank_candidate_cap: Max candidates scored, best retrieval scores
+                first (default: max(3 * top_k, 20)); low-ranked candidates
+                almost never make the reranked top_k
         
         Returns:
             Reranked results sorted by cross-encoder score
@@ -79,19 +139,30 @@ class RerankerService:
             logger.warning("⚠️ Returning results without reranking (model not loaded)")
             return candidates[:top_k]
         
-        # Prepare query-document pairs
-        pairs = [(query, chunk.get('content', '')) for chunk, _ in candidates]
+        # Prune to the best retrieval scores before the expensive cross-encoder pass
+        if rerank_candidate_cap is None:
+            rerank_candidate_cap = max(3 * top_k, 20)
+        if len(candidates) > rerank_candidate_cap:
+            candidates = sorted(candidates, key=lambda c: c[1], reverse=True)[:rerank_candidate_cap]
         
         # Get cross-encoder scores
         try:
-            scores = self.model.predict(pairs)
+            scores = self._cached_scores(query, [chunk for chunk, _ in candidates])
         except Exception as e:
             logger.error(f"❌ Reranking error: {e}")
             return candidates[:top_k]
         
-        # Combine with original chunks
-        reranked = []
-        for i, (chunk, original_score) in enumerate(candidates):
+        # Threshold + sort + top-k in one kernel, then build only the survivors
+        selected = _select_top(
+            scores,
+            float(threshold) if threshold is not None else 0.0,
+            threshold is not None,
+            top_k
+        )
+        
+        top_results = []
+        for i in selected.tolist():
+            chunk, original_score = candidates[i]
             chunk_copy = chunk.copy()
             reranker_score = float(scores[i])
             
@@ -99,17 +170,7 @@ class RerankerService:
             chunk_copy['reranker_score'] = reranker_score
             chunk_copy['original_score'] = original_score
             
-            reranked.append((chunk_copy, reranker_score))
-        
-        # Apply threshold if specified
-        if threshold is not None:
-            reranked = [(chunk, score) for chunk, score in reranked if score >= threshold]
-        
-        # Sort by reranker score
-        reranked.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return top-k
-        top_results = reranked[:top_k]
+            top_results.append((chunk_copy, reranker_score))
         
         logger.info(
             f"🎯 Reranked {len(candidates)} candidates → "
@@ -120,13 +181,83 @@ class RerankerService:
         return top_results
 
 
+    def _cached_scores(self, query: str, chunks: List[Dict]) -> np.ndarray:
+        """
+        Scores for the chunks, reusing cached (query, chunk) scores: only
+        misses go through the cross-encoder. Chunks without a stable id
+        ('id' / 'chunk_id') are always scored. The content hash is part of the
+        key since e.g. graph results describe a different path per search.
+        """
+        if settings.RERANK_SCORE_CACHE_SIZE <= 0:
+            return self._score(query, [chunk.get('content', '') for chunk in chunks])
+        
+        query_digest = hashlib.blake2b(query.encode(), digest_size=8).digest()
+        scores = np.empty(len(chunks), dtype=np.float64)
+        keys, misses = [], []
+        with self._score_cache_lock:
+            for i, chunk in enumerate(chunks):
+                chunk_id = chunk.get('id') or chunk.get('chunk_id')
+                key = None
+                if chunk_id is not None:
+                    key = (query_digest, chunk_id, hash(chunk.get('content', '')))
+                    cached = self._score_cache.get(key)
+                    if cached is not None:
+                        scores[i] = cached
+                        keys.append(key)
+                        continue
+                keys.append(key)
+                misses.append(i)
+        
+        if misses:
+            miss_scores = self._score(query, [chunks[i].get('content', '') for i in misses])
+            scores[misses] = miss_scores
+            with self._score_cache_lock:
+                for i, score in zip(misses, miss_scores.tolist()):
+                    if keys[i] is not None:
+                        self._score_cache[keys[i]] = score
+        
+        if len(misses) < len(chunks):
+            logger.info(f"⚡ Reranker score cache: {len(chunks) - len(misses)}/{len(chunks)} hits")
+        return scores
+    
+    def _score(self, query: str, contents: List[str]) -> np.ndarray:
+        """
+        Cross-encoder scores for (query, content) pairs, in input order.
+        
+        Batches are padded to their longest pair, so pairs are scored sorted
+        by length (similar lengths share a batch) and scattered back.
+        Content is pre-truncated to a character bound of the model's max_length.
+        """
+        max_length = getattr(self.model, 'max_length', None)
+        if max_length:
+            max_chars = max_length * MAX_CHARS_PER_TOKEN
+            contents = [content[:max_chars] for content in contents]
+        
+        order = sorted(range(len(contents)), key=lambda i: len(contents[i]))
+        with torch.inference_mode():
+            sorted_scores = self.model.predict(
+                [(query, contents[i]) for i in order],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+        
+        scores = np.empty(len(contents), dtype=np.float64)
+        scores[order] = np.asarray(sorted_scores, dtype=np.float64).reshape(len(contents))
+        return scores
+
+
 # Global instance
 _reranker_service = None
+_reranker_service_lock = Lock()
 
 
 def get_reranker_service() -> RerankerService:
     """Get or create reranker service singleton"""
     global _reranker_service
     if _reranker_service is None:
-        _reranker_service = RerankerService()
+        # Double-checked: concurrent warm-up calls load the model only once
+        with _reranker_service_lock:
+            if _reranker_service is None:
+                _reranker_service = RerankerService()
     return _reranker_service
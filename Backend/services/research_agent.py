@@ -4,7 +4,12 @@
 ═══════════════════════════════════════════════════════════════
 """
 
-import json
+import asyncio
+import io
+import re
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from typing import List, Dict
 from config import agent_config, settings
 from services.vector_store import get_vector_store
@@ -12,54 +17,138 @@ from services.bm25_service import get_bm25_service
 from services.graph_traversal import get_graph_traversal
 from services.hybrid_retriever import get_hybrid_retriever
 from services.embeddings import get_embedding_service
+from services.cache_service import get_agent_search_cache
+from config import cache_config
 from utils.logger import setup_logger
-from openai import AzureOpenAI
+import httpx
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import h2  # HTTP/2 support for httpx
+except ImportError:
+    h2 = None
 
 logger = setup_logger()
 
+# Worker threads for the (sync) retrievers, shared by all research runs
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="agent-search")
+
+# Planner HTTP connections, shared by every agent: kept alive between steps and,
+# with HTTP/2 (h2 installed), concurrent planner calls multiplex over one connection
+_planner_http = DefaultAsyncHttpxClient(
+    http2=h2 is not None,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+    timeout=httpx.Timeout(30.0, connect=5.0)
+)
+
+# Query content terms for the local sufficiency check: question words and the
+# research trigger words themselves never show up in the documents
+_TERM_RE = re.compile(r"[\w\-]{3,}")
+_NON_CONTENT_TERMS = frozenset({
+    'what', 'when', 'where', 'which', 'how', 'why', 'who', 'the', 'are', 'was',
+    'were', 'does', 'did', 'and', 'for', 'from', 'with', 'about', 'between',
+    'this', 'that', 'these', 'those', 'tell', 'explain', 'describe', 'give',
+    'versus',
+}) | frozenset(word for kw in agent_config.AUTO_TRIGGER_KEYWORDS for word in kw.split())
+
+def _content_terms(text: str) -> set:
+    return set(_TERM_RE.findall(text.lower()))
+
+def _content_key(content: str) -> int:
+    """64-bit dedup key for a chunk without an id (xxh3 when available)"""
+    if xxhash is not None:
+        return xxhash.xxh3_64_intdigest(content.encode('utf-8', 'ignore'))
+    return hash(content)
+
+@dataclass(slots=True)
+class ChunkTable:
+    """
+    Per-run research state, one column per consumer, each updated once when
+    a new chunk is accepted:
+    - chunks: accepted chunks in arrival order (the research() result)
+    - keys: dedup keys (chunk id, or content hash when there is none)
+    - prefixes: planner context, first 200 chars of each chunk per line
+    - missing_terms: query content terms no accepted chunk contains yet
+    Owned by one research() call: the agent instance is shared between sessions.
+    """
+    query_term_count: int
+    missing_terms: set
+    chunks: List[Dict] = field(default_factory=list)
+    keys: set = field(default_factory=set)
+    prefixes: io.StringIO = field(default_factory=io.StringIO)
+    
+    @classmethod
+    def for_query(cls, query: str) -> "ChunkTable":
+        terms = _content_terms(query) - _NON_CONTENT_TERMS
+        return cls(query_term_count=len(terms), missing_terms=terms)
+    
+    def add(self, chunk: Dict) -> bool:
+        """Accept chunk unless already seen; returns whether it was new"""
+        content = chunk.get('content', '')
+        key = chunk.get('id')
+        if key is None:
+            key = _content_key(content)
+        if key in self.keys:
+            return False
+        
+        self.keys.add(key)
+        self.chunks.append(chunk)
+        self.prefixes.write(content[:200])
+        self.prefixes.write("\n")
+        if self.missing_terms:
+            self.missing_terms -= _content_terms(content)
+        return True
+    
+    def planner_context(self) -> str:
+        return self.prefixes.getvalue()
+
 class ResearchAgent:
     """
     Performs multi-step research to gather comprehensive context.
     """
     
     def __init__(self):
-        self.client = AzureOpenAI(
+        self.client = AsyncAzureOpenAI(
             api_key=settings.AZURE_OPENAI_API_KEY,
             api_version=settings.AZURE_OPENAI_API_VERSION,
-            azure_endpoint=settings.AZURE_OPENAI_API_BASE
+            azure_endpoint=settings.AZURE_OPENAI_API_BASE,
+            http_client=_planner_http
         )
         self.vector_store = get_vector_store()
         self.bm25 = get_bm25_service()
         self.graph = get_graph_traversal()
         self.hybrid = get_hybrid_retriever()
         self.embedding_service = get_embedding_service()
+        # Near-duplicate step queries (within and across runs) reuse results
+        self.search_cache = get_agent_search_cache()
+        # Planner calls from concurrent sessions share a bounded number of
+        # request slots; identical in-flight prompts share one call
+        self._planner_slots = asyncio.Semaphore(agent_config.PLANNER_MAX_CONCURRENCY)
+        self._planner_inflight: Dict[str, asyncio.Future] = {}
         
-    def research(self, query: str) -> List[Dict]:
+    async def research(self, query: str) -> List[Dict]:
         """
         Main Loop: Search -> Evaluate -> Loop
         Returns: List of accumulated unique chunks
         """
         logger.info(f"🤖 Agent starting research on: '{query}'")
         
-        accumulated_chunks = []
-        seen_ids = set()
+        table = ChunkTable.for_query(query)
         current_query = query
         
         for step in range(agent_config.MAX_LOOPS):
             logger.info(f"🤖 Step {step+1}/{agent_config.MAX_LOOPS}: Searching for '{current_query}'")
             
             # 1. Execute Search (Re-using Hybrid Logic inline for now)
-            step_chunks = self._execute_hybrid_search(current_query)
+            step_chunks = await self._execute_hybrid_search(current_query)
             
             # 2. Add New Chunks
-            new_count = 0
-            for chunk in step_chunks:
-                # Use chunk_id or content hash
-                c_id = chunk.get('id', hash(chunk.get('content', '')))
-                if c_id not in seen_ids:
-                    seen_ids.add(c_id)
-                    accumulated_chunks.append(chunk)
-                    new_count += 1
+            new_count = sum(table.add(chunk) for chunk in step_chunks)
             
             logger.info(f"   └─ Found {len(step_chunks)} results, {new_count} new.")
             
@@ -67,7 +156,12 @@ class ResearchAgent:
             if step == agent_config.MAX_LOOPS - 1:
                 break # Max steps reached
                 
-            next_move = self._evaluate_and_plan(query, accumulated_chunks)
+            verdict = self._local_sufficiency(step, new_count, len(table.chunks), table.query_term_count, len(table.missing_terms))
+            if verdict:
+                logger.info(f"🤖 Agent decided context is sufficient ({verdict}, no planner call).")
+                break
+            
+            next_move = await self._evaluate_and_plan(query, table.planner_context())
             if next_move.get("status") == "COMPLETE":
                 logger.info("🤖 Agent decided context is sufficient.")
                 break
@@ -75,37 +169,86 @@ class ResearchAgent:
                 current_query = next_move.get("next_query", current_query)
                 logger.info(f"🤖 Agent planned next step: {next_move.get('reasoning')}")
         
-        return accumulated_chunks
+        return table.chunks
 
-    def _execute_hybrid_search(self, query: str) -> List[Dict]:
-        """Performs 3-way hybrid search"""
+    async def _execute_hybrid_search(self, query: str) -> List[Dict]:
+        """
+        Performs 3-way hybrid search. The retrievers are independent and
+        blocking, so they run concurrently on the search pool: a step costs
+        the slowest retriever instead of the sum.
+        """
+        loop = asyncio.get_running_loop()
+        
         try:
-            # Vector
-            emb = self.embedding_service.embed_query(query)
-            vector_results = self.vector_store.search(emb, top_k=5)
+            # The query embedding keys the cache and feeds the vector search
+            emb = await loop.run_in_executor(_search_pool, self.embedding_service.embed_query, query)
+            cached = self.search_cache.check(emb)
+            if cached is not None:
+                logger.info("   └─ ⚡ Search cache hit (similar step query)")
+                return list(cached)
             
-            # BM25
-            bm25_results = self.bm25.search(query, top_k=5)
+            results = await asyncio.gather(
+                loop.run_in_executor(_search_pool, self._vector_search, emb),
+                loop.run_in_executor(_search_pool, lambda: self.bm25.search(query, top_k=5)),
+                loop.run_in_executor(_search_pool, self.graph.search_by_query, query),
+                return_exceptions=True
+            )
             
-            # Graph
-            graph_results = self.graph.search_by_query(query)
+            # A failed retriever contributes nothing instead of failing the step
+            for name, result in zip(("Vector", "BM25", "Graph"), results):
+                if isinstance(result, Exception):
+                    logger.error(f"❌ Agent {name} search failed: {result}")
+            vector_results, bm25_results, graph_results = (
+                [] if isinstance(result, Exception) else result for result in results
+            )
             
             # Fuse
             fused = self.hybrid.fuse(
                 [vector_results, bm25_results, graph_results],
                 weights=[1.0, 1.0, 1.0], # Equal weights for agent exploration
-                method_names=["Vector", "BM25", "Graph"]
+                method_names=["Vector", "BM25", "Graph"],
+                top_k=7
             )
             
-            return [chunk for chunk, score in fused[:7]] # Top 7 per step
+            step_chunks = [chunk for chunk, score in fused[:7]] # Top 7 per step
+            self.search_cache.store(emb, step_chunks, ttl=cache_config.AGENT_SEARCH_CACHE_TTL)
+            return step_chunks
         except Exception as e:
             logger.error(f"❌ Agent search failed: {e}")
             return []
 
-    def _evaluate_and_plan(self, original_query: str, chunks: List[Dict]) -> Dict:
-        """Decide if we need more info"""
-        context_text = "\n".join([c.get('content', '')[:200] for c in chunks])
-        
+    def _vector_search(self, emb) -> List[tuple]:
+        """Vector hits as (chunk, score) pairs, keyed like BM25 chunks so RRF merges shared hits"""
+        return [
+            ({
+                "id": f"{result['file_id']}_chunk_{result['chunk_index']}",
+                "content": result["content"],
+                "file_id": result["file_id"],
+                "chunk_index": result["chunk_index"]
+            }, result["score"])
+            for result in self.vector_store.search(emb, top_k=5)
+        ]
+
+    @staticmethod
+    def _local_sufficiency(step: int, new_count: int, total_chunks: int, query_terms: int, missing_terms: int) -> str:
+        """
+        Reason to stop without asking the planner, or "" when only the LLM
+        can tell. Clear-cut cases only:
+        - a planned follow-up search (step > 0) added nothing new
+        - enough chunks gathered and they cover most query content terms
+        """
+        if not agent_config.ENABLE_LOCAL_SUFFICIENCY_CHECK:
+            return ""
+        if step > 0 and new_count == 0:
+            return "last search found nothing new"
+        if query_terms and total_chunks >= agent_config.SUFFICIENCY_MIN_CHUNKS:
+            coverage = 1.0 - missing_terms / query_terms
+            if coverage >= agent_config.SUFFICIENCY_TERM_COVERAGE:
+                return f"{coverage:.0%} of query terms covered"
+        return ""
+
+    async def _evaluate_and_plan(self, original_query: str, context_text: str) -> Dict:
+        """Decide if we need more info (context_text: first 200 chars of each chunk, one per line)"""
         prompt = f"""
         You are a Research Planner.
         User Query: "{original_query}"
@@ -124,16 +267,29 @@ class ResearchAgent:
         }}
         """
         
+        pending = self._planner_inflight.get(prompt)
+        if pending is not None:
+            return dict(await asyncio.shield(pending))
+        
+        pending = asyncio.get_running_loop().create_future()
+        self._planner_inflight[prompt] = pending
+        plan = {"status": "COMPLETE"} # Fallback
         try:
-            response = self.client.chat.completions.create(
-                model=agent_config.AGENT_MODEL,
-                messages=[{"role": "system", "content": "Return valid JSON."}, {"role": "user", "content": prompt}],
-                temperature=0.1,
-                response_format={"type": "json_object"}
-            )
-            return json.loads(response.choices[0].message.content)
-        except:
-            return {"status": "COMPLETE"} # Fallback
+            async with self._planner_slots:
+                response = await self.client.chat.completions.create(
+                    model=agent_config.AGENT_MODEL,
+                    messages=[{"role": "system", "content": "Return valid JSON."}, {"role": "user", "content": prompt}],
+                    temperature=0.1,
+                    response_format={"type": "json_object"}
+                )
+            plan = orjson.loads(response.choices[0].message.content)
+        except Exception:
+            pass
+        finally:
+            # Also on cancellation (which propagates): coalesced waiters get the fallback
+            del self._planner_inflight[prompt]
+            pending.set_result(plan)
+        return dict(plan)
 
 _research_agent = None
 
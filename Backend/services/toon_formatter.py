@@ -4,11 +4,34 @@
 ═══════════════════════════════════════════════════════════════
 """
 
+import functools
+import itertools
+import re
+import orjson
 from typing import List, Dict
 from utils.logger import setup_logger
 
 logger = setup_logger()
 
+# Rule-based pre-compression patterns
+_BLANK_RUN_RE = re.compile(r"\n{3,}")
+_TRAILING_WS_RE = re.compile(r"[ \t]+$", re.MULTILINE)
+# Low-value log lines (optionally timestamped): INFO / DEBUG / TRACE
+_BOILERPLATE_LINE_RE = re.compile(
+    r"^\s*(\[?\d{4}-\d{2}-\d{2}[ T][\d:.,]+\]?\s*)?\[?(INFO|DEBUG|TRACE)\b\]?"
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _format_history_row(role: str, content: str) -> str:
+    """
+    One TOON history row. Memoized: history is resent every turn as a sliding
+    window, so all but the newest messages were already formatted last turn.
+    """
+    # Escape newlines in content
+    content = content.replace('\n', ' ').replace('\t', ' ')
+    return f"{role}\t{content}\n"
+
 
 class ToonFormatter:
     """
@@ -65,17 +88,11 @@ class ToonFormatter:
         if not history:
             return ""
         
-        toon = "{role, content}\n"
-        toon += f"[{len(history)}]\n"
-        
-        for m in history:
-            role = m.get('role', 'user')
-            content = m.get('content', '')
-            # Escape newlines in content
-            content = content.replace('\n', ' ').replace('\t', ' ')
-            toon += f"{role}\t{content}\n"
-        
-        return toon
+        rows = "".join(
+            _format_history_row(m.get('role', 'user'), m.get('content', ''))
+            for m in history
+        )
+        return f"{{role, content}}\n[{len(history)}]\n{rows}"
     
     @staticmethod
     def format_full_context(chunks: List[Dict]) -> str:
@@ -91,3 +108,43 @@ class ToonFormatter:
             formatted_chunks.append(f"[Chunk {i+1}]:\n{content}")
         
         return "\n\n".join(formatted_chunks)
+    
+    @staticmethod
+    def rule_precompress(text: str) -> str:
+        """
+        Deterministic shrinking before any LLM step:
+        - trailing whitespace stripped, blank line runs collapsed
+        - INFO/DEBUG/TRACE log lines dropped
+        - adjacent duplicate lines / blocks (e.g. repeated stack traces) folded into one + count
+        - JSON blocks minified
+        """
+        if not text:
+            return text
+        
+        text = _TRAILING_WS_RE.sub("", text)
+        
+        blocks = []
+        for block in _BLANK_RUN_RE.sub("\n\n", text).split("\n\n"):
+            lines = [line for line in block.split("\n") if not _BOILERPLATE_LINE_RE.match(line)]
+            folded = []
+            for line, group in itertools.groupby(lines):
+                count = sum(1 for _ in group)
+                folded.append(f"{line} [x{count}]" if count > 1 and line.strip() else line)
+            block = "\n".join(folded).strip("\n")
+            if not block.strip():
+                continue
+            
+            stripped = block.strip()
+            if stripped[:1] in "{[" and stripped[-1:] in "}]":
+                try:
+                    block = orjson.dumps(orjson.loads(stripped)).decode()
+                except orjson.JSONDecodeError:
+                    pass
+            blocks.append(block)
+        
+        folded_blocks = []
+        for block, group in itertools.groupby(blocks):
+            count = sum(1 for _ in group)
+            folded_blocks.append(f"{block}\n[repeated {count} times]" if count > 1 else block)
+        
+        return "\n\n".join(folded_blocks)
@@ -4,9 +4,10 @@
 ═══════════════════════════════════════════════════════════════
 """
 
+import atexit
 import faiss
 import numpy as np
-import json
+import orjson
 import os
 from typing import List, Dict, Optional
 from datetime import datetime
@@ -15,6 +16,9 @@ from utils.logger import setup_logger
 
 logger = setup_logger()
 
+# Persisted JSON stays human-readable; numpy scalars serialize natively
+JSON_DUMP_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+
 
 class VectorStore:
     """
@@ -26,7 +30,7 @@ class VectorStore:
     
     def __init__(self):
         self.dimension = settings.EMBEDDING_DIMENSION  # Azure OpenAI text-embedding-ada-002 dimension
-        self.index: Optional[faiss.IndexHNSWFlat] = None
+        self.index: Optional[faiss.Index] = None
         self.chunks: List[Dict] = []
         self.metadata: Dict = {"documents": {}}
         self.processing_files: set = set()
@@ -34,10 +38,15 @@ class VectorStore:
 
         
         self.index_path = os.path.join(settings.VECTOR_DB_PATH, "index.faiss")
-        self.chunks_path = os.path.join(settings.VECTOR_DB_PATH, "chunks.json")
+        # Chunks are an append-only JSON-Lines log: one ingest appends only its own chunks
+        self.chunks_path = os.path.join(settings.VECTOR_DB_PATH, "chunks.jsonl")
+        self.legacy_chunks_path = os.path.join(settings.VECTOR_DB_PATH, "chunks.json")
+        # Documents added since the index / metadata were last written
+        self._unflushed = 0
         self.metadata_path = os.path.join(settings.VECTOR_DB_PATH, "metadata.json")
         
         self._initialize_index()
+        atexit.register(self.flush)
     
     def _initialize_index(self):
         """Initialize or load FAISS HNSW index"""
@@ -45,19 +54,83 @@ class VectorStore:
         if os.path.exists(self.index_path):
             logger.info("📂 Loading existing FAISS index...")
             self.index = faiss.read_index(self.index_path)
+            if not self._index_matches_dtype():
+                self._discard_index()
+        
+        if self.index is not None:
             self._load_chunks()
             self._load_metadata()
+            # Chunks are appended before the index is written: drop any
+            # appended after the last index save (unflushed or interrupted ingest)
+            if len(self.chunks) > self.index.ntotal:
+                logger.warning(f"   ⚠️ Dropping {len(self.chunks) - self.index.ntotal} chunks not in the index")
+                self.chunks = self.chunks[:self.index.ntotal]
+                self._rewrite_chunks()
             logger.info(f"   └─ Loaded: {self.index.ntotal} vectors")
+            self._check_quantizer_ranges()
         else:
             logger.info("🆕 Creating new FAISS HNSW index...")
-            self.index = faiss.IndexHNSWFlat(
+            self.index = self._create_index()
+            # A chunk log without an index was never flushed: start it over
+            if os.path.exists(self.chunks_path):
+                os.remove(self.chunks_path)
+            logger.info(f"   └─ M: {settings.HNSW_M}")
+            logger.info(f"   └─ efConstruction: {settings.HNSW_EF_CONSTRUCTION}")
+            logger.info(f"   └─ Storage: {settings.EMBEDDING_DTYPE}")
+    
+    def _index_matches_dtype(self) -> bool:
+        """Whether the loaded index was built with EMBEDDING_DTYPE (int8 → SQ8, float32 → flat storage)"""
+        return isinstance(self.index, faiss.IndexHNSWSQ) == (settings.EMBEDDING_DTYPE == "int8")
+    
+    def _discard_index(self):
+        """
+        Drop a persisted index built with the other EMBEDDING_DTYPE: its vectors
+        come from the other encoder, so queries embedded now are not comparable
+        """
+        logger.warning(f"   ⚠️ Index was not built with EMBEDDING_DTYPE={settings.EMBEDDING_DTYPE}")
+        logger.warning("   └─ Discarding it: re-upload documents to re-index them")
+        self.index = None
+        for path in (self.index_path, self.metadata_path, self.legacy_chunks_path):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def _check_quantizer_ranges(self):
+        """Warn about int8 indexes saved with ranges learned from one early batch"""
+        if not isinstance(self.index, faiss.IndexHNSWSQ):
+            return
+        try:
+            trained = faiss.vector_to_array(faiss.downcast_index(self.index.storage).sq.trained)
+            vmin, vdiff = trained[:self.dimension], trained[self.dimension:2 * self.dimension]
+            if vmin.max() > -0.999 or (vmin + vdiff).min() < 0.999:
+                logger.warning("   ⚠️ int8 index uses narrow quantizer ranges; clear and re-ingest for full recall")
+        except Exception as e:
+            logger.warning(f"   ⚠️ Could not inspect quantizer ranges: {e}")
+    
+    def _create_index(self) -> faiss.Index:
+        """
+        Create an empty HNSW index.
+        With EMBEDDING_DTYPE=int8 vectors are stored 8-bit scalar quantized
+        (4x smaller than float32, so larger indexes stay cache resident).
+        """
+        if settings.EMBEDDING_DTYPE == "int8":
+            index = faiss.IndexHNSWSQ(
                 self.dimension,
+                faiss.ScalarQuantizer.QT_8bit,
                 settings.HNSW_M  # Number of connections per layer
             )
-            # Set construction parameter
-            self.index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
-            logger.info(f"   └─ M: {settings.HNSW_M}")
-            logger.info(f"   └─ efConstruction: {settings.HNSW_EF_CONSTRUCTION}")
+            # Vectors are unit-norm, so every component lies in [-1, 1]: train
+            # the per-dimension ranges on those bounds instead of on the first
+            # document's batch (a small batch would clamp all later vectors)
+            bounds = np.array([[-1.0] * self.dimension, [1.0] * self.dimension], dtype='float32')
+            index.train(bounds)
+        else:
+            index = faiss.IndexHNSWFlat(
+                self.dimension,
+                settings.HNSW_M  # Number of connections per layer
+            )
+        # Set construction parameter
+        index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        return index
     
     def add_chunks(
         self,
@@ -95,14 +168,17 @@ class VectorStore:
         self.index.add(embeddings)
         
         # Store chunks with metadata
-        for i, chunk_text in enumerate(chunks):
-            self.chunks.append({
+        new_chunks = [
+            {
                 "id": start_idx + i,
                 "file_id": file_id,
                 "content": chunk_text,
                 "chunk_index": i,
                 "tokens": len(chunk_text.split())  # Rough estimate
-            })
+            }
+            for i, chunk_text in enumerate(chunks)
+        ]
+        self.chunks.extend(new_chunks)
         
         # Update metadata
         self.metadata["documents"][file_id] = {
@@ -115,8 +191,12 @@ class VectorStore:
         # Remove from processing list
         self.processing_files.discard(file_id)
         
-        # Persist to disk
-        self._save_all()
+        # Persist to disk: chunks now (cheap append), index + metadata every
+        # VECTOR_STORE_FLUSH_EVERY documents (each one by default)
+        self._append_chunks(new_chunks)
+        self._unflushed += 1
+        if self._unflushed >= max(1, settings.VECTOR_STORE_FLUSH_EVERY):
+            self.flush()
         
         logger.info(f"   └─ Total vectors: {self.index.ntotal}")
     
@@ -250,14 +330,11 @@ class VectorStore:
         self.metadata = {"documents": {}}
         self.processing_files = set()
         self.failed_files = {}
+        self._unflushed = 0
         
         # Recreate FAISS index
         logger.info("🔄 Recreating FAISS index...")
-        self.index = faiss.IndexHNSWFlat(
-            self.dimension,
-            settings.HNSW_M
-        )
-        self.index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        self.index = self._create_index()
         
         # Delete persisted files
         import shutil
@@ -265,9 +342,10 @@ class VectorStore:
             os.remove(self.index_path)
             logger.info("   └─ Deleted: index.faiss")
         
-        if os.path.exists(self.chunks_path):
-            os.remove(self.chunks_path)
-            logger.info("   └─ Deleted: chunks.json")
+        for path in (self.chunks_path, self.legacy_chunks_path):
+            if os.path.exists(path):
+                os.remove(path)
+                logger.info(f"   └─ Deleted: {os.path.basename(path)}")
         
         if os.path.exists(self.metadata_path):
             os.remove(self.metadata_path)
@@ -293,38 +371,56 @@ class VectorStore:
         logger.info("✅ All data cleared successfully")
         logger.info("═" * 60)
     
+    def flush(self):
+        """Write the index and metadata if documents were added since the last write"""
+        if self._unflushed:
+            self._save_all()
+            self._unflushed = 0
+
+    def _append_chunks(self, new_chunks: List[Dict]):
+        """Append new chunks to the log (O(new) instead of rewriting every chunk)"""
+        with open(self.chunks_path, 'ab') as f:
+            f.write(b"".join(orjson.dumps(chunk) + b"\n" for chunk in new_chunks))
+
     def _save_all(self):
-        """Persist index and data to disk"""
+        """Persist index and metadata to disk"""
         
         logger.info("💾 Saving vector store to disk...")
         
         # Save FAISS index
         faiss.write_index(self.index, self.index_path)
         
-        # Save chunks
-        with open(self.chunks_path, 'w', encoding='utf-8') as f:
-            json.dump({"chunks": self.chunks}, f, indent=2, ensure_ascii=False)
-        
         # Save metadata
-        with open(self.metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, indent=2, ensure_ascii=False)
+        with open(self.metadata_path, 'wb') as f:
+            f.write(orjson.dumps(self.metadata, option=JSON_DUMP_OPTIONS))
         
         logger.info("   └─ Saved successfully")
     
+    def _rewrite_chunks(self):
+        """Write the whole chunk log from memory (migration / repair only)"""
+        with open(self.chunks_path, 'wb') as f:
+            f.write(b"".join(orjson.dumps(chunk) + b"\n" for chunk in self.chunks))
+
     def _load_chunks(self):
         """Load chunks from disk"""
         
         if os.path.exists(self.chunks_path):
-            with open(self.chunks_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.chunks = data.get("chunks", [])
+            with open(self.chunks_path, 'rb') as f:
+                self.chunks = [orjson.loads(line) for line in f if line.strip()]
+        elif os.path.exists(self.legacy_chunks_path):
+            # One-time migration of the old single-document format
+            with open(self.legacy_chunks_path, 'rb') as f:
+                self.chunks = orjson.loads(f.read()).get("chunks", [])
+            self._rewrite_chunks()
+            os.remove(self.legacy_chunks_path)
+            logger.info(f"   └─ Migrated chunks.json → chunks.jsonl ({len(self.chunks)} chunks)")
     
     def _load_metadata(self):
         """Load metadata from disk"""
         
         if os.path.exists(self.metadata_path):
-            with open(self.metadata_path, 'r', encoding='utf-8') as f:
-                self.metadata = json.load(f)
+            with open(self.metadata_path, 'rb') as f:
+                self.metadata = orjson.loads(f.read())
         else:
             self.metadata = {"documents": {}}
 
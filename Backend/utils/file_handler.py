@@ -7,6 +7,9 @@
 import os
 import uuid
 import glob
+import aiofiles
+from threading import Lock
+from typing import Dict, Optional
 from fastapi import UploadFile, HTTPException
 from config.settings import settings
 from utils.logger import setup_logger
@@ -15,6 +18,47 @@ logger = setup_logger()
 
 ALLOWED_EXTENSIONS = {'.pdf', '.txt', '.docx', '.md'}
 
+# Read/write uploads in 1MB pieces so memory stays flat for large files
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# file_id -> saved file path (avoids scanning UPLOAD_DIR on every view)
+_file_id_index: Dict[str, str] = {}
+_file_id_index_lock = Lock()
+
+
+def _load_file_id_index():
+    """Index files already in the upload directory (saved as <file_id><ext>)"""
+    with _file_id_index_lock:
+        _file_id_index.clear()
+        for filename in os.listdir(settings.UPLOAD_DIR):
+            file_id, _ = os.path.splitext(filename)
+            _file_id_index[file_id] = os.path.join(settings.UPLOAD_DIR, filename)
+
+
+def find_upload_path(file_id: str) -> Optional[str]:
+    """
+    Resolve a file_id to its saved path.
+    Uses the in-memory index, rescanning the directory only on a miss.
+    """
+    with _file_id_index_lock:
+        file_path = _file_id_index.get(file_id)
+    
+    if file_path is None:
+        _load_file_id_index()
+        with _file_id_index_lock:
+            file_path = _file_id_index.get(file_id)
+    
+    # Files can be removed behind our back (e.g. clear-all)
+    if file_path is not None and not os.path.exists(file_path):
+        with _file_id_index_lock:
+            _file_id_index.pop(file_id, None)
+        return None
+    
+    return file_path
+
+
+_load_file_id_index()
+
 
 def validate_file(file: UploadFile):
     """
@@ -55,25 +99,37 @@ async def save_upload_file(file: UploadFile) -> tuple[str, str]:
         except Exception as e:
             logger.error(f"   └─ Failed to delete {old_file}: {e}")
     
+    with _file_id_index_lock:
+        _file_id_index.clear()
+    
     # Generate unique file ID
     file_id = str(uuid.uuid4())
     _, ext = os.path.splitext(file.filename or "")
     filename = f"{file_id}{ext}"
     file_path = os.path.join(settings.UPLOAD_DIR, filename)
     
-    # Save file
+    # Save file (streamed, without blocking the event loop on disk writes)
     logger.info(f"💾 Saving new file: {filename}")
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        
-        # Check file size
-        if len(content) > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"❌ File too large. Max size: {settings.MAX_FILE_SIZE / (1024*1024):.1f}MB"
-            )
-        
-        buffer.write(content)
+    total_bytes = 0
+    async with aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            total_bytes += len(chunk)
+            
+            # Check file size
+            if total_bytes > settings.MAX_FILE_SIZE:
+                break
+            
+            await buffer.write(chunk)
+    
+    if total_bytes > settings.MAX_FILE_SIZE:
+        os.remove(file_path)
+        raise HTTPException(
+            status_code=413,
+            detail=f"❌ File too large. Max size: {settings.MAX_FILE_SIZE / (1024*1024):.1f}MB"
+        )
+    
+    with _file_id_index_lock:
+        _file_id_index[file_id] = file_path
     
     logger.info(f"✅ File saved successfully: {file_path}")
     
@@ -0,0 +1,17 @@
+"""
+═══════════════════════════════════════════════════════════════
+ ⚡ COSMIC AI - Optional Numba JIT
+═══════════════════════════════════════════════════════════════
+"""
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Without numba, kernels run as plain Python/numpy functions"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
@@ -1,6 +1,8 @@
-import json
+import mmap
+import orjson
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import os
 
@@ -10,6 +12,68 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import graph_config
 from neo4j import GraphDatabase
 
+# Rows per transaction, and transactions in flight (one pooled session each)
+IMPORT_BATCH_SIZE = 1000
+IMPORT_WORKERS = 8
+APOC_EDGE_BATCH_SIZE = 5000  # Mixed-type edge rows per transaction when APOC is present
+APOC_NODE_BATCH_SIZE = 1000  # Node rows per server-side apoc.periodic.iterate transaction
+
+def _import_batch(tx, query, batch):
+    tx.run(query, batch=batch).consume()
+
+def _run_batched(driver, query, rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Write rows in batch_size transactions over parallel sessions.
+    execute_write retries a batch on transient errors (e.g. lock deadlocks
+    between concurrent MERGEs).
+    """
+    def write(batch):
+        with driver.session(database=graph_config.NEO4J_DATABASE) as session:
+            session.execute_write(_import_batch, query, batch)
+    
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+    with ThreadPoolExecutor(max_workers=IMPORT_WORKERS) as pool:
+        list(pool.map(write, batches))
+
+def _run_periodic_iterate(driver, query, rows):
+    """
+    Send all rows once and let apoc.periodic.iterate split them into
+    transactions committed in parallel by the server's own worker pool
+    (no per-batch round trips). Must run as an auto-commit query.
+    """
+    with driver.session(database=graph_config.NEO4J_DATABASE) as session:
+        record = session.run(
+            "CALL apoc.periodic.iterate('UNWIND $batch AS row RETURN row', $action, "
+            "{batchSize: $batch_size, parallel: true, params: {batch: $batch}}) "
+            "YIELD failedBatches, errorMessages RETURN failedBatches, errorMessages",
+            action=query, batch=rows, batch_size=APOC_NODE_BATCH_SIZE
+        ).single()
+    if record and record["failedBatches"]:
+        print(f"   └─ ⚠️ {record['failedBatches']} batches failed: {record['errorMessages']}")
+
+def _has_apoc(driver) -> bool:
+    """Whether the APOC plugin is installed (server-side batching, dynamic relationship types)"""
+    try:
+        with driver.session(database=graph_config.NEO4J_DATABASE) as session:
+            session.run("RETURN apoc.version()").consume()
+        return True
+    except Exception:
+        return False
+
+def _load_json_file(path):
+    """
+    Parse a JSON file straight from a read-only memory map: orjson reads the
+    page cache directly instead of a bytes copy of the whole file
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return orjson.loads(b"")  # Same error as parsing an empty read
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)  # Read-ahead for the single front-to-back pass
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+
 def load_json_data():
     """Load existing JSON graph data"""
     print("📂 Loading JSON data...")
@@ -17,12 +81,10 @@ def load_json_data():
     edges_data = []
 
     if os.path.exists(graph_config.NODES_FILE):
-        with open(graph_config.NODES_FILE, 'r', encoding='utf-8') as f:
-            nodes_data = json.load(f)
+        nodes_data = _load_json_file(graph_config.NODES_FILE)
             
     if os.path.exists(graph_config.EDGES_FILE):
-        with open(graph_config.EDGES_FILE, 'r', encoding='utf-8') as f:
-            edges_data = json.load(f)
+        edges_data = _load_json_file(graph_config.EDGES_FILE)
             
     print(f"   └─ Found {len(nodes_data)} nodes and {len(edges_data)} edges.")
     return nodes_data, edges_data
@@ -42,7 +104,8 @@ def migrate_to_neo4j():
     try:
         driver = GraphDatabase.driver(
             graph_config.NEO4J_URI,
-            auth=(graph_config.NEO4J_USER, graph_config.NEO4J_PASSWORD)
+            auth=(graph_config.NEO4J_USER, graph_config.NEO4J_PASSWORD),
+            max_connection_pool_size=max(IMPORT_WORKERS, graph_config.NEO4J_MAX_POOL_SIZE)
         )
         driver.verify_connectivity()
         print("   └─ Connected successfully!")
@@ -50,6 +113,18 @@ def migrate_to_neo4j():
         print(f"❌ Connection failed: {e}")
         return
 
+    # Edge rows MATCH on :Entity(id); without its unique constraint (and the
+    # backing index) every lookup is a scan over all nodes
+    label = graph_config.BASE_NODE_LABEL
+    try:
+        with driver.session(database=graph_config.NEO4J_DATABASE) as session:
+            session.run(
+                f"CREATE CONSTRAINT constraint_{label}_id IF NOT EXISTS "
+                f"FOR (n:`{label}`) REQUIRE n.id IS UNIQUE"
+            ).consume()
+    except Exception as e:
+        print(f"   └─ ⚠️ Could not create :{label}(id) constraint: {e}")
+
     # 3. Import Nodes (Grouped by Type for efficiency and dynamic labelling)
     print("\n📦 Importing Nodes...")
     nodes_by_type = defaultdict(list)
@@ -59,42 +134,75 @@ def migrate_to_neo4j():
         node_data['id'] = node_id
         nodes_by_type[node_type].append(node_data)
 
+    has_apoc = _has_apoc(driver)
     total_nodes_created = 0
-    with driver.session(database=graph_config.NEO4J_DATABASE) as session:
-        for node_type, nodes in nodes_by_type.items():
-            # Cypher query with dynamic label (safe because we iterate types)
-            query = f"""
-            UNWIND $batch AS row
-            MERGE (n:`{node_type}` {{id: row.id}})
-            SET n.name = row.name,
-                n.description = row.description,
-                n.file_id = row.file_id,
-                n.source_chunks = row.source_chunks,
-                n.migrated_at = timestamp()
-            """
-            
-            result = session.run(query, batch=nodes)
-            consume_result = result.consume()
-            count = consume_result.counters.nodes_created + consume_result.counters.properties_set // 4 # Approximate
-            # Actually, let's just use len(nodes) for reporting as MERGE is idempotent
-            print(f"   └─ Merging {len(nodes)} nodes of type :{node_type}")
-            total_nodes_created += len(nodes)
-
-    # 4. Import Edges (Grouped by Type)
+    for node_type, nodes in nodes_by_type.items():
+        # Cypher query with dynamic label (safe because we iterate types)
+        row_query = f"""
+        MERGE (n:`{graph_config.BASE_NODE_LABEL}` {{id: row.id}})
+        SET n:`{node_type}`,
+            n.name = row.name,
+            n.name_lower = toLower(row.name),
+            n.description = row.description,
+            n.file_id = row.file_id,
+            n.source_chunks = row.source_chunks,
+            n.migrated_at = timestamp()
+        """
+        
+        if has_apoc:
+            _run_periodic_iterate(driver, row_query, nodes)
+        else:
+            _run_batched(driver, "UNWIND $batch AS row" + row_query, nodes)
+        # MERGE is idempotent, so report rows processed rather than created
+        print(f"   └─ Merging {len(nodes)} nodes of type :{node_type}")
+        total_nodes_created += len(nodes)
+
+    # 4. Import Edges (Grouped by Type, or all types at once with APOC)
     print("\n🔗 Importing Relationships...")
     edges_by_type = defaultdict(list)
     for edge in edges_list:
-        edge_type = edge.get('type', 'RELATED_TO')
-        edges_by_type[edge_type].append(edge)
+        edge.setdefault('type', 'RELATED_TO')
+        edges_by_type[edge['type']].append(edge)
+    
+    # Sorted by the source's position in the node import. Nodes were created
+    # in that order, so their store records (and index entries) sit roughly
+    # in it too: consecutive rows of a batch hit the same pages, and the
+    # contiguous batches handed to parallel workers touch disjoint source
+    # ranges, so they rarely contend for the same node locks
+    import_position = {
+        node['id']: position
+        for position, node in enumerate(node for nodes in nodes_by_type.values() for node in nodes)
+    }
+    unknown_position = len(import_position)
+    edge_sort_key = lambda e: (import_position.get(e.get('from_id'), unknown_position), str(e.get('from_id', '')))
 
     total_edges_created = 0
-    with driver.session(database=graph_config.NEO4J_DATABASE) as session:
+    if has_apoc:
+        # The relationship type is a row value, so one query (and one cached
+        # plan) covers every type and batches can mix types
+        query = f"""
+        UNWIND $batch AS row
+        MATCH (source:`{graph_config.BASE_NODE_LABEL}` {{id: row.from_id}})
+        MATCH (target:`{graph_config.BASE_NODE_LABEL}` {{id: row.to_id}})
+        CALL apoc.merge.relationship(source, row.type, {{}}, {{}}, target) YIELD rel
+        SET rel.confidence = row.confidence,
+            rel.description = row.description,
+            rel.file_id = row.file_id,
+            rel.chunk_id = row.chunk_id,
+            rel.migrated_at = timestamp()
+        """
+        
+        edges_list.sort(key=edge_sort_key)
+        _run_batched(driver, query, edges_list, batch_size=APOC_EDGE_BATCH_SIZE)
+        print(f"   └─ Merging {len(edges_list)} relationships of {len(edges_by_type)} types (APOC)")
+        total_edges_created = len(edges_list)
+    else:
         for edge_type, edges in edges_by_type.items():
             # Cypher query with dynamic relationship type
             query = f"""
             UNWIND $batch AS row
-            MATCH (source {{id: row.from_id}})
-            MATCH (target {{id: row.to_id}})
+            MATCH (source:`{graph_config.BASE_NODE_LABEL}` {{id: row.from_id}})
+            MATCH (target:`{graph_config.BASE_NODE_LABEL}` {{id: row.to_id}})
             MERGE (source)-[r:`{edge_type}`]->(target)
             SET r.confidence = row.confidence,
                 r.description = row.description,
@@ -103,7 +211,8 @@ def migrate_to_neo4j():
                 r.migrated_at = timestamp()
             """
             
-            result = session.run(query, batch=edges)
+            edges.sort(key=edge_sort_key)
+            _run_batched(driver, query, edges)
             print(f"   └─ Merging {len(edges)} relationships of type :{edge_type}")
             total_edges_created += len(edges)
 
@@ -8,6 +8,42 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from neo4j import GraphDatabase
 from config import graph_config
 
+def backfill_base_label(driver):
+    """
+    Label nodes written before the base label existed and store their
+    lowercase names. Runs before the :Entity(id) constraint is created:
+    graphs from the old per-type MERGE can hold one id under several type
+    labels, and labeling both copies would violate it. Such ids are reported
+    and left unlabeled for manual merging.
+    """
+    label = graph_config.BASE_NODE_LABEL
+    with driver.session(database=graph_config.NEO4J_DATABASE) as session:
+        duplicates = session.run(
+            "MATCH (n) WHERE n.id IS NOT NULL "
+            "WITH n.id AS id, count(n) AS copies WHERE copies > 1 "
+            "RETURN id, copies ORDER BY copies DESC"
+        ).data()
+        if duplicates:
+            print(f"   └─ ⚠️ {len(duplicates)} ids are shared by several nodes (not labeled :{label}):")
+            for row in duplicates[:20]:
+                print(f"      • {row['id']} ({row['copies']} nodes)")
+        
+        labeled = session.run(
+            f"MATCH (n) WHERE n.id IS NOT NULL "
+            f"WITH n.id AS id, collect(n) AS nodes WHERE size(nodes) = 1 "
+            f"WITH nodes[0] AS n WHERE NOT n:`{label}` "
+            f"SET n:`{label}` RETURN count(n) AS c"
+        ).single()['c']
+        if labeled:
+            print(f"   └─ ✅ Added :{label} label to {labeled} existing nodes")
+        
+        lowered = session.run(
+            f"MATCH (n:`{label}`) WHERE n.name IS NOT NULL AND n.name_lower IS NULL "
+            f"SET n.name_lower = toLower(n.name) RETURN count(n) AS c"
+        ).single()['c']
+        if lowered:
+            print(f"   └─ ✅ Stored lowercase names for {lowered} existing nodes")
+
 def setup_indices():
     """Create indices for all entity types"""
     print("🚀 Setting up Neo4j Indices...")
@@ -17,8 +53,13 @@ def setup_indices():
         auth=(graph_config.NEO4J_USER, graph_config.NEO4J_PASSWORD)
     )
     
-    entity_types = graph_config.ENTITY_TYPES
-    # Add generic 'Entity' if you plan to use a base label, but we used specific labels.
+    try:
+        backfill_base_label(driver)
+    except Exception as e:
+        print(f"   └─ ⚠️ Base label backfill failed: {e}")
+    
+    # Base label first: relationship writes and id lookups MATCH on :Entity(id)
+    entity_types = [graph_config.BASE_NODE_LABEL] + list(graph_config.ENTITY_TYPES)
     
     with driver.session(database=graph_config.NEO4J_DATABASE) as session:
         for ent_type in entity_types:
@@ -26,16 +67,18 @@ def setup_indices():
             # "CREATE CONSTRAINT IF NOT EXISTS FOR (n:Person) REQUIRE n.id IS UNIQUE"
             # Note: Enterprise users get more constraints, but uniqueness is good.
             # Free tier supports unique constraints.
+            # Sequential on purpose: Neo4j serializes schema changes anyway, and
+            # concurrent DDL only adds transient lock failures
             
             try:
                 # Using 4.4+ syntax or 5.x compatible
                 query_unique = f"CREATE CONSTRAINT constraint_{ent_type}_id IF NOT EXISTS FOR (n:`{ent_type}`) REQUIRE n.id IS UNIQUE"
-                session.run(query_unique)
+                session.run(query_unique).consume()
                 print(f"   └─ ✅ Constraint created for :{ent_type}(id)")
                 
                 # 2. Name Index (for search)
                 query_index = f"CREATE INDEX index_{ent_type}_name IF NOT EXISTS FOR (n:`{ent_type}`) ON (n.name)"
-                session.run(query_index)
+                session.run(query_index).consume()
                 print(f"   └─ ✅ Index created for :{ent_type}(name)")
                 
             except Exception as e:
@@ -165,6 +165,8 @@ const ChatContainer = () => {
   const [procState, setProcState] = useState<ProcessingState | null>(null);
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Stable per-tab id so the backend can keep a session's requests on the same model cache
+  const sessionIdRef = useRef(`session-${Date.now()}`);
 
   const scrollToBottom = () => messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   useEffect(() => scrollToBottom(), [messages]);
@@ -323,7 +325,8 @@ const ChatContainer = () => {
           query: content,
           history,
           use_rag: true,
-          file_ids: activeFileId ? [activeFileId] : null
+          file_ids: activeFileId ? [activeFileId] : null,
+          session_id: sessionIdRef.current
         })
       });
 
@@ -3,6 +3,7 @@ import os
 import sys
 import time
 import signal
+import socket
 import subprocess
 import shutil
 from pathlib import Path
@@ -38,15 +39,30 @@ def log(msg, level="info"):
     elif level == "sys":
         print(f"{Fore.MAGENTA}  💻 [SYSTEM] {msg}{Style.RESET_ALL}")
 
-def is_process_running(process_name):
-    # Simple check if a process is running (Windows specific basic check)
-    call = 'TASKLIST', '/FI', 'imagename eq %s' % process_name
+OLLAMA_ADDRESS = ("127.0.0.1", 11434)
+
+def is_ollama_running(timeout=0.2):
+    # Ollama is up if its API port accepts a connection (cross-platform, no subprocess)
     try:
-        output = subprocess.check_output(call).decode()
-        return process_name in output
-    except:
+        with socket.create_connection(OLLAMA_ADDRESS, timeout=timeout):
+            return True
+    except OSError:
         return False
 
+def wait_for_ollama(process, timeout=10):
+    # Poll the port with exponential backoff until Ollama accepts connections,
+    # the process exits, or the timeout passes
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while time.monotonic() < deadline:
+        if is_ollama_running():
+            return True
+        if process.poll() is not None:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 1.5, 0.5)
+    return False
+
 def main():
     print_banner()
     
@@ -61,7 +77,7 @@ def main():
 
         # 1. Start Ollama (if not running)
         log("Checking Ollama status...", "sys")
-        if is_process_running("ollama.exe"):
+        if is_ollama_running():
              log("Ollama is already running.", "info")
         else:
              if shutil.which("ollama"):
@@ -80,15 +96,8 @@ def main():
                          stderr=subprocess.DEVNULL
                      )
                      ollama_started_by_us = True  # Mark that we started it
-                     time.sleep(3)  # Wait for startup
-                     
-                     # Verify it started
-                     if ollama_process.poll() is None:
-                         log("Ollama started successfully ✓", "info")
-                     else:
-                         log("Ollama process ended unexpectedly", "warn")
-                         ollama_process = None
-                         ollama_started_by_us = False
+                     # Readiness is checked after the backend is launched, so
+                     # Ollama's warmup overlaps with the backend's startup
                  except Exception as e:
                      log(f"Failed to start Ollama: {e}", "error")
                      ollama_process = None
@@ -116,6 +125,17 @@ def main():
             env=os.environ.copy()
         )
         
+        # Verify Ollama came up (the backend only calls it on demand)
+        if ollama_process:
+            if wait_for_ollama(ollama_process):
+                log("Ollama started successfully ✓", "info")
+            elif ollama_process.poll() is not None:
+                log("Ollama process ended unexpectedly", "warn")
+                ollama_process = None
+                ollama_started_by_us = False
+            else:
+                log("Ollama is still starting (not accepting connections yet)", "warn")
+        
         log("Backend started successfully ✓", "info")
         log("API Server: http://localhost:8000", "info")
         log("API Docs: http://localhost:8000/docs", "info")
@@ -165,7 +185,7 @@ def main():
                     log("Ollama force stopped ✓", "info")
             except Exception as e:
                 log(f"Error stopping Ollama: {e}", "warn")
-        elif is_process_running("ollama.exe") and not ollama_started_by_us:
+        elif is_ollama_running() and not ollama_started_by_us:
             log("Ollama was already running before launcher - leaving it running", "info")
         
         log("Shutdown complete. 👋", "info")